@@ -1,11 +1,21 @@
+import os
+import functools
+import json
+import logging
+import time
+
 import vtk
 import qt
-import json
 
 import slicer
 from slicer.ScriptedLoadableModule import *
 from slicer.util import VTKObservationMixin
 
+# This file is loaded at every application startup. Modules that are only needed for processing
+# (AtlasEditorLib, downloading, worker processes) are imported in the methods that use them.
+# OpenAnatomyExportLib is imported in methods, too, as the OpenAnatomyExport module may not be loaded yet
+# (and therefore may not be on the Python path) when this file is loaded.
+
 #
 # AtlasEditor
 #
@@ -19,7 +29,7 @@ class AtlasEditor(ScriptedLoadableModule):
         ScriptedLoadableModule.__init__(self, parent)
         self.parent.title = "OpenAnatomy AtlasEditor"  
         self.parent.categories = ["OpenAnatomy"]  
-        self.parent.dependencies = []  
+        self.parent.dependencies = ["OpenAnatomyExport"]  # for OpenAnatomyExportLib
         self.parent.contributors = ["Andy Huynh (ISML, University of Western Australia)"] 
         self.parent.helpText = """"""
         self.parent.acknowledgementText = """"""
@@ -42,6 +52,7 @@ class AtlasEditorWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         self.logic = None
         self._parameterNode = None
         self._updatingGUIFromParameterNode = False
+        self._previewUpdateTimer = None
 
     def setup(self):
         """
@@ -82,6 +93,20 @@ class AtlasEditorWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         self.ui.mergeButton.connect('clicked(bool)', self.onMergeButton)
         self.ui.removeButton.connect('clicked(bool)', self.onRemoveButton)
         self.ui.updateButton.connect('clicked(bool)', self.onUpdateButton)
+        self.ui.undoButton.connect('clicked(bool)', self.onUndoButton)
+        self.ui.redoButton.connect('clicked(bool)', self.onRedoButton)
+        self.ui.renumberLabelsButton.connect('clicked(bool)', self.onRenumberLabelsButton)
+
+        # Preview
+        # Checking an item changes the check state of its parents and children too, the timer collapses
+        # all these changes into a single preview update.
+        self._previewUpdateTimer = qt.QTimer()
+        self._previewUpdateTimer.setSingleShot(True)
+        self._previewUpdateTimer.setInterval(0)
+        self._previewUpdateTimer.connect('timeout()', self.updatePreview)
+        self.ui.previewModeSelector.connect('currentIndexChanged(int)', self.onPreviewModeChanged)
+        self.ui.structureTreeWidget.connect('itemChanged(QTreeWidgetItem*,int)', self.onStructureItemChanged)
+        self.ui.structureSearchBox.connect('textChanged(QString)', self.onStructureSearchTextChanged)
 
         # Make sure parameter node is initialized (needed for module reload)
         self.initializeParameterNode()
@@ -91,6 +116,8 @@ class AtlasEditorWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         Called when the application closes and the module widget is destroyed.
         """
         self.removeObservers()
+        if self.logic:
+            self.logic.stopPreview()
 
     def enter(self):
         """
@@ -110,6 +137,7 @@ class AtlasEditorWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         """
         Called just before the scene is closed.
         """
+        self.logic.stopPreview()
         # Parameter node will be reset, do not use it anymore
         self.setParameterNode(None)
 
@@ -192,6 +220,18 @@ class AtlasEditorWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
             self.ui.removeButton.toolTip = "Select input label map and output label map."
             self.ui.removeButton.enabled = False
 
+        # Renumber labels button
+        if self._parameterNode.GetNodeReference("OutputLabelMap"):
+            self.ui.renumberLabelsButton.toolTip = "Renumber labels of the output label map contiguously and store it with the smallest voxel type that fits."
+            self.ui.renumberLabelsButton.enabled = True
+        else:
+            self.ui.renumberLabelsButton.toolTip = "Select output label map."
+            self.ui.renumberLabelsButton.enabled = False
+
+        # Undo/redo buttons
+        self.ui.undoButton.enabled = self.logic.canUndo()
+        self.ui.redoButton.enabled = self.logic.canRedo()
+
         # All the GUI updates are done
         self._updatingGUIFromParameterNode = False
 
@@ -221,13 +261,18 @@ class AtlasEditorWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
 
             self.logic.downloadAtlas(self.ui.atlasInputSelector.currentIndex, self.ui.atlasLabelMapInputSelector, self.ui.atlasStructureInputPath, self.ui.structureTreeWidget, self.ui.atlasLabelMapOutputSelector)
 
+        self.onPreviewModeChanged()
+
     def onMergeButton(self):
         """
         Run processing when user clicks "Merge" button.
         """
         with slicer.util.tryWithErrorDisplay("Failed to compute results.", waitCursor=True):
 
+            self.logic.stopPreview()
             self.logic.merge(self.ui.atlasLabelMapInputSelector.currentNode(), self.ui.atlasLabelMapOutputSelector.currentNode())
+        self.onPreviewModeChanged()
+        self.updateGUIFromParameterNode()
     
     def onRemoveButton(self):
         """
@@ -235,7 +280,74 @@ class AtlasEditorWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         """
         with slicer.util.tryWithErrorDisplay("Failed to compute results.", waitCursor=True):
 
+            self.logic.stopPreview()
             self.logic.remove(self.ui.atlasLabelMapInputSelector.currentNode(), self.ui.atlasLabelMapOutputSelector.currentNode())
+        self.onPreviewModeChanged()
+        self.updateGUIFromParameterNode()
+
+    def onRenumberLabelsButton(self):
+        """
+        Renumber labels of the output label map when user clicks "Renumber labels" button.
+        """
+        with slicer.util.tryWithErrorDisplay("Failed to renumber labels.", waitCursor=True):
+
+            self.logic.stopPreview()
+            labelMapping = self.logic.renumberLabels(self.ui.atlasLabelMapOutputSelector.currentNode())
+            slicer.util.showStatusMessage(f"Renumbered {len(labelMapping)} labels", 2000)
+        self.onPreviewModeChanged()
+        self.updateGUIFromParameterNode()
+
+    def getPreviewOperation(self):
+        """
+        Get the operation ("merge" or "remove") selected for previewing, None if preview is off.
+        """
+        return {1: "merge", 2: "remove"}.get(self.ui.previewModeSelector.currentIndex)
+
+    def onPreviewModeChanged(self):
+        """
+        Start or stop previewing when user changes the preview mode.
+        """
+        with slicer.util.tryWithErrorDisplay("Failed to preview.", waitCursor=True):
+            self.logic.stopPreview()
+            if self.getPreviewOperation() and self.logic.atlasStructureTree:
+                self.logic.startPreview(self.ui.atlasLabelMapInputSelector.currentNode())
+                self.updatePreview()
+
+    def onStructureItemChanged(self, item, column):
+        """
+        Schedule preview update when user checks or unchecks a structure.
+        """
+        if self.logic.previewColorNode:
+            self._previewUpdateTimer.start()
+
+    def onStructureSearchTextChanged(self, text):
+        """
+        Show only the matching structures in the structure tree while the user is typing.
+        """
+        self.logic.filterStructureView(text)
+
+    def updatePreview(self):
+        operation = self.getPreviewOperation()
+        if operation:
+            self.logic.updatePreview(operation)
+
+    def onUndoButton(self):
+        """
+        Revert the last merge or remove when user clicks "Undo" button.
+        """
+        with slicer.util.tryWithErrorDisplay("Failed to undo.", waitCursor=True):
+            name = self.logic.undo()
+            slicer.util.showStatusMessage(f"Undo {name}", 2000)
+        self.updateGUIFromParameterNode()
+
+    def onRedoButton(self):
+        """
+        Apply the last undone merge or remove again when user clicks "Redo" button.
+        """
+        with slicer.util.tryWithErrorDisplay("Failed to redo.", waitCursor=True):
+            name = self.logic.redo()
+            slicer.util.showStatusMessage(f"Redo {name}", 2000)
+        self.updateGUIFromParameterNode()
 
     def onUpdateButton(self):
         """
@@ -247,11 +359,24 @@ class AtlasEditorWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
 
             self.logic.updateStructureView()
 
+        self.onPreviewModeChanged()
+
 
 #
 # AtlasEditorLogic
 #
 
+def profiledLogicMethod(method):
+    """
+    Decorator for logic methods that are profiled when profiling is enabled (see OpenAnatomyExportLib.Profiling).
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        from OpenAnatomyExportLib import Profiling
+        return Profiling.profiledLogicMethod(method)(self, *args, **kwargs)
+    return wrapper
+
+
 class AtlasEditorLogic(ScriptedLoadableModuleLogic):
     """This class should implement all the actual
     computation done by your module.  The interface
@@ -272,6 +397,34 @@ class AtlasEditorLogic(ScriptedLoadableModuleLogic):
         self.atlasStructureTreeWidget = None
         self.atlasStructureJSON = None
         self.atlasStructureTree = None
+        self.atlasStructureIdByName = None  # structure/group name -> @id
+        self.atlasStructureSearchIndex = None  # name index for filtering the structure view
+        self.atlasStructureTreeItemsById = {}  # @id -> tree widget items of the structure
+        self.atlasStructureFilterText = ""  # only structures that match this text are shown in the structure view
+        self.atlasStructureHiddenIds = set()  # @ids of structures that are hidden by the filter
+        self.labelStatistics = None  # label value -> voxel count, bounding box and centroid
+        self.labelStatisticsVolumeNode = None  # label map that labelStatistics describes
+        self.previewVolumeNode = None  # label map that is displayed with preview colors, see startPreview
+        self.previewColorNode = None
+        self.previewOriginalColorNode = None
+        self.previewLabelMapping = {}
+        self.previewColors = {}
+        self.undoHistory = []  # edits that can be undone, see startEditHistoryEntry
+        self.redoHistory = []
+        self.maximumEditHistoryLength = 100
+        self.atlasSnapshots = {}  # name -> (CompactLabelMap, IJK to RAS matrix), see storeAtlasSnapshot
+        self.segmentEditorWidget = None  # created when first needed, see getSegmentEditorWidget
+        self.segmentEditorNode = None
+        self.atlasCacheDirectory = None  # folder for downloaded atlases, defaults to Slicer's remote cache directory
+        self.downloadTimeoutSec = 60
+        # Voxels of uncompressed atlas label maps are memory-mapped, see loadLabelMapVolume
+        self.memoryMapLabelMaps = True
+        self.downloadChunkSize = 1024 * 1024
+        # Folder for cProfile and tracemalloc results of setup, merge, and remove. Profiling is disabled if not set.
+        # Can be enabled by setting OPENANATOMY_PROFILING_DIR environment variable.
+        from OpenAnatomyExportLib import Profiling
+        self.profilingOutputFolder = Profiling.getProfilingOutputFolder()
+        self.profilingNumberOfTopAllocations = 25
     """
     Dictionary of atlas_data. Key is atlas ID, value is a list of URLs to download atlas data.
     Key:
@@ -293,27 +446,625 @@ class AtlasEditorLogic(ScriptedLoadableModuleLogic):
             "https://drive.google.com/uc?export=download&id=1TGzNZO-j5V1gJ5m_R1RjJPXI-zwXcdov"]
     }
 
+    """
+    Dictionary of expected checksums ("SHA256:<hex>") of the atlas_data files, in the same order as the URLs.
+    None means that the published checksum is not known, in which case the checksum computed after the
+    first download is stored in the cache manifest and used for detecting changes of the cached file.
+    """
+    atlas_checksums = {
+        0: [None, None, None],
+        1: [None, None, None]
+    }
+
+    """
+    Names of the atlas_data files in the atlas cache folder.
+    """
+    atlas_file_names = ["atlas.nrrd", "atlas-lut.ctbl", "atlas-structure.json"]
+
+    """
+    Node attributes of memory-mapped label maps: source file and image data modification time after loading.
+    """
+    memoryMappedFileNameAttributeName = "AtlasEditor.MemoryMappedFileName"
+    memoryMappedImageDataMTimeAttributeName = "AtlasEditor.MemoryMappedImageDataMTime"
+
+    @profiledLogicMethod
     def setup(self, atlasInputLabelMapVolumeNode, atlasOutputLabelMapVolumeNode, atlasStructureJsonPath, atlasStructureTreeWidget):
         """
         Setup variables for atlas editor
         """
+        from AtlasEditorLib import StructureSearchIndex
         self.atlasInputLabelMapVolumeNode = atlasInputLabelMapVolumeNode
         self.atlasOutputLabelMapVolumeNode = atlasOutputLabelMapVolumeNode
         self.atlasStructureJSON = json.load(open(atlasStructureJsonPath))
+        self.atlasStructureIdByName = {}
+        for item in self.atlasStructureJSON:
+            if (item['@type'] == "Structure" or item['@type'] == "Group"):
+                self.atlasStructureIdByName.setdefault(item['annotation']['name'], item['@id'])
+        self.atlasStructureSearchIndex = StructureSearchIndex(self.atlasStructureJSON)
         self.atlasStructureTreeWidget = atlasStructureTreeWidget
+        self.updateLabelStatisticsIndex(atlasInputLabelMapVolumeNode)
 
-    def downloadFromURL(self, url, filename):
+    @staticmethod
+    def getInputSizeDescription(labelMapVolumeNode):
+        """
+        Get size of the label map as a short string (such as 256x256x130) for naming profiling results.
+        """
+        if labelMapVolumeNode is None or not hasattr(labelMapVolumeNode, "GetImageData") or not labelMapVolumeNode.GetImageData():
+            return "unknown"
+        return "x".join(str(dimension) for dimension in labelMapVolumeNode.GetImageData().GetDimensions())
+
+    @staticmethod
+    def computeLabelStatisticsFromArray(labelArray):
+        """
+        Compute voxel count, bounding box and centroid of each label value of a label map voxel array.
+        labelArray is indexed as [k, j, i] (as returned by slicer.util.arrayFromVolume), bounding boxes are
+        returned as [iMin, iMax, jMin, jMax, kMin, kMax] and centroids as [i, j, k].
+        The array is processed one slice at a time using vectorized histograms (per-slice, per-row and per-column
+        label counts), so no volume-sized temporary array is allocated.
+        Returns a dictionary that maps label value to statistics.
+        """
+        import numpy as np
+        dimK, dimJ, dimI = labelArray.shape
+        minValue = int(labelArray.min())
+        maxValue = int(labelArray.max())
+
+        # Find label values present in the volume and assign a compact index to each
+        denseCounts = np.zeros(maxValue - minValue + 1, dtype=np.int64)
+        for k in range(dimK):
+            denseCounts += np.bincount((labelArray[k].ravel() - minValue).astype(np.intp), minlength=len(denseCounts))
+        labelValues = np.nonzero(denseCounts)[0] + minValue
+        compactIndex = np.zeros(len(denseCounts), dtype=np.intp)
+        compactIndex[labelValues - minValue] = np.arange(len(labelValues))
+        numberOfLabels = len(labelValues)
+
+        # Number of voxels of each label in each slice, row and column
+        histogramK = np.zeros((numberOfLabels, dimK), dtype=np.int64)
+        histogramJ = np.zeros((numberOfLabels * dimJ), dtype=np.int64)
+        histogramI = np.zeros((numberOfLabels * dimI), dtype=np.int64)
+        jOffsets = np.arange(dimJ, dtype=np.intp)[:, np.newaxis]
+        iOffsets = np.arange(dimI, dtype=np.intp)[np.newaxis, :]
+        for k in range(dimK):
+            sliceIndices = compactIndex[(labelArray[k] - minValue).astype(np.intp)]
+            histogramK[:, k] = np.bincount(sliceIndices.ravel(), minlength=numberOfLabels)
+            histogramJ += np.bincount((sliceIndices * dimJ + jOffsets).ravel(), minlength=len(histogramJ))
+            histogramI += np.bincount((sliceIndices * dimI + iOffsets).ravel(), minlength=len(histogramI))
+        histogramJ = histogramJ.reshape(numberOfLabels, dimJ)
+        histogramI = histogramI.reshape(numberOfLabels, dimI)
+
+        voxelCounts = histogramK.sum(axis=1)
+        labelStatistics = {}
+        axisRanges = []
+        centroids = []
+        for histogram in [histogramI, histogramJ, histogramK]:
+            present = histogram > 0
+            axisMin = np.argmax(present, axis=1)
+            axisMax = histogram.shape[1] - 1 - np.argmax(present[:, ::-1], axis=1)
+            axisRanges.append((axisMin, axisMax))
+            centroids.append(histogram @ np.arange(histogram.shape[1]) / voxelCounts)
+        for index, labelValue in enumerate(labelValues):
+            labelStatistics[int(labelValue)] = {
+                "voxelCount": int(voxelCounts[index]),
+                "boundingBox": [int(axisRange[bound][index]) for axisRange in axisRanges for bound in range(2)],
+                "centroid": [float(centroid[index]) for centroid in centroids],
+                }
+        return labelStatistics
+
+    @staticmethod
+    def combineLabelStatistics(statisticsList):
         """
-        Download file from URL and save to filename (folder must exist)
+        Compute statistics of the union of labels from the statistics of the individual labels.
         """
-        try:         
-            print("Downloading file from " + url + " ...")
-            import urllib
-            urllib.request.urlretrieve(url, filename)
-        except Exception as e:
-            print("Error: can not download file  ...")
-            print(e)   
-            return -1
+        statisticsList = [statistics for statistics in statisticsList if statistics]
+        if not statisticsList:
+            return None
+        voxelCount = sum(statistics["voxelCount"] for statistics in statisticsList)
+        boundingBox = []
+        for axis in range(3):
+            boundingBox.append(min(statistics["boundingBox"][axis * 2] for statistics in statisticsList))
+            boundingBox.append(max(statistics["boundingBox"][axis * 2 + 1] for statistics in statisticsList))
+        centroid = [sum(statistics["centroid"][axis] * statistics["voxelCount"] for statistics in statisticsList) / voxelCount
+            for axis in range(3)]
+        return {"voxelCount": voxelCount, "boundingBox": boundingBox, "centroid": centroid}
+
+    def getLabelStatisticsSidecarPath(self, labelMapVolumeNode):
+        """
+        Get path of the file that caches label statistics next to the label map file.
+        Returns None if the label map was not loaded from file.
+        """
+        fileName = self.getLabelMapFileName(labelMapVolumeNode)
+        return fileName + ".labelstats.json" if fileName else None
+
+    def getLabelMapFileName(self, labelMapVolumeNode):
+        """
+        Get the file that the label map was loaded (or memory-mapped) from. Returns None if it was not loaded from file.
+        """
+        if not labelMapVolumeNode:
+            return None
+        memoryMappedFileName = labelMapVolumeNode.GetAttribute(self.memoryMappedFileNameAttributeName)
+        if memoryMappedFileName:
+            return memoryMappedFileName
+        storageNode = labelMapVolumeNode.GetStorageNode()
+        if not storageNode or not storageNode.GetFileName():
+            return None
+        return storageNode.GetFileName()
+
+    def isLabelMapModifiedSinceRead(self, labelMapVolumeNode):
+        """
+        Check if voxels of the label map may have been changed since they were read from file.
+        """
+        memoryMappedImageDataMTime = labelMapVolumeNode.GetAttribute(self.memoryMappedImageDataMTimeAttributeName)
+        if memoryMappedImageDataMTime:
+            # Memory-mapped label maps have no storage node, any change of the voxels modifies the image data
+            imageData = labelMapVolumeNode.GetImageData()
+            return not imageData or str(imageData.GetMTime()) != memoryMappedImageDataMTime
+        return labelMapVolumeNode.GetModifiedSinceRead()
+
+    def loadLabelStatistics(self, labelMapVolumeNode):
+        """
+        Load label statistics from the sidecar file of the label map.
+        Returns None if the sidecar file does not exist or the label map file has changed since it was written.
+        """
+        sidecarPath = self.getLabelStatisticsSidecarPath(labelMapVolumeNode)
+        if not sidecarPath or not os.path.exists(sidecarPath) or self.isLabelMapModifiedSinceRead(labelMapVolumeNode):
+            return None
+        try:
+            with open(sidecarPath) as f:
+                sidecar = json.load(f)
+            stat = os.stat(self.getLabelMapFileName(labelMapVolumeNode))
+            if sidecar["size"] != stat.st_size or sidecar["mtime"] != stat.st_mtime:
+                return None
+            return {int(labelValue): statistics for labelValue, statistics in sidecar["labels"].items()}
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Failed to read label statistics from {sidecarPath}: {e}")
+            return None
+
+    def saveLabelStatistics(self, labelMapVolumeNode, labelStatistics):
+        """
+        Save label statistics into the sidecar file of the label map so that they do not need to be computed again.
+        """
+        sidecarPath = self.getLabelStatisticsSidecarPath(labelMapVolumeNode)
+        if not sidecarPath:
+            return
+        stat = os.stat(self.getLabelMapFileName(labelMapVolumeNode))
+        sidecar = {"size": stat.st_size, "mtime": stat.st_mtime,
+            "labels": {str(labelValue): statistics for labelValue, statistics in labelStatistics.items()}}
+        try:
+            with open(sidecarPath, "w") as f:
+                json.dump(sidecar, f)
+        except OSError as e:
+            # Atlas folder may be read-only, statistics will be computed again next time
+            logging.warning(f"Failed to write label statistics to {sidecarPath}: {e}")
+
+    def updateLabelStatisticsIndex(self, labelMapVolumeNode):
+        """
+        Load label statistics of the label map from the sidecar file or compute them if not available.
+        """
+        labelStatistics = self.loadLabelStatistics(labelMapVolumeNode)
+        if labelStatistics is None:
+            labelStatistics = self.computeLabelStatisticsFromArray(slicer.util.arrayFromVolume(labelMapVolumeNode))
+            if not self.isLabelMapModifiedSinceRead(labelMapVolumeNode):
+                self.saveLabelStatistics(labelMapVolumeNode, labelStatistics)
+        self.labelStatistics = labelStatistics
+        self.labelStatisticsVolumeNode = labelMapVolumeNode
+
+    def getLabelStatistics(self, labelValue=None, labelMapVolumeNode=None):
+        """
+        Get voxel count, IJK bounding box and IJK centroid of a label value (or all label values if labelValue is None).
+        Statistics are computed if they are not available yet for the label map (the atlas input label map by default).
+        """
+        if labelMapVolumeNode is None:
+            labelMapVolumeNode = self.labelStatisticsVolumeNode or self.atlasInputLabelMapVolumeNode
+        if self.labelStatistics is None or labelMapVolumeNode != self.labelStatisticsVolumeNode:
+            self.updateLabelStatisticsIndex(labelMapVolumeNode)
+        if labelValue is None:
+            return self.labelStatistics
+        return self.labelStatistics.get(labelValue)
+
+    def updateLabelStatisticsAfterMerge(self, outputLabelMap, mergedLabelValues):
+        """
+        Update label statistics after labels were merged, without recomputing them from the voxels.
+        mergedLabelValues maps the label value that the merged labels got to the list of label values that were merged.
+        """
+        for targetLabelValue, sourceLabelValues in mergedLabelValues.items():
+            allLabelValues = set(sourceLabelValues) | {targetLabelValue}
+            merged = self.combineLabelStatistics([self.labelStatistics.pop(labelValue, None) for labelValue in allLabelValues])
+            if merged:
+                self.labelStatistics[targetLabelValue] = merged
+        self.labelStatisticsVolumeNode = outputLabelMap
+
+    def updateLabelStatisticsAfterRemove(self, outputLabelMap, removedLabelValues, backgroundLabelValue=0):
+        """
+        Update label statistics after labels were removed (replaced by background), without recomputing them from the voxels.
+        """
+        self.updateLabelStatisticsAfterMerge(outputLabelMap, {backgroundLabelValue: removedLabelValues})
+
+    @staticmethod
+    def isLabelMappingInvertible(labelMapping, presentLabelValues):
+        """
+        Check if a label mapping can be undone without knowing which voxels it changed.
+        This is the case if no two labels are mapped to the same label and labels are not mapped onto
+        labels that are present in the volume and are kept unchanged.
+        """
+        if presentLabelValues is None:
+            return False
+        newLabelValues = [newLabelValue for oldLabelValue, newLabelValue in labelMapping.items() if oldLabelValue in presentLabelValues]
+        if len(set(newLabelValues)) != len(newLabelValues):
+            return False
+        keptLabelValues = set(presentLabelValues) - set(labelMapping.keys())
+        return not keptLabelValues.intersection(newLabelValues)
+
+    @staticmethod
+    def getVoxelIndexArray(indices, numberOfVoxels):
+        """
+        Store flat voxel indices with the smallest integer type that can address the volume.
+        """
+        import numpy as np
+        return indices.astype(np.uint32 if numberOfVoxels < 2**32 else np.int64)
+
+    def startEditHistoryEntry(self, name, inputLabelMap, outputLabelMap, labelMapping):
+        """
+        Capture information needed for undoing an edit that replaces outputLabelMap voxels by inputLabelMap voxels
+        remapped with labelMapping (dictionary of old label value -> new label value).
+        Must be called before the output is modified. Returns the history entry, which must be passed to
+        finishEditHistoryEntry after the edit is completed.
+        """
+        import numpy as np
+        entry = {"name": name, "volumeNode": outputLabelMap, "labelMapping": dict(labelMapping)}
+        if outputLabelMap is inputLabelMap:
+            # In-place edit: the label mapping fully describes the new content.
+            # Voxel values are only needed for undo if the mapping cannot be inverted.
+            presentLabelValues = self.labelStatistics.keys() if (self.labelStatisticsVolumeNode is inputLabelMap and self.labelStatistics) else None
+            if not self.isLabelMappingInvertible(labelMapping, presentLabelValues):
+                voxels = slicer.util.arrayFromVolume(inputLabelMap).ravel()
+                changedLabelValues = [oldLabelValue for oldLabelValue, newLabelValue in labelMapping.items() if oldLabelValue != newLabelValue]
+                changedVoxelIndices = np.flatnonzero(np.isin(voxels, changedLabelValues))
+                entry["changedVoxelIndices"] = self.getVoxelIndexArray(changedVoxelIndices, voxels.size)
+                entry["previousValues"] = voxels[changedVoxelIndices]
+        else:
+            # The output is overwritten, keep its previous content until the edit is completed to compute the difference
+            entry["inputLabelMap"] = inputLabelMap
+            if outputLabelMap.GetImageData() and slicer.util.arrayFromVolume(outputLabelMap).shape == slicer.util.arrayFromVolume(inputLabelMap).shape:
+                entry["previousLabelMap"] = self.getCompactLabelMap(outputLabelMap)
+        return entry
+
+    def finishEditHistoryEntry(self, entry):
+        """
+        Complete an edit history entry after the edit and add it to the undo history.
+        """
+        import numpy as np
+        if "inputLabelMap" in entry:
+            previousLabelMap = entry.pop("previousLabelMap", None)
+            if previousLabelMap is None:
+                # Output was empty, redo recomputes it from the input
+                entry["inputImageDataMTime"] = entry["inputLabelMap"].GetImageData().GetMTime()
+            else:
+                del entry["inputLabelMap"]
+                voxels = slicer.util.arrayFromVolume(entry["volumeNode"]).ravel()
+                previousVoxels = previousLabelMap.toArray().ravel()
+                changedVoxelIndices = np.flatnonzero(previousVoxels != voxels)
+                entry["changedVoxelIndices"] = self.getVoxelIndexArray(changedVoxelIndices, voxels.size)
+                entry["previousValues"] = previousVoxels[changedVoxelIndices]
+                entry["newValues"] = voxels[changedVoxelIndices]
+        self.undoHistory.append(entry)
+        del self.undoHistory[:-self.maximumEditHistoryLength]
+        self.redoHistory = []
+
+    @staticmethod
+    def applyLabelMapping(voxels, labelMapping):
+        """
+        Replace label values in-place in a voxel array.
+        """
+        from AtlasEditorLib import LabelMapUtils
+        LabelMapUtils.applyLabelMapping(voxels, labelMapping)
+
+    def canUndo(self):
+        return len(self.undoHistory) > 0
+
+    def canRedo(self):
+        return len(self.redoHistory) > 0
+
+    def clearEditHistory(self):
+        self.undoHistory = []
+        self.redoHistory = []
+
+    def undo(self):
+        """
+        Revert the last merge or remove operation.
+        Returns the name of the undone operation.
+        """
+        if not self.undoHistory:
+            raise RuntimeError("Nothing to undo")
+        entry = self.undoHistory.pop()
+        volumeNode = entry["volumeNode"]
+        if "inputLabelMap" in entry:
+            # Output did not have content before the edit
+            volumeNode.SetAndObserveImageData(None)
+        else:
+            voxels = slicer.util.arrayFromVolume(volumeNode).reshape(-1)
+            if "changedVoxelIndices" in entry:
+                voxels[entry["changedVoxelIndices"]] = entry["previousValues"]
+            else:
+                self.applyLabelMapping(voxels, {newLabelValue: oldLabelValue for oldLabelValue, newLabelValue in entry["labelMapping"].items()})
+            slicer.util.arrayFromVolumeModified(volumeNode)
+        self.redoHistory.append(entry)
+        if self.labelStatisticsVolumeNode is volumeNode:
+            self.labelStatistics = None
+        return entry["name"]
+
+    def redo(self):
+        """
+        Apply the last undone merge or remove operation again.
+        Returns the name of the redone operation.
+        """
+        if not self.redoHistory:
+            raise RuntimeError("Nothing to redo")
+        entry = self.redoHistory[-1]
+        volumeNode = entry["volumeNode"]
+        if "inputLabelMap" in entry:
+            inputLabelMap = entry["inputLabelMap"]
+            if not inputLabelMap.GetImageData() or inputLabelMap.GetImageData().GetMTime() != entry["inputImageDataMTime"]:
+                raise RuntimeError(f"Cannot redo '{entry['name']}': input label map has been modified")
+            volumeNode.SetAndObserveImageData(vtk.vtkImageData())
+            volumeNode.GetImageData().DeepCopy(inputLabelMap.GetImageData())
+            self.applyLabelMapping(slicer.util.arrayFromVolume(volumeNode).reshape(-1), entry["labelMapping"])
+            slicer.util.arrayFromVolumeModified(volumeNode)
+        else:
+            voxels = slicer.util.arrayFromVolume(volumeNode).reshape(-1)
+            if "newValues" in entry:
+                voxels[entry["changedVoxelIndices"]] = entry["newValues"]
+            elif "changedVoxelIndices" in entry:
+                newValues = entry["previousValues"].copy()
+                self.applyLabelMapping(newValues, entry["labelMapping"])
+                voxels[entry["changedVoxelIndices"]] = newValues
+            else:
+                self.applyLabelMapping(voxels, entry["labelMapping"])
+            slicer.util.arrayFromVolumeModified(volumeNode)
+        self.redoHistory.pop()
+        self.undoHistory.append(entry)
+        if self.labelStatisticsVolumeNode is volumeNode:
+            self.labelStatistics = None
+        return entry["name"]
+
+    @staticmethod
+    def getCompactLabelMap(labelMapVolumeNode):
+        """
+        Get a compact (run-length encoded) copy of the voxels of a label map volume node.
+        """
+        from AtlasEditorLib import CompactLabelMap
+        return CompactLabelMap.fromArray(slicer.util.arrayFromVolume(labelMapVolumeNode))
+
+    @staticmethod
+    def updateLabelMapFromCompact(labelMapVolumeNode, compactLabelMap):
+        """
+        Set voxels of a label map volume node from a compact label map.
+        Voxels are written in-place if the volume already has the same size and type.
+        """
+        imageData = labelMapVolumeNode.GetImageData()
+        if imageData and tuple(reversed(imageData.GetDimensions())) == compactLabelMap.shape:
+            voxels = slicer.util.arrayFromVolume(labelMapVolumeNode)
+            if voxels.dtype == compactLabelMap.dtype:
+                compactLabelMap.toArray(out=voxels)
+                slicer.util.arrayFromVolumeModified(labelMapVolumeNode)
+                return
+        slicer.util.updateVolumeFromArray(labelMapVolumeNode, compactLabelMap.toArray())
+
+    def storeAtlasSnapshot(self, name, labelMapVolumeNode):
+        """
+        Store content of a label map in compact form, so that intermediate atlases can be kept without
+        keeping full-size label map volumes in the scene. Returns the compact label map.
+        """
+        ijkToRas = vtk.vtkMatrix4x4()
+        labelMapVolumeNode.GetIJKToRASMatrix(ijkToRas)
+        compactLabelMap = self.getCompactLabelMap(labelMapVolumeNode)
+        self.atlasSnapshots[name] = (compactLabelMap, ijkToRas)
+        return compactLabelMap
+
+    def restoreAtlasSnapshot(self, name, labelMapVolumeNode):
+        """
+        Replace content of a label map by an atlas snapshot (see storeAtlasSnapshot).
+        Edit history of the label map is cleared, as the edits do not apply to the restored content.
+        """
+        compactLabelMap, ijkToRas = self.atlasSnapshots[name]
+        self.updateLabelMapFromCompact(labelMapVolumeNode, compactLabelMap)
+        labelMapVolumeNode.SetIJKToRASMatrix(ijkToRas)
+        self.undoHistory = [entry for entry in self.undoHistory if entry["volumeNode"] is not labelMapVolumeNode]
+        self.redoHistory = [entry for entry in self.redoHistory if entry["volumeNode"] is not labelMapVolumeNode]
+        if self.labelStatisticsVolumeNode is labelMapVolumeNode:
+            self.labelStatistics = None
+
+    def removeAtlasSnapshot(self, name):
+        del self.atlasSnapshots[name]
+
+    def downloadFromURL(self, url, filename, checksum=None):
+        """
+        Download file from URL and save to filename (folder must exist).
+        Data is first written to filename + ".part" so that an interrupted transfer is resumed
+        with an HTTP range request on the next call. If checksum ("SHA256:<hex>") is specified
+        then the downloaded content is verified before it is moved to filename.
+        Returns the checksum of the downloaded file, or -1 on failure.
+        """
+        import shutil
+        import urllib.error
+        import urllib.request
+        partialFilename = filename + ".part"
+        for attempt in range(2):
+            try:
+                logging.info(f"Downloading file from {url} ...")
+                request = urllib.request.Request(url)
+                resumePosition = os.path.getsize(partialFilename) if os.path.exists(partialFilename) else 0
+                if resumePosition > 0:
+                    request.add_header("Range", f"bytes={resumePosition}-")
+                try:
+                    with urllib.request.urlopen(request, timeout=self.downloadTimeoutSec) as response:
+                        if resumePosition > 0 and response.status != 206:
+                            # Server does not support range requests, start over
+                            resumePosition = 0
+                        with open(partialFilename, "ab" if resumePosition > 0 else "wb") as f:
+                            shutil.copyfileobj(response, f, self.downloadChunkSize)
+                except urllib.error.HTTPError as e:
+                    # 416 (range not satisfiable) means the partial file is already complete
+                    if e.code != 416 or resumePosition == 0:
+                        raise
+            except Exception as e:
+                logging.error(f"Failed to download file from {url}: {e}")
+                return -1
+
+            fileChecksum = self.computeChecksum(partialFilename)
+            if checksum and fileChecksum.lower() != checksum.lower():
+                # Corrupted or stale partial file, discard it and download from the beginning
+                logging.warning(f"Checksum mismatch for {url} (expected {checksum}, got {fileChecksum})")
+                os.remove(partialFilename)
+                continue
+            os.replace(partialFilename, filename)
+            return fileChecksum
+
+        return -1
+
+    @staticmethod
+    def computeChecksum(filename, algorithm="SHA256"):
+        """
+        Compute checksum of a file in the same "ALGORITHM:hexdigest" format that SampleData uses.
+        """
+        import hashlib
+        fileHash = hashlib.new(algorithm.lower())
+        with open(filename, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                fileHash.update(chunk)
+        return f"{algorithm}:{fileHash.hexdigest()}"
+
+    def getAtlasCacheDirectory(self, atlasIndex):
+        """
+        Get the folder where downloaded files of an atlas are cached.
+        Each atlas has its own folder so that different atlases do not overwrite each other.
+        """
+        cacheDirectory = self.atlasCacheDirectory
+        if not cacheDirectory:
+            cacheDirectory = os.path.join(slicer.mrmlScene.GetCacheManager().GetRemoteCacheDirectory(), "OpenAnatomyAtlas")
+        atlasCacheDirectory = os.path.join(cacheDirectory, str(atlasIndex))
+        os.makedirs(atlasCacheDirectory, exist_ok=True)
+        return atlasCacheDirectory
+
+    def downloadAtlasFiles(self, atlasIndex, urls=None, checksums=None):
+        """
+        Download label map, color table and structure file of an atlas into the atlas cache folder.
+        The three files are downloaded concurrently. Files that are already in the cache and
+        have not changed since they were downloaded are not downloaded again.
+        urls and checksums default to the atlas_data and atlas_checksums entries of atlasIndex.
+        Returns the list of local file paths, in the same order as in atlas_data.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        if urls is None:
+            urls = self.atlas_data[atlasIndex]
+        if checksums is None:
+            checksums = self.atlas_checksums.get(atlasIndex, [None] * len(urls))
+
+        atlasCacheDirectory = self.getAtlasCacheDirectory(atlasIndex)
+        filePaths = [os.path.join(atlasCacheDirectory, fileName) for fileName in self.atlas_file_names]
+
+        # The manifest stores the checksum of each downloaded file along with its size and modification time,
+        # which allows quick detection of changed files without reading the whole file again.
+        manifestPath = os.path.join(atlasCacheDirectory, "manifest.json")
+        try:
+            with open(manifestPath) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+
+        def isCached(url, filePath, checksum):
+            entry = manifest.get(os.path.basename(filePath))
+            if not entry or entry.get("url") != url or not os.path.exists(filePath):
+                return False
+            if checksum and entry["checksum"].lower() != checksum.lower():
+                return False
+            stat = os.stat(filePath)
+            return stat.st_size == entry["size"] and stat.st_mtime == entry["mtime"]
+
+        downloads = []
+        for url, filePath, checksum in zip(urls, filePaths, checksums):
+            if isCached(url, filePath, checksum):
+                logging.info(f"Using cached file {filePath}")
+            else:
+                downloads.append((url, filePath, checksum))
+
+        with ThreadPoolExecutor(max_workers=max(len(downloads), 1)) as executor:
+            results = list(executor.map(lambda download: self.downloadFromURL(*download), downloads))
+
+        failedUrls = []
+        for (url, filePath, checksum), fileChecksum in zip(downloads, results):
+            if fileChecksum == -1:
+                failedUrls.append(url)
+                continue
+            stat = os.stat(filePath)
+            manifest[os.path.basename(filePath)] = {"url": url, "checksum": fileChecksum, "size": stat.st_size, "mtime": stat.st_mtime}
+
+        with open(manifestPath, "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        if failedUrls:
+            raise RuntimeError(f"Failed to download atlas files: {failedUrls}")
+
+        return filePaths
+
+    def getLoadedNodeByFileName(self, fileName, className):
+        """
+        Get a node that has already been loaded from fileName, to avoid loading the same file again.
+        """
+        for node in slicer.util.getNodesByClass(className):
+            memoryMappedFileName = node.GetAttribute(self.memoryMappedFileNameAttributeName)
+            if memoryMappedFileName and os.path.normpath(memoryMappedFileName) == os.path.normpath(fileName):
+                return node
+            storageNode = node.GetStorageNode()
+            if storageNode and os.path.normpath(storageNode.GetFileName() or "") == os.path.normpath(fileName):
+                return node
+        return None
+
+    def loadLabelMapVolume(self, fileName, colorNode=None):
+        """
+        Load a label map volume from file. Uncompressed NRRD files are memory-mapped (if memoryMapLabelMaps is enabled),
+        other files are read into memory.
+        """
+        if self.memoryMapLabelMaps and fileName.lower().endswith((".nrrd", ".nhdr")):
+            try:
+                return self.loadMemoryMappedLabelMapVolume(fileName, colorNode)
+            except ValueError as e:
+                logging.info(f"Label map is loaded into memory: {e}")
+        properties = {'labelmap': True}
+        if colorNode:
+            properties['colorNodeID'] = colorNode.GetID()
+        return slicer.util.loadVolume(fileName, properties=properties)
+
+    def loadMemoryMappedLabelMapVolume(self, fileName, colorNode=None):
+        """
+        Create a label map volume that uses the voxels of a raw encoded NRRD file directly from the file system.
+        Voxels are read when they are first accessed (e.g., displayed, merged, or removed), so the volume is available
+        immediately and unused parts of the file do not take up memory. The file is mapped copy-on-write,
+        modified voxels are not written back to the file.
+        The volume has no storage node, therefore the file is never overwritten when the scene is saved.
+        """
+        from vtk.util import numpy_support
+        from AtlasEditorLib import LabelMapIO
+        voxels, header = LabelMapIO.memoryMapNrrd(fileName)
+        if voxels.ndim != 3:
+            raise ValueError(f"Only 3D NRRD files can be memory-mapped, {fileName} has {voxels.ndim} dimensions")
+
+        imageData = vtk.vtkImageData()
+        imageData.SetDimensions(voxels.shape[2], voxels.shape[1], voxels.shape[0])
+        # The VTK array refers to the mapped memory and keeps the numpy array (and so the mapping) alive
+        scalars = numpy_support.numpy_to_vtk(voxels.reshape(-1), deep=False)
+        scalars.SetName("ImageScalars")
+        imageData.GetPointData().SetScalars(scalars)
+
+        baseName = os.path.basename(fileName)
+        labelMapVolumeNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode",
+            slicer.mrmlScene.GenerateUniqueName(baseName[:baseName.rfind(".")]))
+        labelMapVolumeNode.SetIJKToRASMatrix(slicer.util.vtkMatrixFromArray(LabelMapIO.getNrrdIjkToRasMatrix(header)))
+        labelMapVolumeNode.SetAndObserveImageData(imageData)
+        labelMapVolumeNode.CreateDefaultDisplayNodes()
+        if colorNode:
+            labelMapVolumeNode.GetDisplayNode().SetAndObserveColorNodeID(colorNode.GetID())
+        labelMapVolumeNode.SetAttribute(self.memoryMappedFileNameAttributeName, os.path.abspath(fileName))
+        labelMapVolumeNode.SetAttribute(self.memoryMappedImageDataMTimeAttributeName, str(imageData.GetMTime()))
+        return labelMapVolumeNode
 
     def downloadAtlas(self, atlasIndex, atlasInputNode, atlasStructureInputPath, structureTree, atlasOutputNode):
         """
@@ -323,21 +1074,17 @@ class AtlasEditorLogic(ScriptedLoadableModuleLogic):
         if atlasIndex != 0:
             slicer.util.errorDisplay("Atlas not yet supported.", waitCursor=True)
             return
-        
-        # Set up paths for downloading atlas data using Slicer's cache directory
-        cache_path = slicer.mrmlScene.GetCacheManager().GetRemoteCacheDirectory()
-        atlas_path = cache_path + "/atlas.nrrd"
-        atlas_lut_path = cache_path + "/atlas-lut.ctbl"
-        atlas_structure_path = cache_path + "/atlas-structure.json"
-
-        # Download atlas data from atlas_data dictionary
-        self.downloadFromURL(self.atlas_data[atlasIndex][0], atlas_path)
-        self.downloadFromURL(self.atlas_data[atlasIndex][1], atlas_lut_path)
-        self.downloadFromURL(self.atlas_data[atlasIndex][2], atlas_structure_path)
-
-        # Load atlas data into Slicer as a labelmap volume
-        atlas_lut = slicer.util.loadColorTable(atlas_lut_path)
-        atlas = slicer.util.loadVolume(atlas_path, properties={'labelmap': True, 'colorNodeID': atlas_lut.GetID()})
+
+        # Download atlas data from atlas_data dictionary into Slicer's cache directory
+        atlas_path, atlas_lut_path, atlas_structure_path = self.downloadAtlasFiles(atlasIndex)
+
+        # Load atlas data into Slicer as a labelmap volume (reuse nodes if the same files are already loaded)
+        atlas_lut = self.getLoadedNodeByFileName(atlas_lut_path, "vtkMRMLColorTableNode")
+        if not atlas_lut:
+            atlas_lut = slicer.util.loadColorTable(atlas_lut_path)
+        atlas = self.getLoadedNodeByFileName(atlas_path, "vtkMRMLLabelMapVolumeNode")
+        if not atlas:
+            atlas = self.loadLabelMapVolume(atlas_path, atlas_lut)
         
         # Update the 'Manually Import Atlas' fields
         atlasInputNode.setCurrentNode(atlas)
@@ -368,6 +1115,7 @@ class AtlasEditorLogic(ScriptedLoadableModuleLogic):
                     self.atlasStructureTree = qt.QTreeWidgetItem(self.atlasStructureTreeWidget)
                     self.atlasStructureTree.setFlags(self.atlasStructureTree.flags() | qt.Qt.ItemIsTristate | qt.Qt.ItemIsUserCheckable)
                     self.atlasStructureTree.setText(0, item['annotation']['name'])
+                    self.atlasStructureTreeItemsById.setdefault(item['@id'], []).append(self.atlasStructureTree)
                     currentTree = self.atlasStructureTree
                     for member in item['member']:
                         groups.append(member)
@@ -381,6 +1129,7 @@ class AtlasEditorLogic(ScriptedLoadableModuleLogic):
                     child.setText(0, item['annotation']['name'])
                     child.setFlags(child.flags() | qt.Qt.ItemIsTristate | qt.Qt.ItemIsUserCheckable)
                     child.setCheckState(0, qt.Qt.Unchecked)
+                    self.atlasStructureTreeItemsById.setdefault(item['@id'], []).append(child)
                     if item['@type'] == "Group":
                         groups1 = []
                         for member in item['member']:
@@ -393,8 +1142,48 @@ class AtlasEditorLogic(ScriptedLoadableModuleLogic):
         """
         # clear the tree
         self.atlasStructureTreeWidget.clear()
+        self.atlasStructureTreeItemsById = {}
+        self.atlasStructureHiddenIds = set()
         self.buildHierarchy()
         self.atlasStructureTreeWidget.expandToDepth(0)
+        if self.atlasStructureFilterText:
+            self.filterStructureView(self.atlasStructureFilterText)
+
+    def filterStructureView(self, filterText):
+        """
+        Show only structures whose name contains filterText, with the groups that contain them and their members.
+        All structures are shown if filterText is empty. Only items whose visibility changes are updated,
+        so that the view can be filtered while the user is typing.
+        """
+        self.atlasStructureFilterText = filterText
+        if not self.atlasStructureSearchIndex or not self.atlasStructureTreeItemsById:
+            return
+
+        if filterText.strip():
+            matchingIds, ancestorIds, visibleIds = self.atlasStructureSearchIndex.getMatchingBranches(filterText)
+            hiddenIds = self.atlasStructureTreeItemsById.keys() - visibleIds
+        else:
+            matchingIds, ancestorIds, hiddenIds = set(), set(), set()
+
+        self.atlasStructureTreeWidget.setUpdatesEnabled(False)
+        try:
+            for structureId in self.atlasStructureHiddenIds - hiddenIds:
+                for item in self.atlasStructureTreeItemsById[structureId]:
+                    item.setHidden(False)
+            for structureId in hiddenIds - self.atlasStructureHiddenIds:
+                for item in self.atlasStructureTreeItemsById[structureId]:
+                    item.setHidden(True)
+            self.atlasStructureHiddenIds = hiddenIds
+            if filterText.strip():
+                # Expand the groups that contain matching structures to make the matches visible
+                for structureId in ancestorIds:
+                    for item in self.atlasStructureTreeItemsById.get(structureId, []):
+                        item.setExpanded(True)
+            else:
+                self.atlasStructureTreeWidget.collapseAll()
+                self.atlasStructureTreeWidget.expandToDepth(0)
+        finally:
+            self.atlasStructureTreeWidget.setUpdatesEnabled(True)
 
     def getCheckedItems(self, tree=None):
         """
@@ -448,11 +1237,170 @@ class AtlasEditorLogic(ScriptedLoadableModuleLogic):
         """
         Helper function to get the ids by name for merging/removing function.
         """
+        if self.atlasStructureIdByName is not None:
+            return self.atlasStructureIdByName.get(name)
         for item in self.atlasStructureJSON:
             if (item['@type'] == "Structure" or item['@type'] == "Group"):
                 if item['annotation']['name'] == name:
                     return item['@id']  
         
+    def getRecipeFromCheckedItems(self, operation):
+        """
+        Create a grouping recipe (see AtlasEditorLib.AtlasRecipe) from the items checked in the structure view,
+        describing the merge or remove operation that the Merge or Remove button would perform.
+        """
+        checkedItems = self.getCheckedItems()
+        operations = []
+        if operation == "merge":
+            for mergedSegmentName, itemNames in checkedItems.items():
+                if itemNames:
+                    operations.append({"operation": "merge", "name": mergedSegmentName,
+                        "structures": [self.getIdfromName(itemName) for itemName in itemNames]})
+        elif operation == "remove":
+            itemNames = [itemName for itemNames in checkedItems.values() for itemName in itemNames]
+            if itemNames:
+                operations.append({"operation": "remove", "structures": [self.getIdfromName(itemName) for itemName in itemNames]})
+        else:
+            raise ValueError(f"Invalid recipe operation: {operation}")
+        return {"operations": operations}
+
+    def applyRecipeToAtlases(self, recipe, atlases, outputFolder, numberOfWorkers=None, renumberLabels=False):
+        """
+        Apply a grouping recipe to several atlases, without GUI, in parallel worker processes.
+        recipe is a recipe dictionary or path to a recipe JSON file.
+        Each item of atlases is either an atlas ID of atlas_data (files are downloaded) or a list of
+        label map (.nrrd), color table (.ctbl) and atlas structure (.json) file paths (same order as in atlas_data).
+        Output label map and color table files are written into outputFolder.
+        If renumberLabels is enabled then remaining labels are renumbered contiguously, label maps are stored with the
+        smallest integer type that fits, and the label mapping is written into a "-labelmapping.json" file for each atlas.
+        Returns list of results (output file paths, label mapping, structures not found), one for each atlas.
+        """
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        from AtlasEditorLib import AtlasRecipe
+        if isinstance(recipe, str):
+            recipe = AtlasRecipe.loadRecipe(recipe)
+        AtlasRecipe.validateRecipe(recipe)
+
+        jobs = []
+        outputNames = set()
+        for atlasIndex, atlas in enumerate(atlases):
+            if isinstance(atlas, int):
+                atlasFilePaths = self.downloadAtlasFiles(atlas)
+                outputName = f"atlas{atlas}"
+            else:
+                atlasFilePaths = list(atlas)
+                outputName = os.path.splitext(os.path.basename(atlasFilePaths[0]))[0]
+            if outputName in outputNames:
+                outputName = f"{outputName}_{atlasIndex}"
+            outputNames.add(outputName)
+            jobs.append(atlasFilePaths + [os.path.join(outputFolder, outputName + ".nrrd"), os.path.join(outputFolder, outputName + "-lut.ctbl"),
+                os.path.join(outputFolder, outputName + "-labelmapping.json") if renumberLabels else None])
+
+        if numberOfWorkers is None:
+            numberOfWorkers = min(len(jobs), os.cpu_count() or 1)
+        if numberOfWorkers <= 1:
+            results = [AtlasRecipe.applyRecipeToAtlasFiles(recipe, *job) for job in jobs]
+        else:
+            # Workers are spawned (not forked) because the application state must not be copied into them
+            context = multiprocessing.get_context("spawn")
+            context.set_executable(self.getWorkerPythonExecutable())
+            with ProcessPoolExecutor(max_workers=numberOfWorkers, mp_context=context) as executor:
+                futures = [executor.submit(AtlasRecipe.applyRecipeToAtlasFiles, recipe, *job) for job in jobs]
+                results = [future.result() for future in futures]
+
+        for result in results:
+            if result["structuresNotFound"]:
+                logging.warning(f"Structures not found in {result['labelMap']}: {result['structuresNotFound']}")
+        return results
+
+    @staticmethod
+    def getWorkerPythonExecutable():
+        """
+        Get the Python interpreter for starting worker processes.
+        In Slicer sys.executable is the application itself, therefore Slicer's Python interpreter (PythonSlicer) is used.
+        """
+        import shutil
+        import sys
+        if os.path.basename(sys.executable).lower().startswith("python"):
+            return sys.executable
+        pythonExecutable = shutil.which("PythonSlicer", path=os.path.dirname(sys.executable) + os.pathsep + os.environ.get("PATH", ""))
+        if not pythonExecutable:
+            raise RuntimeError("PythonSlicer executable is not found, worker processes cannot be started")
+        return pythonExecutable
+
+    def startPreview(self, labelMapVolumeNode):
+        """
+        Start showing the result of merge/remove on labelMapVolumeNode without modifying its voxels.
+        A temporary copy of the label map's color table is displayed instead of the original,
+        in which merged labels get the color of the label they are merged into and removed labels become transparent.
+        """
+        self.stopPreview()
+        displayNode = labelMapVolumeNode.GetDisplayNode() if labelMapVolumeNode else None
+        if not displayNode or not displayNode.GetColorNode():
+            raise ValueError("Label map must have a color table for previewing")
+        originalColorNode = displayNode.GetColorNode()
+
+        self.previewColorNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLColorTableNode")
+        self.previewColorNode.Copy(originalColorNode)
+        self.previewColorNode.SetName(slicer.mrmlScene.GenerateUniqueName(originalColorNode.GetName() + " preview"))
+        self.previewColorNode.SetHideFromEditors(True)
+        self.previewColorNode.SetSaveWithScene(False)
+
+        self.previewVolumeNode = labelMapVolumeNode
+        self.previewOriginalColorNode = originalColorNode
+        self.previewLabelMapping = {}
+        self.previewColors = {}
+        for labelValue in range(originalColorNode.GetNumberOfColors()):
+            name = originalColorNode.GetColorName(labelValue)
+            if name and name != "(none)":
+                self.previewColors[labelValue] = (name, list(originalColorNode.GetLookupTable().GetTableValue(labelValue)))
+        displayNode.SetAndObserveColorNodeID(self.previewColorNode.GetID())
+
+    def updatePreview(self, operation):
+        """
+        Update preview colors to show the result of the "merge" or "remove" operation of the currently checked items.
+        Only the colors of labels whose mapping changed since the last update are modified.
+        """
+        from AtlasEditorLib import AtlasRecipe
+        if not self.previewColorNode:
+            return
+        recipe = self.getRecipeFromCheckedItems(operation)
+        labelMapping, _, _ = AtlasRecipe.getLabelMappingFromRecipe(recipe, self.atlasStructureJSON, self.previewColors)
+
+        lookupTable = self.previewColorNode.GetLookupTable()
+        originalLookupTable = self.previewOriginalColorNode.GetLookupTable()
+        changedLabelValues = {labelValue for labelValue in set(labelMapping) | set(self.previewLabelMapping)
+            if labelMapping.get(labelValue) != self.previewLabelMapping.get(labelValue)}
+        for labelValue in changedLabelValues:
+            if labelValue not in labelMapping:
+                lookupTable.SetTableValue(labelValue, originalLookupTable.GetTableValue(labelValue))
+            elif labelMapping[labelValue] == 0:
+                lookupTable.SetTableValue(labelValue, 0.0, 0.0, 0.0, 0.0)
+            else:
+                lookupTable.SetTableValue(labelValue, originalLookupTable.GetTableValue(labelMapping[labelValue]))
+        self.previewLabelMapping = labelMapping
+        if changedLabelValues:
+            lookupTable.Modified()
+            self.previewColorNode.Modified()
+
+    def stopPreview(self):
+        """
+        Stop previewing and restore the original color table of the label map.
+        """
+        if not self.previewColorNode:
+            return
+        displayNode = self.previewVolumeNode.GetDisplayNode()
+        if displayNode:
+            displayNode.SetAndObserveColorNodeID(self.previewOriginalColorNode.GetID())
+        slicer.mrmlScene.RemoveNode(self.previewColorNode)
+        self.previewColorNode = None
+        self.previewOriginalColorNode = None
+        self.previewVolumeNode = None
+        self.previewLabelMapping = {}
+        self.previewColors = {}
+
+    @profiledLogicMethod
     def remove(self, inputLabelMap, outputLabelMap):
         """
         Run the processing algorithm.
@@ -474,6 +1422,9 @@ class AtlasEditorLogic(ScriptedLoadableModuleLogic):
         
         structureIds = self.getStructureIdOfGroups(groupIdsToRemove)
 
+        # Make sure label statistics describe the input so that they can be updated incrementally
+        self.getLabelStatistics(labelMapVolumeNode=inputLabelMap)
+
         # Create segmentation
         segmentationNode = slicer.vtkMRMLSegmentationNode()
         slicer.mrmlScene.AddNode(segmentationNode)
@@ -485,6 +1436,7 @@ class AtlasEditorLogic(ScriptedLoadableModuleLogic):
         slicer.vtkSlicerSegmentationsModuleLogic.ImportLabelmapToSegmentationNode(inputLabelMap, segmentationNode)
 
         segmentsNotFound = []
+        removedLabelValues = []
         for i, structureId in enumerate(structureIds):
             slicer.util.showStatusMessage(f"Merging segment ({i}/{len(structureIds)}): {structureId}")
             slicer.app.processEvents(qt.QEventLoop.ExcludeUserInputEvents)
@@ -492,12 +1444,18 @@ class AtlasEditorLogic(ScriptedLoadableModuleLogic):
             if not segmentID:
                 segmentsNotFound.append(structureId)
                 continue
+            removedLabelValues.append(segmentationNode.GetSegmentation().GetSegment(segmentID).GetLabelValue())
             segmentationNode.RemoveSegment(segmentID)
 
         slicer.util.showStatusMessage("Export to labelmap")
         slicer.app.processEvents(qt.QEventLoop.ExcludeUserInputEvents)
         slicer.app.pauseRender()
-        slicer.vtkSlicerSegmentationsModuleLogic.ExportAllSegmentsToLabelmapNode(segmentationNode, outputLabelMap)
+        historyEntry = self.startEditHistoryEntry("Remove", inputLabelMap, outputLabelMap, {labelValue: 0 for labelValue in removedLabelValues})
+
+        # Keep the input geometry and label values so that voxel indices (and label statistics) remain valid
+        self.exportSegmentsToLabelMap(segmentationNode, inputLabelMap, outputLabelMap)
+        self.finishEditHistoryEntry(historyEntry)
+        self.updateLabelStatisticsAfterRemove(outputLabelMap, removedLabelValues)
 
         slicer.util.showStatusMessage("Cleanup", 1000)
         slicer.app.processEvents(qt.QEventLoop.ExcludeUserInputEvents)
@@ -511,19 +1469,73 @@ class AtlasEditorLogic(ScriptedLoadableModuleLogic):
         slicer.app.processEvents(qt.QEventLoop.ExcludeUserInputEvents)
         
 
-    def mergeSegments(self, segmentationNode, segmentsToMerge, mergedSegmentName):
+    def exportSegmentsToLabelMap(self, segmentationNode, inputLabelMap, outputLabelMap):
+        """
+        Export all segments into the output label map, keeping the input geometry and the label value of each segment.
+        Without an export color table segments would be numbered in segment order, which would not match the label
+        mappings that the edit history and label statistics are updated with.
+        """
+        segmentation = segmentationNode.GetSegmentation()
+        segmentIds = vtk.vtkStringArray()
+        segmentation.GetSegmentIDs(segmentIds)
+        segmentIds = [segmentIds.GetValue(index) for index in range(segmentIds.GetNumberOfValues())]
+
+        # The export color table is looked up by segment name. Names may not be unique, therefore segments are
+        # temporarily named by their ID.
+        exportColorNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLColorTableNode")
+        exportColorNode.SetTypeToUser()
+        exportColorNode.SetHideFromEditors(True)
+        exportColorNode.SetSaveWithScene(False)
+        exportColorNode.SetNumberOfColors(max([segmentation.GetSegment(segmentId).GetLabelValue() for segmentId in segmentIds], default=0) + 1)
+        exportColorNode.SetColor(0, "background", 0.0, 0.0, 0.0, 0.0)
+        segmentNames = {}
+        for segmentId in segmentIds:
+            segment = segmentation.GetSegment(segmentId)
+            segmentNames[segmentId] = segment.GetName()
+            segment.SetName(segmentId)
+            exportColorNode.SetColor(segment.GetLabelValue(), segmentId, *segment.GetColor(), 1.0)
+
+        displayNode = outputLabelMap.GetDisplayNode() or inputLabelMap.GetDisplayNode()
+        colorNodeId = displayNode.GetColorNodeID() if displayNode else None
+        exportIds = vtk.vtkStringArray()
+        for segmentId in segmentIds:
+            exportIds.InsertNextValue(segmentId)
+        try:
+            success = slicer.vtkSlicerSegmentationsModuleLogic.ExportSegmentsToLabelmapNode(segmentationNode, exportIds, outputLabelMap,
+                None, slicer.vtkSegmentation.EXTENT_REFERENCE_GEOMETRY, exportColorNode)
+        finally:
+            for segmentId, segmentName in segmentNames.items():
+                segmentation.GetSegment(segmentId).SetName(segmentName)
+            # Label values are not changed, the label map keeps its color table
+            if colorNodeId and outputLabelMap.GetDisplayNode():
+                outputLabelMap.GetDisplayNode().SetAndObserveColorNodeID(colorNodeId)
+            slicer.mrmlScene.RemoveNode(exportColorNode)
+        if not success:
+            raise RuntimeError(f"Failed to export segments to {outputLabelMap.GetName()}")
+
+    def getSegmentEditorWidget(self, segmentationNode):
+        """
+        Get a segment editor widget (not shown) for accessing segment editor effects.
+        Creating the widget is slow, therefore it is created when first needed and then reused.
+        """
+        if self.segmentEditorWidget is None:
+            self.segmentEditorWidget = slicer.qMRMLSegmentEditorWidget()
+            self.segmentEditorWidget.setMRMLScene(slicer.mrmlScene)
+        if not self.segmentEditorNode or not slicer.mrmlScene.IsNodePresent(self.segmentEditorNode):
+            # The node is removed when the scene is closed
+            self.segmentEditorNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSegmentEditorNode")
+            self.segmentEditorWidget.setMRMLSegmentEditorNode(self.segmentEditorNode)
+        self.segmentEditorWidget.setSegmentationNode(segmentationNode)
+        return self.segmentEditorWidget
+
+    def mergeSegments(self, segmentationNode, segmentsToMerge, mergedSegmentName, mergedLabelValues=None):
 
         groupIdsToMerge = []
         for group in segmentsToMerge:
             groupIdsToMerge.append(self.getIdfromName(group))
         structureIds = self.getStructureIdOfGroups(groupIdsToMerge)
 
-        # Create temporary segment editor to get access to effects
-        segmentEditorWidget = slicer.qMRMLSegmentEditorWidget()
-        segmentEditorWidget.setMRMLScene(slicer.mrmlScene)
-        self.segmentEditorNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSegmentEditorNode")
-        segmentEditorWidget.setMRMLSegmentEditorNode(self.segmentEditorNode)
-        segmentEditorWidget.setSegmentationNode(segmentationNode)
+        segmentEditorWidget = self.getSegmentEditorWidget(segmentationNode)
         self.segmentEditorNode.SetOverwriteMode(slicer.vtkMRMLSegmentEditorNode.OverwriteAllSegments) 
         self.segmentEditorNode.SetMaskMode(slicer.vtkMRMLSegmentationNode.EditAllowedEverywhere)
 
@@ -531,9 +1543,10 @@ class AtlasEditorLogic(ScriptedLoadableModuleLogic):
         firstSegment = structureIds[0]
         selectedSegmentID = segmentationNode.GetSegmentation().GetSegmentIdBySegmentName(firstSegment)
         if not selectedSegmentID:
-            segmentsNotFound.append(structureId)
+            segmentsNotFound.append(firstSegment)
             return segmentsNotFound
         self.segmentEditorNode.SetSelectedSegmentID(selectedSegmentID)
+        sourceLabelValues = []
 
         segmentEditorWidget.setActiveEffectByName("Logical operators")
         effect = segmentEditorWidget.activeEffect()
@@ -550,18 +1563,25 @@ class AtlasEditorLogic(ScriptedLoadableModuleLogic):
             if not modifierSegmentID:
                 segmentsNotFound.append(structureId)
                 continue
+            sourceLabelValues.append(segmentationNode.GetSegmentation().GetSegment(modifierSegmentID).GetLabelValue())
             effect.setParameter("ModifierSegmentID",modifierSegmentID)
             effect.self().onApply()
         
         segmentationNode.GetSegmentation().GetSegment(selectedSegmentID).SetName(mergedSegmentName)
+        if mergedLabelValues is not None:
+            mergedLabelValues[segmentationNode.GetSegmentation().GetSegment(selectedSegmentID).GetLabelValue()] = sourceLabelValues
 
         return segmentsNotFound
 
+    @profiledLogicMethod
     def merge(self, inputLabelMap, outputLabelMap):
         """
         Run the processing algorithm.
         Can be used without GUI widget.
         """
+        # Make sure label statistics describe the input so that they can be updated incrementally
+        self.getLabelStatistics(labelMapVolumeNode=inputLabelMap)
+
         # Create segmentation
         segmentationNode = slicer.vtkMRMLSegmentationNode()
         slicer.mrmlScene.AddNode(segmentationNode)
@@ -580,12 +1600,788 @@ class AtlasEditorLogic(ScriptedLoadableModuleLogic):
             if item:
                 itemsToMerge[checkedItem] = item
 
+        segmentsNotFound = []
+        mergedLabelValues = {}
         for i in itemsToMerge.items():
-            segmentsNotFound = self.mergeSegments(segmentationNode, i[1], i[0])
+            segmentsNotFound.extend(self.mergeSegments(segmentationNode, i[1], i[0], mergedLabelValues))
 
-        slicer.vtkSlicerSegmentationsModuleLogic.ExportAllSegmentsToLabelmapNode(segmentationNode, outputLabelMap)
+        labelMapping = {sourceLabelValue: targetLabelValue
+            for targetLabelValue, sourceLabelValues in mergedLabelValues.items() for sourceLabelValue in sourceLabelValues}
+        historyEntry = self.startEditHistoryEntry("Merge", inputLabelMap, outputLabelMap, labelMapping)
 
+        # Keep the input geometry and label values so that voxel indices (and label statistics) remain valid
+        self.exportSegmentsToLabelMap(segmentationNode, inputLabelMap, outputLabelMap)
+        self.finishEditHistoryEntry(historyEntry)
+        self.updateLabelStatisticsAfterMerge(outputLabelMap, mergedLabelValues)
+
+        if self.segmentEditorWidget:
+            self.segmentEditorWidget.setSegmentationNode(None)
         slicer.mrmlScene.RemoveNode(segmentationNode)
 
         if segmentsNotFound:
             raise RuntimeError(f"Failed to merge segments (they were not found in the segmentation): {segmentsNotFound}")
+
+    def renumberLabels(self, labelMapVolumeNode, outputColorTablePath=None, outputLabelMappingPath=None):
+        """
+        Renumber labels of the label map contiguously (background is 0, remaining labels get 1, 2, 3, ...) and store
+        voxels with the smallest integer type that fits (e.g., unsigned char for up to 255 labels).
+        A compact color table node is created and assigned to the label map, and the label mapping is stored
+        in a text node (JSON), so that both are saved with the scene. They are also written into
+        outputColorTablePath and outputLabelMappingPath if specified.
+        Label values change, therefore the edit history is cleared.
+        Returns the label mapping (original label value -> new label value).
+        """
+        from AtlasEditorLib import LabelMapIO, LabelMapUtils
+        displayNode = labelMapVolumeNode.GetDisplayNode()
+        colorNode = displayNode.GetColorNode() if displayNode else None
+        colors = {}
+        if colorNode:
+            for labelValue in range(colorNode.GetNumberOfColors()):
+                name = colorNode.GetColorName(labelValue)
+                if name and name != "(none)":
+                    colors[labelValue] = (name, [int(round(component * 255)) for component in colorNode.GetLookupTable().GetTableValue(labelValue)])
+
+        renumberedVoxels, labelMapping = LabelMapUtils.renumberLabels(slicer.util.arrayFromVolume(labelMapVolumeNode))
+        slicer.util.updateVolumeFromArray(labelMapVolumeNode, renumberedVoxels)
+        renumberedColors = LabelMapUtils.renumberColors(colors, labelMapping)
+
+        if colorNode:
+            renumberedColorNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLColorTableNode",
+                slicer.mrmlScene.GenerateUniqueName(labelMapVolumeNode.GetName() + "-lut"))
+            renumberedColorNode.SetTypeToUser()
+            renumberedColorNode.SetNumberOfColors(max(renumberedColors, default=0) + 1)
+            renumberedColorNode.SetColor(0, "background", 0.0, 0.0, 0.0, 0.0)
+            for labelValue, (name, rgba) in renumberedColors.items():
+                renumberedColorNode.SetColor(labelValue, name, *[component / 255.0 for component in rgba])
+            displayNode.SetAndObserveColorNodeID(renumberedColorNode.GetID())
+
+        labelMappingNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLTextNode",
+            slicer.mrmlScene.GenerateUniqueName(labelMapVolumeNode.GetName() + "-labelmapping"))
+        labelMappingNode.SetText(json.dumps(LabelMapIO.getLabelMappingJSON(labelMapping, renumberedColors), indent=2))
+
+        if outputColorTablePath:
+            LabelMapIO.writeColorTable(outputColorTablePath, renumberedColors)
+        if outputLabelMappingPath:
+            LabelMapIO.writeLabelMapping(outputLabelMappingPath, labelMapping, renumberedColors)
+
+        if self.labelStatisticsVolumeNode is labelMapVolumeNode and self.labelStatistics is not None:
+            self.labelStatistics = {labelMapping[labelValue]: statistics for labelValue, statistics in self.labelStatistics.items()
+                if labelValue in labelMapping}
+        self.clearEditHistory()
+        return labelMapping
+
+
+#
+# AtlasEditorTest
+#
+
+class AtlasEditorTest(ScriptedLoadableModuleTest):
+    """
+    This is the test case for your scripted module.
+    Uses ScriptedLoadableModuleTest base class, available at:
+    https://github.com/Slicer/Slicer/blob/main/Base/Python/slicer/ScriptedLoadableModule.py
+    """
+
+    def setUp(self):
+        """ Do whatever is needed to reset the state - typically a scene clear will be enough.
+        """
+        slicer.mrmlScene.Clear()
+
+    def runTest(self):
+        """Run as few or as many tests as needed here.
+        """
+        self.setUp()
+        self.test_AtlasEditorDownload()
+        self.test_AtlasEditorLabelStatistics()
+        self.test_AtlasEditorCompactLabelMap()
+        self.test_AtlasEditorStructureSearch()
+        self.test_AtlasEditorMemoryMappedLoading()
+        self.test_AtlasEditorRenumberLabels()
+        self.test_AtlasEditorStartupTime()
+        self.test_AtlasEditorRecipe()
+        self.test_AtlasEditorMergeUndoRedo()
+        self.test_AtlasEditorLabelStatisticsAfterEdit()
+        self.test_AtlasEditorPreview()
+        self.test_AtlasEditorProfiling()
+
+    def startFileServer(self, folder):
+        """
+        Serve files of a folder on a local HTTP server that supports range requests, as a stand-in
+        for the atlas download servers. Returns the server and the list of received requests.
+        """
+        import http.server
+        import threading
+
+        requests = []
+
+        class RangeRequestHandler(http.server.SimpleHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                requests.append((self.path, self.headers.get("Range")))
+                rangeHeader = self.headers.get("Range")
+                if not rangeHeader:
+                    return super().do_GET()
+                with open(self.translate_path(self.path), "rb") as f:
+                    data = f.read()
+                start = int(rangeHeader.split("=")[1].split("-")[0])
+                if start >= len(data):
+                    self.send_response(416)
+                    self.end_headers()
+                    return
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{len(data)-1}/{len(data)}")
+                self.send_header("Content-Length", str(len(data) - start))
+                self.end_headers()
+                self.wfile.write(data[start:])
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(RangeRequestHandler, directory=folder))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server, requests
+
+    def test_AtlasEditorDownload(self):
+        """
+        Test concurrent, resumable, checksum-verified and cached atlas file download.
+        """
+        import tempfile
+        import hashlib
+
+        self.delayDisplay("Starting the test")
+
+        with tempfile.TemporaryDirectory() as tempDir:
+            serverFolder = os.path.join(tempDir, "server")
+            os.makedirs(serverFolder)
+            fileNames = ["labels.nrrd", "labels.ctbl", "labels.json"]
+            fileContents = [os.urandom(3 * 1024 * 1024), b"0 Background 0 0 0 0\n", b"[]"]
+            for fileName, content in zip(fileNames, fileContents):
+                with open(os.path.join(serverFolder, fileName), "wb") as f:
+                    f.write(content)
+            checksums = ["SHA256:" + hashlib.sha256(content).hexdigest() for content in fileContents]
+
+            server, requests = self.startFileServer(serverFolder)
+            try:
+                urls = [f"http://127.0.0.1:{server.server_address[1]}/{fileName}" for fileName in fileNames]
+
+                logic = AtlasEditorLogic()
+                logic.atlasCacheDirectory = os.path.join(tempDir, "cache")
+
+                # Download all files
+                filePaths = logic.downloadAtlasFiles(10, urls, checksums)
+                for filePath, content in zip(filePaths, fileContents):
+                    with open(filePath, "rb") as f:
+                        self.assertEqual(f.read(), content)
+                self.assertEqual(len(requests), 3)
+
+                # Repeated download uses the cache
+                self.assertEqual(logic.downloadAtlasFiles(10, urls, checksums), filePaths)
+                self.assertEqual(len(requests), 3)
+
+                # Different atlases do not overwrite each other
+                otherFilePaths = logic.downloadAtlasFiles(11, urls, checksums)
+                self.assertNotEqual(os.path.dirname(otherFilePaths[0]), os.path.dirname(filePaths[0]))
+
+                # Interrupted transfer is resumed
+                del requests[:]
+                os.remove(filePaths[0])
+                with open(filePaths[0] + ".part", "wb") as f:
+                    f.write(fileContents[0][:1024 * 1024])
+                logic.downloadAtlasFiles(10, urls, checksums)
+                self.assertEqual(requests, [("/labels.nrrd", f"bytes={1024 * 1024}-")])
+                with open(filePaths[0], "rb") as f:
+                    self.assertEqual(f.read(), fileContents[0])
+
+                # Content that does not match the expected checksum is rejected
+                wrongChecksums = [checksums[0], checksums[1], "SHA256:" + hashlib.sha256(b"other").hexdigest()]
+                with self.assertRaises(RuntimeError):
+                    logic.downloadAtlasFiles(12, urls, wrongChecksums)
+            finally:
+                server.shutdown()
+
+        self.delayDisplay('Test passed')
+
+    def test_AtlasEditorLabelStatistics(self):
+        """
+        Test label statistics computation and incremental update.
+        """
+        import numpy as np
+
+        self.delayDisplay("Starting the test")
+
+        labelArray = np.zeros((4, 5, 6), dtype=np.int16)
+        labelArray[1:3, 1:4, 2:5] = 7
+        labelArray[3, 4, 5] = 9
+        labelStatistics = AtlasEditorLogic.computeLabelStatisticsFromArray(labelArray)
+        self.assertEqual(sorted(labelStatistics.keys()), [0, 7, 9])
+        self.assertEqual(labelStatistics[7]["voxelCount"], 18)
+        self.assertEqual(labelStatistics[7]["boundingBox"], [2, 4, 1, 3, 1, 2])
+        self.assertEqual(labelStatistics[7]["centroid"], [3.0, 2.0, 1.5])
+
+        logic = AtlasEditorLogic()
+        logic.labelStatistics = labelStatistics
+        logic.updateLabelStatisticsAfterMerge(None, {7: [9]})
+        self.assertEqual(labelStatistics[7]["voxelCount"], 19)
+        self.assertEqual(labelStatistics[7]["boundingBox"], [2, 5, 1, 4, 1, 3])
+        self.assertNotIn(9, labelStatistics)
+        logic.updateLabelStatisticsAfterRemove(None, [7])
+        self.assertEqual(list(labelStatistics.keys()), [0])
+        self.assertEqual(labelStatistics[0]["voxelCount"], labelArray.size)
+
+        self.delayDisplay('Test passed')
+
+    def test_AtlasEditorCompactLabelMap(self):
+        """
+        Test conversion between label map volume nodes and compact label maps, and atlas snapshots.
+        """
+        import numpy as np
+        from AtlasEditorLib import CompactLabelMap
+
+        self.delayDisplay("Starting the test")
+
+        labelArray = np.zeros([20, 30, 40], dtype=np.int16)
+        labelArray[2:5, 3:10, 4:30] = 7
+        labelArray[10:18, 5:8, 1:3] = 300
+        labelArray[10:12, 20:25, 30:40] = 2
+        compactLabelMap = CompactLabelMap.fromArray(labelArray)
+        self.assertLess(compactLabelMap.nbytes, labelArray.nbytes / 10)
+        self.assertEqual(compactLabelMap.runValues.dtype, np.uint16)
+        np.testing.assert_array_equal(compactLabelMap.toArray(), labelArray)
+        self.assertEqual(compactLabelMap.toArray().dtype, labelArray.dtype)
+        self.assertEqual(compactLabelMap.getVoxelCounts(), {0: labelArray.size - 546 - 48 - 100, 2: 100, 7: 546, 300: 48})
+
+        mergedLabelArray = labelArray.copy()
+        AtlasEditorLogic.applyLabelMapping(mergedLabelArray, {300: 7, 2: 0})
+        np.testing.assert_array_equal(compactLabelMap.applyLabelMapping({300: 7, 2: 0}).toArray(), mergedLabelArray)
+
+        labelMapVolumeNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode")
+        slicer.util.updateVolumeFromArray(labelMapVolumeNode, labelArray)
+        logic = AtlasEditorLogic()
+        logic.storeAtlasSnapshot("original", labelMapVolumeNode)
+        slicer.util.updateVolumeFromArray(labelMapVolumeNode, mergedLabelArray)
+        logic.restoreAtlasSnapshot("original", labelMapVolumeNode)
+        np.testing.assert_array_equal(slicer.util.arrayFromVolume(labelMapVolumeNode), labelArray)
+
+        self.delayDisplay('Test passed')
+
+    def test_AtlasEditorStructureSearch(self):
+        """
+        Test filtering of the structure view by structure name.
+        """
+        import tempfile
+        import numpy as np
+        from AtlasEditorLib import StructureSearchIndex
+
+        self.delayDisplay("Starting the test")
+
+        atlasStructure = [
+            {"@id": "#__header__", "@type": "Header", "root": ["#root"]},
+            {"@id": "#root", "@type": "Group", "annotation": {"name": "Brain"}, "member": ["#cerebellum", "#ventricles"]},
+            {"@id": "#cerebellum", "@type": "Group", "annotation": {"name": "Cerebellum"}, "member": ["#leftCerebellarCortex", "#rightCerebellarCortex"]},
+            {"@id": "#ventricles", "@type": "Group", "annotation": {"name": "Ventricles"}, "member": ["#leftLateralVentricle", "#fourthVentricle"]},
+            {"@id": "#leftCerebellarCortex", "@type": "Structure", "annotation": {"name": "left-cerebellar-cortex"}},
+            {"@id": "#rightCerebellarCortex", "@type": "Structure", "annotation": {"name": "right-cerebellar-cortex"}},
+            {"@id": "#leftLateralVentricle", "@type": "Structure", "annotation": {"name": "left-lateral-ventricle"}},
+            {"@id": "#fourthVentricle", "@type": "Structure", "annotation": {"name": "fourth-ventricle"}},
+            ]
+
+        searchIndex = StructureSearchIndex(atlasStructure)
+        matchingIds, ancestorIds, visibleIds = searchIndex.getMatchingBranches("Left Cere")
+        self.assertEqual(matchingIds, {"#leftCerebellarCortex"})
+        self.assertEqual(ancestorIds, {"#root", "#cerebellum"})
+        self.assertEqual(visibleIds, {"#root", "#cerebellum", "#leftCerebellarCortex"})
+        # extended search text
+        self.assertEqual(searchIndex.getMatchingBranches("left cerebellar cortex")[0], {"#leftCerebellarCortex"})
+        self.assertEqual(searchIndex.getMatchingBranches("ventricle")[0], {"#ventricles", "#leftLateralVentricle", "#fourthVentricle"})
+        self.assertEqual(searchIndex.getMatchingBranches("ventricles")[2], {"#root", "#ventricles", "#leftLateralVentricle", "#fourthVentricle"})
+        self.assertEqual(searchIndex.getMatchingBranches("xyz")[2], set())
+        self.assertEqual({searchIndex.ids[itemIndex] for itemIndex in searchIndex.findPrefixMatches("left")},
+            {"#leftCerebellarCortex", "#leftLateralVentricle"})
+
+        logic = AtlasEditorLogic()
+        labelMapVolumeNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode")
+        slicer.util.updateVolumeFromArray(labelMapVolumeNode, np.zeros([2, 2, 2], dtype=np.int16))
+        structureTreeWidget = qt.QTreeWidget()
+        with tempfile.TemporaryDirectory() as tempDir:
+            atlasStructurePath = os.path.join(tempDir, "atlas-structure.json")
+            with open(atlasStructurePath, "w") as f:
+                json.dump(atlasStructure, f)
+            logic.setup(labelMapVolumeNode, None, atlasStructurePath, structureTreeWidget)
+        logic.updateStructureView()
+
+        def getVisibleItemNames(item):
+            return [item.text(0)] + [name for i in range(item.childCount()) if not item.child(i).isHidden()
+                for name in getVisibleItemNames(item.child(i))]
+
+        logic.filterStructureView("left")
+        self.assertEqual(getVisibleItemNames(logic.atlasStructureTree),
+            ["Brain", "Cerebellum", "left-cerebellar-cortex", "Ventricles", "left-lateral-ventricle"])
+        logic.filterStructureView("left lat")
+        self.assertEqual(getVisibleItemNames(logic.atlasStructureTree), ["Brain", "Ventricles", "left-lateral-ventricle"])
+        self.assertTrue(logic.atlasStructureTreeItemsById["#ventricles"][0].isExpanded())
+        # filter is kept when the view is updated
+        logic.updateStructureView()
+        self.assertEqual(getVisibleItemNames(logic.atlasStructureTree), ["Brain", "Ventricles", "left-lateral-ventricle"])
+        logic.filterStructureView("")
+        self.assertEqual(len(getVisibleItemNames(logic.atlasStructureTree)), 7)
+
+        self.delayDisplay('Test passed')
+
+    def test_AtlasEditorMemoryMappedLoading(self):
+        """
+        Test loading of label maps by memory-mapping uncompressed NRRD files.
+        """
+        import tempfile
+        import numpy as np
+        from AtlasEditorLib import LabelMapIO
+
+        self.delayDisplay("Starting the test")
+
+        labelArray = np.zeros([20, 30, 40], dtype=np.int16)
+        labelArray[2:5, 3:10, 4:30] = 7
+        labelArray[10:18, 5:8, 1:3] = 300
+        header = {"space": "left-posterior-superior", "space directions": "(0.5,0,0) (0,0.6,0) (0,0,1.2)",
+            "space origin": "(10,-20,30)", "kinds": "domain domain domain"}
+
+        logic = AtlasEditorLogic()
+        with tempfile.TemporaryDirectory() as tempDir:
+            rawFilePath = os.path.join(tempDir, "atlas-raw.nrrd")
+            LabelMapIO.writeNrrd(rawFilePath, labelArray, header, compress=False)
+            compressedFilePath = os.path.join(tempDir, "atlas-compressed.nrrd")
+            LabelMapIO.writeNrrd(compressedFilePath, labelArray, header, compress=True)
+
+            # Data layout fields of the source header are not copied into written files
+            staleHeader = dict(header, **{"byte skip": "16", "line skip": "2", "encoding": "raw", "endian": "big", "data file": "other.raw"})
+            rewrittenFilePath = os.path.join(tempDir, "atlas-rewritten.nrrd")
+            for compress in [True, False]:
+                LabelMapIO.writeNrrd(rewrittenFilePath, labelArray, staleHeader, compress=compress)
+                rewrittenLabelArray, rewrittenHeader = LabelMapIO.readNrrd(rewrittenFilePath)
+                np.testing.assert_array_equal(rewrittenLabelArray, labelArray)
+                self.assertFalse({"byte skip", "line skip", "data file"}.intersection(rewrittenHeader))
+                self.assertEqual(rewrittenHeader["space origin"], header["space origin"])
+            np.testing.assert_array_equal(LabelMapIO.memoryMapNrrd(rewrittenFilePath)[0], labelArray)
+
+            memoryMappedNode = logic.loadLabelMapVolume(rawFilePath)
+            self.assertEqual(memoryMappedNode.GetAttribute(logic.memoryMappedFileNameAttributeName), os.path.abspath(rawFilePath))
+            self.assertIsNone(memoryMappedNode.GetStorageNode())
+            self.assertEqual(logic.getLoadedNodeByFileName(rawFilePath, "vtkMRMLLabelMapVolumeNode"), memoryMappedNode)
+            # Compressed files are loaded into memory
+            loadedNode = logic.loadLabelMapVolume(compressedFilePath)
+            self.assertIsNone(loadedNode.GetAttribute(logic.memoryMappedFileNameAttributeName))
+
+            # Voxels and geometry are the same as when the file is read by Slicer
+            np.testing.assert_array_equal(slicer.util.arrayFromVolume(memoryMappedNode), labelArray)
+            np.testing.assert_allclose(slicer.util.arrayFromVTKMatrix(memoryMappedNode.GetIJKToRASMatrix()),
+                slicer.util.arrayFromVTKMatrix(loadedNode.GetIJKToRASMatrix()), atol=1e-6)
+
+            # Label statistics are saved next to the file and reused
+            self.assertFalse(logic.isLabelMapModifiedSinceRead(memoryMappedNode))
+            logic.updateLabelStatisticsIndex(memoryMappedNode)
+            self.assertTrue(os.path.exists(rawFilePath + ".labelstats.json"))
+            self.assertEqual(logic.loadLabelStatistics(memoryMappedNode)[7]["voxelCount"], 3 * 7 * 26)
+
+            # Modified voxels are not written to the file
+            slicer.util.arrayFromVolume(memoryMappedNode)[labelArray == 300] = 7
+            slicer.util.arrayFromVolumeModified(memoryMappedNode)
+            self.assertTrue(logic.isLabelMapModifiedSinceRead(memoryMappedNode))
+            self.assertIsNone(logic.loadLabelStatistics(memoryMappedNode))
+            np.testing.assert_array_equal(LabelMapIO.readNrrd(rawFilePath)[0], labelArray)
+
+            slicer.mrmlScene.RemoveNode(memoryMappedNode)
+            slicer.mrmlScene.RemoveNode(loadedNode)
+
+        self.delayDisplay('Test passed')
+
+    def test_AtlasEditorRenumberLabels(self):
+        """
+        Test contiguous renumbering of labels and downcasting of the voxel type.
+        """
+        import tempfile
+        import numpy as np
+        from AtlasEditorLib import LabelMapIO, LabelMapUtils
+
+        self.delayDisplay("Starting the test")
+
+        labelArray = np.zeros([10, 20, 30], dtype=np.int32)
+        labelArray[1:4, 2:6, 3:9] = 1000
+        labelArray[5:8, 10:15, 20:25] = 70000
+        labelArray[8, 0:3, 0:3] = 12
+
+        renumberedArray, labelMapping = LabelMapUtils.renumberLabels(labelArray)
+        self.assertEqual(labelMapping, {0: 0, 12: 1, 1000: 2, 70000: 3})
+        self.assertEqual(renumberedArray.dtype, np.uint8)
+        originalLabelValues = {newLabelValue: oldLabelValue for oldLabelValue, newLabelValue in labelMapping.items()}
+        np.testing.assert_array_equal(np.vectorize(originalLabelValues.get)(renumberedArray), labelArray)
+
+        colorNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLColorTableNode")
+        colorNode.SetTypeToUser()
+        colorNode.SetNumberOfColors(70001)
+        colorNode.SetColor(12, "structure_a", 1.0, 0.0, 0.0, 1.0)
+        colorNode.SetColor(1000, "structure_b", 0.0, 1.0, 0.0, 1.0)
+        colorNode.SetColor(70000, "structure_c", 0.0, 0.0, 1.0, 1.0)
+        labelMapVolumeNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode")
+        slicer.util.updateVolumeFromArray(labelMapVolumeNode, labelArray)
+        labelMapVolumeNode.CreateDefaultDisplayNodes()
+        labelMapVolumeNode.GetDisplayNode().SetAndObserveColorNodeID(colorNode.GetID())
+
+        logic = AtlasEditorLogic()
+        with tempfile.TemporaryDirectory() as outputFolder:
+            colorTablePath = os.path.join(outputFolder, "atlas-lut.ctbl")
+            labelMappingPath = os.path.join(outputFolder, "atlas-labelmapping.json")
+            self.assertEqual(logic.renumberLabels(labelMapVolumeNode, colorTablePath, labelMappingPath), labelMapping)
+            self.assertEqual(LabelMapIO.readLabelMapping(labelMappingPath), labelMapping)
+            colors = LabelMapIO.readColorTable(colorTablePath)
+            self.assertEqual([colors[labelValue][0] for labelValue in [1, 2, 3]], ["structure_a", "structure_b", "structure_c"])
+
+        np.testing.assert_array_equal(slicer.util.arrayFromVolume(labelMapVolumeNode), renumberedArray)
+        self.assertEqual(labelMapVolumeNode.GetImageData().GetScalarType(), vtk.VTK_UNSIGNED_CHAR)
+        renumberedColorNode = labelMapVolumeNode.GetDisplayNode().GetColorNode()
+        self.assertEqual(renumberedColorNode.GetNumberOfColors(), 4)
+        self.assertEqual(renumberedColorNode.GetColorName(3), "structure_c")
+
+        self.delayDisplay('Test passed')
+
+    def test_AtlasEditorStartupTime(self):
+        """
+        Test that loading the module (done at every application startup) and opening it the first time are fast.
+        Time budgets can be changed by ATLASEDITOR_STARTUP_TIME_BUDGET and ATLASEDITOR_FIRST_OPEN_TIME_BUDGET
+        environment variables (in seconds).
+        """
+        import importlib.util
+
+        self.delayDisplay("Starting the test")
+
+        startupTimeBudgetSec = float(os.environ.get("ATLASEDITOR_STARTUP_TIME_BUDGET", "0.5"))
+        firstOpenTimeBudgetSec = float(os.environ.get("ATLASEDITOR_FIRST_OPEN_TIME_BUDGET", "2.0"))
+
+        # Load a fresh copy of the module file, as at application startup
+        moduleSpec = importlib.util.spec_from_file_location("AtlasEditorStartupTest", slicer.modules.atlaseditor.path)
+        module = importlib.util.module_from_spec(moduleSpec)
+        startTime = time.perf_counter()
+        moduleSpec.loader.exec_module(module)
+        startupTimeSec = time.perf_counter() - startTime
+        # Modules that are only needed for processing must not be imported at startup
+        for deferredModuleName in ["AtlasEditorLib", "AtlasRecipe", "LabelMapIO", "urllib", "multiprocessing", "ProcessPoolExecutor"]:
+            self.assertFalse(hasattr(module, deferredModuleName), f"{deferredModuleName} is imported at startup")
+
+        # Open the module (create its widget)
+        startTime = time.perf_counter()
+        # Without a parent the widget is set up and shown by the constructor
+        widget = module.AtlasEditorWidget()
+        firstOpenTimeSec = time.perf_counter() - startTime
+        # Resources for processing are only created when first needed
+        self.assertIsNone(widget.logic.segmentEditorWidget)
+        self.assertIsNone(widget.logic.atlasStructureSearchIndex)
+        widget.cleanup()
+        widget.parent.deleteLater()
+
+        logging.info(f"AtlasEditor startup time: {startupTimeSec:.3f} s, first open time: {firstOpenTimeSec:.3f} s")
+        self.assertLess(startupTimeSec, startupTimeBudgetSec)
+        self.assertLess(firstOpenTimeSec, firstOpenTimeBudgetSec)
+
+        self.delayDisplay('Test passed')
+
+    def test_AtlasEditorRecipe(self):
+        """
+        Test grouping recipes with chained operations, and applying them to atlas files (batch processing).
+        """
+        import tempfile
+        import numpy as np
+        from AtlasEditorLib import AtlasRecipe, LabelMapIO
+
+        self.delayDisplay("Starting the test")
+
+        atlasStructure = [
+            {"@id": "#a", "@type": "Structure", "annotation": {"name": "structure-a"}},
+            {"@id": "#b", "@type": "Structure", "annotation": {"name": "structure-b"}},
+            {"@id": "#c", "@type": "Structure", "annotation": {"name": "structure-c"}},
+            {"@id": "#d", "@type": "Structure", "annotation": {"name": "structure-d"}},
+            {"@id": "#bc", "@type": "Group", "annotation": {"name": "group-bc"}, "member": ["#b", "#c"]},
+            ]
+        colors = {0: ("background", [0, 0, 0, 0]), 1: ("structure_a", [255, 0, 0, 255]), 2: ("structure_b", [0, 255, 0, 255]),
+            3: ("structure_c", [0, 0, 255, 255]), 4: ("structure_d", [255, 255, 0, 255])}
+
+        # Merge of a structure that was removed by an earlier operation: the first remaining structure is the target
+        recipe = {"operations": [
+            {"operation": "remove", "structures": ["#a"]},
+            {"operation": "merge", "name": "AB", "structures": ["#a", "#b"]},
+            ]}
+        labelMapping, outputColors, structuresNotFound = AtlasRecipe.getLabelMappingFromRecipe(recipe, atlasStructure, colors)
+        self.assertEqual(labelMapping, {1: 0})
+        self.assertEqual(outputColors[0][0], "background")
+        self.assertEqual(outputColors[2][0], "AB")
+        self.assertNotIn(1, outputColors)
+        self.assertEqual(structuresNotFound, [])
+
+        # Merge into a merged label, then remove the merged group
+        recipe = {"operations": [
+            {"operation": "merge", "name": "BC", "structures": ["#bc"]},
+            {"operation": "merge", "name": "ABC", "structures": ["#a", "#c"]},
+            {"operation": "remove", "structures": ["#d", "#missing"]},
+            ]}
+        labelMapping, outputColors, structuresNotFound = AtlasRecipe.getLabelMappingFromRecipe(recipe, atlasStructure, colors)
+        self.assertEqual(labelMapping, {2: 1, 3: 1, 4: 0})
+        self.assertEqual(sorted(outputColors), [0, 1])
+        self.assertEqual(outputColors[1][0], "ABC")
+        self.assertEqual(structuresNotFound, ["#missing"])
+
+        # Merge of structures that have all been removed
+        recipe = {"operations": [
+            {"operation": "remove", "structures": ["#bc"]},
+            {"operation": "merge", "name": "BC", "structures": ["#b", "#c"]},
+            ]}
+        with self.assertRaises(ValueError):
+            AtlasRecipe.getLabelMappingFromRecipe(recipe, atlasStructure, colors)
+        with self.assertRaises(ValueError):
+            AtlasRecipe.validateRecipe({"operations": [{"operation": "merge", "structures": ["#a"]}]})
+
+        # Apply recipe to atlas files
+        labelArray = np.zeros([6, 8, 10], dtype=np.int16)
+        for labelValue in range(1, 5):
+            labelArray[labelValue, 2:6, 2:8] = labelValue
+        header = {"space": "left-posterior-superior", "space directions": "(1,0,0) (0,1,0) (0,0,2)", "space origin": "(10,20,30)",
+            "kinds": "domain domain domain"}
+        recipe = {"operations": [
+            {"operation": "remove", "structures": ["#a"]},
+            {"operation": "merge", "name": "ABC", "structures": ["#a", "#bc"]},
+            ]}
+        with tempfile.TemporaryDirectory() as folder:
+            labelMapPath = os.path.join(folder, "atlas.nrrd")
+            colorTablePath = os.path.join(folder, "atlas-lut.ctbl")
+            structurePath = os.path.join(folder, "atlas-structure.json")
+            LabelMapIO.writeNrrd(labelMapPath, labelArray, header)
+            LabelMapIO.writeColorTable(colorTablePath, colors)
+            with open(structurePath, "w") as f:
+                json.dump(atlasStructure, f)
+            AtlasRecipe.saveRecipe(recipe, os.path.join(folder, "recipe.json"))
+
+            logic = AtlasEditorLogic()
+            results = logic.applyRecipeToAtlases(os.path.join(folder, "recipe.json"), [[labelMapPath, colorTablePath, structurePath]],
+                os.path.join(folder, "output"), numberOfWorkers=1)
+            self.assertEqual(len(results), 1)
+            self.assertEqual(results[0]["labelMapping"], {1: 0, 3: 2})
+
+            outputLabelArray, outputHeader = LabelMapIO.readNrrd(results[0]["labelMap"])
+            expectedLabelArray = labelArray.copy()
+            AtlasEditorLogic.applyLabelMapping(expectedLabelArray, {1: 0, 3: 2})
+            np.testing.assert_array_equal(outputLabelArray, expectedLabelArray)
+            self.assertEqual(outputHeader["space origin"], header["space origin"])
+            outputColors = LabelMapIO.readColorTable(results[0]["colorTable"])
+            self.assertEqual({labelValue: name for labelValue, (name, rgba) in outputColors.items()},
+                {0: "background", 2: "ABC", 4: "structure_d"})
+
+            # Apply recipe to several atlases in parallel worker processes
+            secondLabelMapPath = os.path.join(folder, "atlas2.nrrd")
+            secondLabelArray = np.flip(labelArray, axis=2).copy()
+            LabelMapIO.writeNrrd(secondLabelMapPath, secondLabelArray, header)
+            results = logic.applyRecipeToAtlases(recipe, [[labelMapPath, colorTablePath, structurePath],
+                [secondLabelMapPath, colorTablePath, structurePath]], os.path.join(folder, "parallel"), numberOfWorkers=2)
+            self.assertEqual([os.path.basename(result["labelMap"]) for result in results], ["atlas.nrrd", "atlas2.nrrd"])
+            for result, inputLabelArray in zip(results, [labelArray, secondLabelArray]):
+                self.assertEqual(result["labelMapping"], {1: 0, 3: 2})
+                expectedLabelArray = inputLabelArray.copy()
+                AtlasEditorLogic.applyLabelMapping(expectedLabelArray, {1: 0, 3: 2})
+                np.testing.assert_array_equal(LabelMapIO.readNrrd(result["labelMap"])[0], expectedLabelArray)
+
+        self.delayDisplay('Test passed')
+
+    def createTestAtlas(self, tempDir):
+        """
+        Create a small atlas (label map, color table, and structure tree) and a logic that is set up for editing it.
+        Label values are not contiguous and not in structure order, so that renumbering by an edit is detected.
+        """
+        import numpy as np
+
+        atlasStructure = [
+            {"@id": "#__header__", "@type": "Header", "root": ["#root"]},
+            {"@id": "#root", "@type": "Group", "annotation": {"name": "Brain"}, "member": ["#cerebellum", "#ventricles"]},
+            {"@id": "#cerebellum", "@type": "Group", "annotation": {"name": "Cerebellum"}, "member": ["#leftCerebellarCortex", "#rightCerebellarCortex"]},
+            {"@id": "#ventricles", "@type": "Group", "annotation": {"name": "Ventricles"}, "member": ["#leftLateralVentricle", "#fourthVentricle"]},
+            {"@id": "#leftCerebellarCortex", "@type": "Structure", "annotation": {"name": "left-cerebellar-cortex"}},
+            {"@id": "#rightCerebellarCortex", "@type": "Structure", "annotation": {"name": "right-cerebellar-cortex"}},
+            {"@id": "#leftLateralVentricle", "@type": "Structure", "annotation": {"name": "left-lateral-ventricle"}},
+            {"@id": "#fourthVentricle", "@type": "Structure", "annotation": {"name": "fourth-ventricle"}},
+            ]
+        atlasStructurePath = os.path.join(tempDir, "atlas-structure.json")
+        with open(atlasStructurePath, "w") as f:
+            json.dump(atlasStructure, f)
+
+        labelArray = np.zeros([10, 12, 14], dtype=np.int16)
+        labelArray[1:4, 2:6, 3:9] = 20
+        labelArray[4:6, 2:6, 3:9] = 5
+        labelArray[6:9, 7:11, 1:4] = 12
+        labelArray[2:5, 8:11, 10:13] = 9
+
+        colorNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLColorTableNode")
+        colorNode.SetTypeToUser()
+        colorNode.SetNumberOfColors(21)
+        colorNode.SetColor(0, "background", 0.0, 0.0, 0.0, 0.0)
+        colorNode.SetColor(20, "left cerebellar cortex", 1.0, 0.0, 0.0, 1.0)
+        colorNode.SetColor(5, "right cerebellar cortex", 0.0, 1.0, 0.0, 1.0)
+        colorNode.SetColor(12, "left lateral ventricle", 0.0, 0.0, 1.0, 1.0)
+        colorNode.SetColor(9, "fourth ventricle", 1.0, 1.0, 0.0, 1.0)
+        labelMapVolumeNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode")
+        slicer.util.updateVolumeFromArray(labelMapVolumeNode, labelArray)
+        labelMapVolumeNode.CreateDefaultDisplayNodes()
+        labelMapVolumeNode.GetDisplayNode().SetAndObserveColorNodeID(colorNode.GetID())
+
+        logic = AtlasEditorLogic()
+        logic.setup(labelMapVolumeNode, labelMapVolumeNode, atlasStructurePath, qt.QTreeWidget())
+        logic.updateStructureView()
+        return logic, labelMapVolumeNode, labelArray
+
+    def test_AtlasEditorMergeUndoRedo(self):
+        """
+        Test that merge and remove keep label values, and that undo and redo restore the voxels.
+        """
+        import tempfile
+        import numpy as np
+
+        self.delayDisplay("Starting the test")
+
+        with tempfile.TemporaryDirectory() as tempDir:
+            logic, labelMapVolumeNode, labelArray = self.createTestAtlas(tempDir)
+        colorNodeId = labelMapVolumeNode.GetDisplayNode().GetColorNodeID()
+        mergedArray = labelArray.copy()
+        AtlasEditorLogic.applyLabelMapping(mergedArray, {5: 20})
+        removedArray = mergedArray.copy()
+        AtlasEditorLogic.applyLabelMapping(removedArray, {12: 0, 9: 0})
+
+        # In-place edits
+        logic.atlasStructureTreeItemsById["#cerebellum"][0].setCheckState(0, qt.Qt.Checked)
+        logic.merge(labelMapVolumeNode, labelMapVolumeNode)
+        np.testing.assert_array_equal(slicer.util.arrayFromVolume(labelMapVolumeNode), mergedArray)
+        self.assertEqual(labelMapVolumeNode.GetDisplayNode().GetColorNodeID(), colorNodeId)
+        logic.atlasStructureTreeItemsById["#cerebellum"][0].setCheckState(0, qt.Qt.Unchecked)
+        logic.atlasStructureTreeItemsById["#ventricles"][0].setCheckState(0, qt.Qt.Checked)
+        logic.remove(labelMapVolumeNode, labelMapVolumeNode)
+        np.testing.assert_array_equal(slicer.util.arrayFromVolume(labelMapVolumeNode), removedArray)
+
+        self.assertEqual(logic.undo(), "Remove")
+        np.testing.assert_array_equal(slicer.util.arrayFromVolume(labelMapVolumeNode), mergedArray)
+        self.assertEqual(logic.undo(), "Merge")
+        np.testing.assert_array_equal(slicer.util.arrayFromVolume(labelMapVolumeNode), labelArray)
+        self.assertEqual(logic.redo(), "Merge")
+        np.testing.assert_array_equal(slicer.util.arrayFromVolume(labelMapVolumeNode), mergedArray)
+        self.assertEqual(logic.redo(), "Remove")
+        np.testing.assert_array_equal(slicer.util.arrayFromVolume(labelMapVolumeNode), removedArray)
+
+        # Edit into an output label map that already has content
+        logic.undo()
+        logic.undo()
+        logic.atlasStructureTreeItemsById["#ventricles"][0].setCheckState(0, qt.Qt.Unchecked)
+        logic.atlasStructureTreeItemsById["#cerebellum"][0].setCheckState(0, qt.Qt.Checked)
+        outputLabelMapVolumeNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode")
+        slicer.util.updateVolumeFromArray(outputLabelMapVolumeNode, removedArray)
+        logic.merge(labelMapVolumeNode, outputLabelMapVolumeNode)
+        np.testing.assert_array_equal(slicer.util.arrayFromVolume(outputLabelMapVolumeNode), mergedArray)
+        logic.undo()
+        np.testing.assert_array_equal(slicer.util.arrayFromVolume(outputLabelMapVolumeNode), removedArray)
+        logic.redo()
+        np.testing.assert_array_equal(slicer.util.arrayFromVolume(outputLabelMapVolumeNode), mergedArray)
+        np.testing.assert_array_equal(slicer.util.arrayFromVolume(labelMapVolumeNode), labelArray)
+
+        self.delayDisplay('Test passed')
+
+    def assertLabelStatisticsEqual(self, labelStatistics, expectedLabelStatistics):
+        self.assertEqual(sorted(labelStatistics.keys()), sorted(expectedLabelStatistics.keys()))
+        for labelValue, expectedStatistics in expectedLabelStatistics.items():
+            self.assertEqual(labelStatistics[labelValue]["voxelCount"], expectedStatistics["voxelCount"])
+            self.assertEqual(labelStatistics[labelValue]["boundingBox"], expectedStatistics["boundingBox"])
+            for component, expectedComponent in zip(labelStatistics[labelValue]["centroid"], expectedStatistics["centroid"]):
+                self.assertAlmostEqual(component, expectedComponent)
+
+    def test_AtlasEditorLabelStatisticsAfterEdit(self):
+        """
+        Test that label statistics updated incrementally by merge and remove match statistics computed from the output.
+        """
+        import tempfile
+
+        self.delayDisplay("Starting the test")
+
+        with tempfile.TemporaryDirectory() as tempDir:
+            logic, labelMapVolumeNode, labelArray = self.createTestAtlas(tempDir)
+        outputLabelMapVolumeNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode")
+
+        logic.atlasStructureTreeItemsById["#cerebellum"][0].setCheckState(0, qt.Qt.Checked)
+        logic.merge(labelMapVolumeNode, outputLabelMapVolumeNode)
+        self.assertLabelStatisticsEqual(logic.getLabelStatistics(labelMapVolumeNode=outputLabelMapVolumeNode),
+            AtlasEditorLogic.computeLabelStatisticsFromArray(slicer.util.arrayFromVolume(outputLabelMapVolumeNode)))
+        self.assertEqual(logic.getLabelStatistics(20)["voxelCount"], 3 * 4 * 6 + 2 * 4 * 6)
+
+        logic.atlasStructureTreeItemsById["#cerebellum"][0].setCheckState(0, qt.Qt.Unchecked)
+        logic.atlasStructureTreeItemsById["#ventricles"][0].setCheckState(0, qt.Qt.Checked)
+        logic.remove(outputLabelMapVolumeNode, outputLabelMapVolumeNode)
+        self.assertLabelStatisticsEqual(logic.getLabelStatistics(labelMapVolumeNode=outputLabelMapVolumeNode),
+            AtlasEditorLogic.computeLabelStatisticsFromArray(slicer.util.arrayFromVolume(outputLabelMapVolumeNode)))
+        self.assertEqual(sorted(logic.getLabelStatistics().keys()), [0, 20])
+
+        self.delayDisplay('Test passed')
+
+    def test_AtlasEditorPreview(self):
+        """
+        Test that the preview only changes colors of the checked structures and that stopping it restores the color table.
+        """
+        import tempfile
+
+        self.delayDisplay("Starting the test")
+
+        with tempfile.TemporaryDirectory() as tempDir:
+            logic, labelMapVolumeNode, labelArray = self.createTestAtlas(tempDir)
+        displayNode = labelMapVolumeNode.GetDisplayNode()
+        originalColorNode = displayNode.GetColorNode()
+        originalColors = {labelValue: list(originalColorNode.GetLookupTable().GetTableValue(labelValue)) for labelValue in [20, 5, 12, 9]}
+
+        def getPreviewColors():
+            lookupTable = displayNode.GetColorNode().GetLookupTable()
+            return {labelValue: list(lookupTable.GetTableValue(labelValue)) for labelValue in originalColors}
+
+        logic.startPreview(labelMapVolumeNode)
+        previewColorNode = logic.previewColorNode
+        self.assertEqual(displayNode.GetColorNodeID(), previewColorNode.GetID())
+        self.assertEqual(getPreviewColors(), originalColors)
+
+        # Merge: right cerebellar cortex gets the color of the left cerebellar cortex
+        logic.atlasStructureTreeItemsById["#cerebellum"][0].setCheckState(0, qt.Qt.Checked)
+        logic.updatePreview("merge")
+        self.assertEqual(getPreviewColors(), dict(originalColors, **{5: originalColors[20]}))
+
+        # Remove: checked structures become transparent, others keep their original color
+        logic.atlasStructureTreeItemsById["#cerebellum"][0].setCheckState(0, qt.Qt.Unchecked)
+        logic.atlasStructureTreeItemsById["#ventricles"][0].setCheckState(0, qt.Qt.Checked)
+        logic.updatePreview("remove")
+        self.assertEqual(getPreviewColors(), dict(originalColors, **{12: [0.0, 0.0, 0.0, 0.0], 9: [0.0, 0.0, 0.0, 0.0]}))
+
+        # Original color table and voxels are not modified by the preview
+        self.assertEqual({labelValue: list(originalColorNode.GetLookupTable().GetTableValue(labelValue)) for labelValue in originalColors},
+            originalColors)
+        self.assertTrue((slicer.util.arrayFromVolume(labelMapVolumeNode) == labelArray).all())
+
+        logic.stopPreview()
+        self.assertEqual(displayNode.GetColorNodeID(), originalColorNode.GetID())
+        self.assertIsNone(logic.previewColorNode)
+        self.assertIsNone(previewColorNode.GetScene())
+
+        self.delayDisplay('Test passed')
+
+    def test_AtlasEditorProfiling(self):
+        """
+        Test that profiling results of profiled logic methods are written into the profiling output folder.
+        """
+        import glob
+        import tempfile
+
+        self.delayDisplay("Starting the test")
+
+        with tempfile.TemporaryDirectory() as tempDir:
+            logic, labelMapVolumeNode, labelArray = self.createTestAtlas(tempDir)
+            logic.profilingOutputFolder = os.path.join(tempDir, "profiling")
+            logic.atlasStructureTreeItemsById["#cerebellum"][0].setCheckState(0, qt.Qt.Checked)
+            logic.merge(labelMapVolumeNode, labelMapVolumeNode)
+            dimensions = "x".join(str(dimension) for dimension in reversed(labelArray.shape))
+            self.assertEqual(len(glob.glob(os.path.join(tempDir, "profiling", f"merge-{dimensions}-*.prof"))), 1)
+            memoryFilePaths = glob.glob(os.path.join(tempDir, "profiling", f"merge-{dimensions}-*-memory.txt"))
+            self.assertEqual(len(memoryFilePaths), 1)
+            with open(memoryFilePaths[0]) as f:
+                self.assertIn("Peak traced memory", f.read())
+
+        self.delayDisplay('Test passed')
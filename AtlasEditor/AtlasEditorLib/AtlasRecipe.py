@@ -0,0 +1,159 @@
+import json
+import os
+
+from OpenAnatomyExportLib.AtlasStructure import normalizeStructureName
+
+from .LabelMapIO import readColorTable, readNrrd, writeColorTable, writeLabelMapping, writeNrrd
+from .LabelMapUtils import applyLabelMapping, renumberColors, renumberLabels
+
+#
+# Grouping recipes describe atlas edits (merge and remove of structures) by structure "@id"s of the
+# OpenAnatomy atlas structure JSON, so that the same edits can be replayed on any atlas. Example:
+#
+# {
+#   "operations": [
+#     {"operation": "merge", "name": "Cerebellum", "structures": ["#Group_cerebellum"]},
+#     {"operation": "remove", "structures": ["#Structure_skin", "#Group_head_and_neck_muscles"]}
+#   ]
+# }
+#
+# Operations are applied in the listed order. Groups are expanded to all the structures they contain.
+# Merged structures get the label value of the first structure of the merge that has not been removed before.
+#
+
+__all__ = ["loadRecipe", "saveRecipe", "validateRecipe", "getLabelMappingFromRecipe", "applyRecipeToAtlasFiles"]
+
+RECIPE_OPERATIONS = ["merge", "remove"]
+
+
+def validateRecipe(recipe):
+    """
+    Raise ValueError if the recipe is not valid.
+    """
+    operations = recipe.get("operations") if isinstance(recipe, dict) else None
+    if not isinstance(operations, list):
+        raise ValueError("Recipe must contain a list of operations")
+    for index, operation in enumerate(operations):
+        if operation.get("operation") not in RECIPE_OPERATIONS:
+            raise ValueError(f"Operation {index}: operation must be one of {RECIPE_OPERATIONS}")
+        if not isinstance(operation.get("structures"), list) or not operation["structures"]:
+            raise ValueError(f"Operation {index}: structures must be a non-empty list of structure @ids")
+        if operation["operation"] == "merge" and not operation.get("name"):
+            raise ValueError(f"Operation {index}: merge requires a name")
+
+
+def loadRecipe(filePath):
+    with open(filePath) as f:
+        recipe = json.load(f)
+    validateRecipe(recipe)
+    return recipe
+
+
+def saveRecipe(recipe, filePath):
+    validateRecipe(recipe)
+    with open(filePath, "w") as f:
+        json.dump(recipe, f, indent=2)
+
+
+def getStructureLabelValues(structureJSON, structureIds, labelValueByName):
+    """
+    Get label values of structures, expanding groups to their members.
+    Returns the list of label values and the list of structures that do not have a label value.
+    """
+    itemsById = {item["@id"]: item for item in structureJSON}
+    labelValues = []
+    structuresNotFound = []
+    structureIds = list(structureIds)
+    visitedIds = set()
+    while structureIds:
+        structureId = structureIds.pop(0)
+        if structureId in visitedIds:
+            continue
+        visitedIds.add(structureId)
+        item = itemsById.get(structureId)
+        if item is None:
+            structuresNotFound.append(structureId)
+        elif item["@type"] == "Group":
+            structureIds.extend(item["member"])
+        elif item["@type"] == "Structure":
+            labelValue = labelValueByName.get(normalizeStructureName(item["annotation"]["name"]))
+            if labelValue is None:
+                structuresNotFound.append(structureId)
+            else:
+                labelValues.append(labelValue)
+    return labelValues, structuresNotFound
+
+
+def getLabelMappingFromRecipe(recipe, structureJSON, colors):
+    """
+    Compute the label mapping (old label value -> new label value) that applies all operations of the recipe
+    and the color table of the result.
+    colors is a dictionary of label value -> (name, [r, g, b, a]), as returned by readColorTable.
+    Returns label mapping, output colors and list of structure @ids that were not found.
+    """
+    labelValueByName = {normalizeStructureName(name): labelValue for labelValue, (name, rgba) in colors.items()}
+    currentLabelValues = {labelValue: labelValue for labelValue in colors}
+    outputColors = dict(colors)
+    structuresNotFound = []
+    for operation in recipe["operations"]:
+        labelValues, notFound = getStructureLabelValues(structureJSON, operation["structures"], labelValueByName)
+        structuresNotFound.extend(notFound)
+        if not labelValues:
+            continue
+        if operation["operation"] == "merge":
+            # Structures that were removed by earlier operations are background now, they are not merged
+            affectedLabelValues = [currentLabelValues[labelValue] for labelValue in labelValues if currentLabelValues[labelValue] != 0]
+            if not affectedLabelValues:
+                raise ValueError(f"Merge '{operation['name']}': all structures have been removed by earlier operations")
+            newLabelValue = affectedLabelValues[0]
+            affectedLabelValues = set(affectedLabelValues)
+            outputColors[newLabelValue] = (operation["name"], outputColors[newLabelValue][1])
+        else:
+            affectedLabelValues = {currentLabelValues[labelValue] for labelValue in labelValues}
+            newLabelValue = 0
+        for labelValue, currentLabelValue in currentLabelValues.items():
+            if currentLabelValue in affectedLabelValues:
+                currentLabelValues[labelValue] = newLabelValue
+        for labelValue in affectedLabelValues:
+            if labelValue != newLabelValue:
+                outputColors.pop(labelValue, None)
+    labelMapping = {labelValue: currentLabelValue for labelValue, currentLabelValue in currentLabelValues.items()
+        if labelValue != currentLabelValue}
+    return labelMapping, outputColors, structuresNotFound
+
+
+def applyRecipeToAtlasFiles(recipe, labelMapPath, colorTablePath, structureJsonPath, outputLabelMapPath, outputColorTablePath,
+        outputLabelMappingPath=None):
+    """
+    Apply recipe to an atlas stored in files and write the resulting label map and color table.
+    If outputLabelMappingPath is specified then the remaining labels are renumbered contiguously, the label map is stored
+    with the smallest integer type that fits (see LabelMapUtils.renumberLabels), and the mapping from the original
+    label values is written into outputLabelMappingPath.
+    Does not require Slicer, therefore it can be run in worker processes.
+    """
+    with open(structureJsonPath) as f:
+        structureJSON = json.load(f)
+    colors = readColorTable(colorTablePath)
+    labelMapping, outputColors, structuresNotFound = getLabelMappingFromRecipe(recipe, structureJSON, colors)
+
+    voxels, header = readNrrd(labelMapPath)
+    applyLabelMapping(voxels, labelMapping)
+    renumberedLabelMapping = None
+    if outputLabelMappingPath:
+        voxels, renumberedLabelMapping = renumberLabels(voxels)
+        outputColors = renumberColors(outputColors, renumberedLabelMapping)
+
+    os.makedirs(os.path.dirname(os.path.abspath(outputLabelMapPath)), exist_ok=True)
+    writeNrrd(outputLabelMapPath, voxels, header)
+    writeColorTable(outputColorTablePath, outputColors)
+    if outputLabelMappingPath:
+        writeLabelMapping(outputLabelMappingPath, renumberedLabelMapping, outputColors)
+
+    return {
+        "labelMap": outputLabelMapPath,
+        "colorTable": outputColorTablePath,
+        "labelMapping": labelMapping,
+        "labelMappingFile": outputLabelMappingPath,
+        "renumberedLabelMapping": renumberedLabelMapping,
+        "structuresNotFound": structuresNotFound,
+        }
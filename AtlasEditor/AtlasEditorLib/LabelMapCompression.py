@@ -0,0 +1,106 @@
+import numpy as np
+
+#
+# Compact representation of label map voxels that does not require Slicer
+#
+
+__all__ = ["CompactLabelMap", "getSmallestIntegerDtype"]
+
+
+def getSmallestIntegerDtype(minValue, maxValue):
+    """
+    Get the smallest integer data type that can store all values in the [minValue, maxValue] range.
+    """
+    for dtype in (np.uint8, np.int8, np.uint16, np.int16, np.uint32, np.int32):
+        dtypeInfo = np.iinfo(dtype)
+        if dtypeInfo.min <= minValue and maxValue <= dtypeInfo.max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+class CompactLabelMap:
+    """
+    Run-length encoded label map voxels (in the memory order of the voxel array).
+    Atlases consist of large uniform regions (mostly background), therefore storing only the start index and
+    label value of each run of identical voxels takes a small fraction of the memory of the dense volume.
+    Label values are stored with the smallest integer type that can hold them; the original voxel type
+    is restored by toArray.
+    """
+
+    def __init__(self, shape, dtype, runStarts, runValues):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.runStarts = runStarts  # index of the first voxel of each run
+        self.runValues = runValues  # label value of each run
+
+    @property
+    def numberOfVoxels(self):
+        return int(np.prod(self.shape, dtype=np.int64))
+
+    @property
+    def nbytes(self):
+        return self.runStarts.nbytes + self.runValues.nbytes
+
+    @classmethod
+    def fromArray(cls, voxels):
+        """
+        Create compact label map from a voxel array.
+        """
+        flatVoxels = np.ascontiguousarray(voxels).reshape(-1)
+        if flatVoxels.size == 0:
+            return cls(voxels.shape, voxels.dtype, np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint8))
+        runStarts = np.flatnonzero(flatVoxels[1:] != flatVoxels[:-1])
+        runStarts += 1
+        runStarts = np.concatenate(([0], runStarts)).astype(np.uint32 if flatVoxels.size < 2**32 else np.int64)
+        runValues = flatVoxels[runStarts]
+        runValues = runValues.astype(getSmallestIntegerDtype(int(runValues.min()), int(runValues.max())))
+        return cls(voxels.shape, voxels.dtype, runStarts, runValues)
+
+    def getRunLengths(self):
+        return np.diff(self.runStarts.astype(np.int64), append=self.numberOfVoxels)
+
+    def toArray(self, out=None):
+        """
+        Get voxels as a dense array. If out is specified then voxels are written into that (C-contiguous) array.
+        """
+        flatVoxels = np.repeat(self.runValues, self.getRunLengths())
+        if out is None:
+            return flatVoxels.astype(self.dtype, copy=False).reshape(self.shape)
+        if out.shape != self.shape:
+            raise ValueError(f"Output array shape {out.shape} does not match label map shape {self.shape}")
+        out.reshape(-1)[:] = flatVoxels
+        return out
+
+    def getLabelValues(self):
+        """
+        Get all label values that occur in the label map (including background).
+        """
+        return np.unique(self.runValues)
+
+    def getVoxelCounts(self):
+        """
+        Get number of voxels of each label value as a dictionary.
+        """
+        labelValues, runLabelIndices = np.unique(self.runValues, return_inverse=True)
+        voxelCounts = np.bincount(runLabelIndices.reshape(-1), weights=self.getRunLengths(), minlength=len(labelValues))
+        return {int(labelValue): int(voxelCount) for labelValue, voxelCount in zip(labelValues, voxelCounts)}
+
+    def applyLabelMapping(self, labelMapping):
+        """
+        Get a new compact label map with label values replaced. labelMapping is a dictionary of old label value -> new label value.
+        Only the run values are changed (adjacent runs that got the same value are merged), voxels are not decompressed.
+        """
+        if not labelMapping or len(self.runValues) == 0:
+            return CompactLabelMap(self.shape, self.dtype, self.runStarts.copy(), self.runValues.copy())
+        oldLabelValues = np.array(list(labelMapping.keys()), dtype=np.int64)
+        newLabelValues = np.array(list(labelMapping.values()), dtype=np.int64)
+        runValues = self.runValues.astype(np.int64)
+        minValue = min(int(runValues.min()), int(oldLabelValues.min()))
+        maxValue = max(int(runValues.max()), int(oldLabelValues.max()))
+        lookupTable = np.arange(minValue, maxValue + 1, dtype=np.int64)
+        lookupTable[oldLabelValues - minValue] = newLabelValues
+        runValues = lookupTable[runValues - minValue]
+        keptRuns = np.concatenate(([True], runValues[1:] != runValues[:-1]))
+        runValues = runValues[keptRuns]
+        runValues = runValues.astype(getSmallestIntegerDtype(int(runValues.min()), int(runValues.max())))
+        return CompactLabelMap(self.shape, self.dtype, self.runStarts[keptRuns], runValues)
@@ -0,0 +1,237 @@
+import gzip
+import json
+import os
+import re
+
+import numpy as np
+
+#
+# Reading and writing of label map (.nrrd), color table (.ctbl), and label mapping (.json) files.
+# Only numpy is used so that these can be called from processes where Slicer is not available.
+#
+
+__all__ = ["readNrrdHeader", "readNrrd", "memoryMapNrrd", "getNrrdIjkToRasMatrix", "writeNrrd", "readColorTable", "writeColorTable",
+    "getLabelMappingJSON", "readLabelMapping", "writeLabelMapping"]
+
+NRRD_TYPES = {
+    "signed char": np.int8, "int8": np.int8, "int8_t": np.int8,
+    "uchar": np.uint8, "unsigned char": np.uint8, "uint8": np.uint8, "uint8_t": np.uint8,
+    "short": np.int16, "short int": np.int16, "signed short": np.int16, "signed short int": np.int16, "int16": np.int16, "int16_t": np.int16,
+    "ushort": np.uint16, "unsigned short": np.uint16, "unsigned short int": np.uint16, "uint16": np.uint16, "uint16_t": np.uint16,
+    "int": np.int32, "signed int": np.int32, "int32": np.int32, "int32_t": np.int32,
+    "uint": np.uint32, "unsigned int": np.uint32, "uint32": np.uint32, "uint32_t": np.uint32,
+    "longlong": np.int64, "long long": np.int64, "long long int": np.int64, "signed long long": np.int64,
+    "signed long long int": np.int64, "int64": np.int64, "int64_t": np.int64,
+    "ulonglong": np.uint64, "unsigned long long": np.uint64, "unsigned long long int": np.uint64, "uint64": np.uint64, "uint64_t": np.uint64,
+    "float": np.float32, "double": np.float64,
+}
+
+# Header fields that describe how voxel data is stored in the file
+NRRD_DATA_LAYOUT_FIELDS = ["data file", "datafile", "byte skip", "byteskip", "line skip", "lineskip", "encoding", "endian", "type",
+    "dimension", "sizes"]
+
+
+def readNrrdHeader(filePath):
+    """
+    Read header of a NRRD file.
+    Returns the header fields (in file order, field names in lowercase) and the offset of the attached voxel data.
+    """
+    header = {}
+    with open(filePath, "rb") as f:
+        magic = f.readline()
+        if not magic.startswith(b"NRRD"):
+            raise ValueError(f"{filePath} is not a NRRD file")
+        while True:
+            line = f.readline()
+            if not line or not line.strip():
+                break
+            line = line.decode("latin-1").rstrip("\r\n")
+            if line.startswith("#"):
+                continue
+            if ":=" in line:
+                key, value = line.split(":=", 1)
+                header.setdefault("keyvaluepairs", {})[key] = value
+            else:
+                key, value = line.split(":", 1)
+                header[key.strip().lower()] = value.strip()
+        dataOffset = f.tell()
+    return header, dataOffset
+
+
+def getNrrdDataType(header):
+    dtype = np.dtype(NRRD_TYPES[header["type"].lower()])
+    if dtype.itemsize > 1:
+        dtype = dtype.newbyteorder("<" if header.get("endian", "little") == "little" else ">")
+    return dtype
+
+
+def getNrrdShape(header):
+    # NRRD lists sizes from the fastest to the slowest axis, numpy arrays are indexed the other way ([k, j, i])
+    return tuple(reversed([int(size) for size in header["sizes"].split()]))
+
+
+def readNrrd(filePath):
+    """
+    Read voxels and header of a NRRD file with raw or gzip encoding.
+    Voxels are returned in a numpy array indexed as [k, j, i].
+    """
+    header, dataOffset = readNrrdHeader(filePath)
+    dataFilePath = filePath
+    if "data file" in header:
+        dataFilePath = os.path.join(os.path.dirname(filePath), header["data file"])
+        dataOffset = 0
+    encoding = header.get("encoding", "raw").lower()
+    with open(dataFilePath, "rb") as f:
+        f.seek(dataOffset)
+        if encoding == "raw":
+            data = f.read()
+        elif encoding in ["gzip", "gz"]:
+            data = gzip.GzipFile(fileobj=f).read()
+        else:
+            raise ValueError(f"Unsupported NRRD encoding: {encoding}")
+    shape = getNrrdShape(header)
+    voxels = np.frombuffer(data, dtype=getNrrdDataType(header), count=int(np.prod(shape))).reshape(shape)
+    return voxels.astype(voxels.dtype.newbyteorder("="), copy=True), header
+
+
+def memoryMapNrrd(filePath):
+    """
+    Memory-map voxels of a raw encoded NRRD file. Voxels are not read until they are accessed.
+    The file is mapped copy-on-write: voxels can be modified, but modifications are not written to the file.
+    Raises ValueError if the file cannot be memory-mapped (compressed or non-native byte order voxel data).
+    Returns voxels (numpy array indexed as [k, j, i]) and header.
+    """
+    header, dataOffset = readNrrdHeader(filePath)
+    dataFilePath = filePath
+    if "data file" in header:
+        dataFilePath = os.path.join(os.path.dirname(filePath), header["data file"])
+        dataOffset = 0
+    encoding = header.get("encoding", "raw").lower()
+    if encoding != "raw":
+        raise ValueError(f"Only raw encoded NRRD files can be memory-mapped, {filePath} encoding is {encoding}")
+    dtype = getNrrdDataType(header)
+    if not dtype.isnative:
+        raise ValueError(f"Only NRRD files with native byte order can be memory-mapped, {filePath} byte order is {header.get('endian')}")
+    shape = getNrrdShape(header)
+    byteSkip = int(header.get("byte skip", 0))
+    if byteSkip == -1:
+        # voxels are at the end of the file
+        dataOffset = os.path.getsize(dataFilePath) - int(np.prod(shape)) * dtype.itemsize
+    else:
+        dataOffset += byteSkip
+    voxels = np.memmap(dataFilePath, dtype=dtype, mode="c", offset=dataOffset, shape=shape)
+    return voxels, header
+
+
+def getNrrdIjkToRasMatrix(header):
+    """
+    Get the 4x4 IJK to RAS matrix from the space directions and space origin of a NRRD header.
+    """
+    ijkToRas = np.eye(4)
+    if "space directions" in header:
+        # axes that are not spatial have "none" direction
+        directions = re.findall(r"\(([^)]*)\)", header["space directions"])
+        for axis, direction in enumerate(directions[:3]):
+            ijkToRas[:3, axis] = [float(component) for component in direction.split(",")]
+    elif "spacings" in header:
+        spacings = [float(spacing) for spacing in header["spacings"].split() if spacing.lower() != "nan"]
+        ijkToRas[:3, :3] = np.diag(spacings[:3])
+    origin = re.findall(r"\(([^)]*)\)", header.get("space origin", ""))
+    if origin:
+        ijkToRas[:3, 3] = [float(component) for component in origin[0].split(",")]
+    if header.get("space", "").lower() in ["left-posterior-superior", "lps", "left-posterior-superior-time", "lpst"]:
+        ijkToRas[0:2, :] *= -1
+    return ijkToRas
+
+
+def writeNrrd(filePath, voxels, header, compress=True):
+    """
+    Write voxels (numpy array indexed as [k, j, i]) into a NRRD file.
+    Geometry and other fields are copied from header (as returned by readNrrd).
+    """
+    voxels = np.ascontiguousarray(voxels, dtype=voxels.dtype.newbyteorder("<"))
+    typeName = {np.dtype(np.float32): "float", np.dtype(np.float64): "double"}.get(voxels.dtype.newbyteorder("="), voxels.dtype.newbyteorder("=").name)
+    # Data layout fields of the source file do not describe the written data, they are regenerated.
+    # Dimension must precede per-axis fields.
+    fields = {
+        "type": typeName,
+        "dimension": str(voxels.ndim),
+        "sizes": " ".join(str(size) for size in reversed(voxels.shape)),
+        "endian": "little",
+        "encoding": "gzip" if compress else "raw",
+        }
+    fields.update({key: value for key, value in header.items() if key not in NRRD_DATA_LAYOUT_FIELDS})
+    keyValuePairs = fields.pop("keyvaluepairs", {})
+    with open(filePath, "wb") as f:
+        f.write(b"NRRD0004\n")
+        for key, value in fields.items():
+            f.write(f"{key}: {value}\n".encode("latin-1"))
+        for key, value in keyValuePairs.items():
+            f.write(f"{key}:={value}\n".encode("latin-1"))
+        f.write(b"\n")
+        if compress:
+            with gzip.GzipFile(fileobj=f, mode="wb", compresslevel=6) as gzipFile:
+                gzipFile.write(voxels.tobytes())
+        else:
+            f.write(voxels.tobytes())
+
+
+def readColorTable(filePath):
+    """
+    Read a Slicer color table (.ctbl) file.
+    Returns a dictionary that maps label value to (name, [r, g, b, a]).
+    """
+    colors = {}
+    with open(filePath) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            fields = line.split()
+            colors[int(fields[0])] = (fields[1], [int(component) for component in fields[2:6]])
+    return colors
+
+
+def writeColorTable(filePath, colors):
+    """
+    Write a Slicer color table (.ctbl) file from a dictionary of label value -> (name, [r, g, b, a]).
+    """
+    with open(filePath, "w") as f:
+        f.write("# Color table file " + os.path.basename(filePath) + "\n")
+        f.write(f"# {len(colors)} values\n")
+        for labelValue in sorted(colors):
+            name, rgba = colors[labelValue]
+            name = name.replace(" ", "_")  # names cannot contain spaces in ctbl files
+            f.write(f"{labelValue} {name} {' '.join(str(component) for component in rgba)}\n")
+
+
+def getLabelMappingJSON(labelMapping, colors=None):
+    """
+    Get the content of a label mapping file (see writeLabelMapping) as a dictionary that can be serialized to JSON.
+    """
+    labels = []
+    for oldLabelValue, newLabelValue in sorted(labelMapping.items(), key=lambda item: item[1]):
+        label = {"originalLabelValue": int(oldLabelValue), "labelValue": int(newLabelValue)}
+        if colors and newLabelValue in colors:
+            label["name"] = colors[newLabelValue][0]
+        labels.append(label)
+    return {"labels": labels}
+
+
+def writeLabelMapping(filePath, labelMapping, colors=None):
+    """
+    Write a label mapping (dictionary of old label value -> new label value) into a JSON file.
+    If colors (dictionary of new label value -> (name, [r, g, b, a])) is specified then label names are written, too.
+    """
+    with open(filePath, "w") as f:
+        json.dump(getLabelMappingJSON(labelMapping, colors), f, indent=2)
+
+
+def readLabelMapping(filePath):
+    """
+    Read a label mapping file written by writeLabelMapping.
+    Returns a dictionary of old label value -> new label value.
+    """
+    with open(filePath) as f:
+        labels = json.load(f)["labels"]
+    return {label["originalLabelValue"]: label["labelValue"] for label in labels}
@@ -0,0 +1,87 @@
+import numpy as np
+
+from .LabelMapCompression import getSmallestIntegerDtype
+
+#
+# Label map voxel operations that do not require Slicer
+#
+
+__all__ = ["applyLabelMapping", "getPresentLabelValues", "getCompactLabelMapping", "renumberLabels", "renumberColors"]
+
+
+def applyLabelMapping(voxels, labelMapping):
+    """
+    Replace label values in-place in a voxel array.
+    labelMapping is a dictionary of old label value -> new label value.
+    """
+    if not labelMapping:
+        return
+    oldLabelValues = np.array(list(labelMapping.keys()))
+    newLabelValues = np.array(list(labelMapping.values()))
+    minValue = min(int(voxels.min()), int(oldLabelValues.min()))
+    maxValue = max(int(voxels.max()), int(oldLabelValues.max()))
+    lookupTable = np.arange(minValue, maxValue + 1, dtype=voxels.dtype)
+    lookupTable[oldLabelValues - minValue] = newLabelValues
+    voxels[...] = lookupTable[voxels - minValue if minValue else voxels]
+
+
+def getPresentLabelValues(voxels, chunkSize=2**24):
+    """
+    Get the sorted array of label values that occur in a voxel array.
+    Voxels are processed in chunks, so that no volume-sized temporary array is allocated.
+    """
+    flatVoxels = voxels.reshape(-1)
+    if flatVoxels.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    minValue = int(flatVoxels.min())
+    maxValue = int(flatVoxels.max())
+    counts = np.zeros(maxValue - minValue + 1, dtype=np.int64)
+    for start in range(0, flatVoxels.size, chunkSize):
+        counts += np.bincount(flatVoxels[start:start + chunkSize].astype(np.intp) - minValue, minlength=len(counts))
+    return np.flatnonzero(counts) + minValue
+
+
+def getCompactLabelMapping(labelValues, backgroundLabelValue=0):
+    """
+    Get label mapping (old label value -> new label value) that renumbers labels contiguously: background becomes 0,
+    and other labels get the values 1, 2, 3, ... in the order of their original value.
+    """
+    labelMapping = {int(backgroundLabelValue): 0}
+    for labelValue in sorted(int(labelValue) for labelValue in labelValues):
+        if labelValue != backgroundLabelValue:
+            labelMapping[labelValue] = len(labelMapping)
+    return labelMapping
+
+
+def renumberLabels(voxels, backgroundLabelValue=0, chunkSize=2**24):
+    """
+    Renumber labels of a voxel array contiguously (see getCompactLabelMapping) and store the result with the smallest
+    integer type that can hold the new label values (for example, uint8 for up to 255 labels).
+    Returns the renumbered voxel array (the input is not modified) and the label mapping (old label value -> new label value)
+    of the label values that occur in the input.
+    """
+    presentLabelValues = getPresentLabelValues(voxels, chunkSize)
+    labelMapping = getCompactLabelMapping(presentLabelValues, backgroundLabelValue)
+    if backgroundLabelValue not in presentLabelValues:
+        del labelMapping[backgroundLabelValue]
+    outputDtype = getSmallestIntegerDtype(0, max(labelMapping.values(), default=0))
+    renumberedVoxels = np.empty(voxels.shape, dtype=outputDtype)
+    if not labelMapping:
+        return renumberedVoxels, labelMapping
+    minValue = int(presentLabelValues[0])
+    lookupTable = np.zeros(int(presentLabelValues[-1]) - minValue + 1, dtype=outputDtype)
+    lookupTable[np.array(list(labelMapping.keys()), dtype=np.int64) - minValue] = list(labelMapping.values())
+    flatVoxels = voxels.reshape(-1)
+    flatRenumberedVoxels = renumberedVoxels.reshape(-1)
+    for start in range(0, flatVoxels.size, chunkSize):
+        flatRenumberedVoxels[start:start + chunkSize] = lookupTable[flatVoxels[start:start + chunkSize].astype(np.intp) - minValue]
+    return renumberedVoxels, labelMapping
+
+
+def renumberColors(colors, labelMapping):
+    """
+    Get the color table of renumbered labels.
+    colors is a dictionary of label value -> (name, [r, g, b, a]), as returned by readColorTable.
+    Only labels that are in labelMapping are kept.
+    """
+    return {newLabelValue: colors[oldLabelValue] for oldLabelValue, newLabelValue in labelMapping.items() if oldLabelValue in colors}
@@ -0,0 +1,129 @@
+import bisect
+
+from OpenAnatomyExportLib.AtlasStructure import normalizeStructureName
+
+#
+# Name index of the atlas structure JSON for searching structures while the user is typing
+#
+
+__all__ = ["StructureSearchIndex"]
+
+
+class StructureSearchIndex:
+    """
+    Index of the structure and group names of an atlas structure JSON.
+    Prefix search uses a sorted name list (binary search), substring search uses a trigram index, so that
+    only names that contain all trigrams of the search text are compared. If the search text is extended
+    (as while typing), only the previous matches are compared.
+    """
+
+    def __init__(self, structureJSON):
+        self.ids = []  # @id of each indexed item
+        self.names = []  # normalized name of each indexed item
+        itemIndexById = {}
+        memberIdsList = []
+        for item in structureJSON:
+            if item.get("@type") not in ("Structure", "Group") or item["@id"] in itemIndexById:
+                continue
+            itemIndexById[item["@id"]] = len(self.ids)
+            self.ids.append(item["@id"])
+            self.names.append(normalizeStructureName(item["annotation"]["name"]))
+            memberIdsList.append(item.get("member", []) if item["@type"] == "Group" else [])
+
+        # Group membership (a structure may be member of multiple groups)
+        self.memberIndices = [[itemIndexById[memberId] for memberId in memberIds if memberId in itemIndexById]
+            for memberIds in memberIdsList]
+        self.parentIndices = [[] for _ in self.ids]
+        for parentIndex, memberIndices in enumerate(self.memberIndices):
+            for memberIndex in memberIndices:
+                self.parentIndices[memberIndex].append(parentIndex)
+
+        self.sortedNames = sorted((name, itemIndex) for itemIndex, name in enumerate(self.names))
+
+        self.trigramIndex = {}  # trigram -> indices of items that have the trigram in their name
+        for itemIndex, name in enumerate(self.names):
+            for trigram in {name[i:i + 3] for i in range(len(name) - 2)}:
+                self.trigramIndex.setdefault(trigram, []).append(itemIndex)
+
+        self._lastQuery = None
+        self._lastMatches = None
+
+    def findPrefixMatches(self, query):
+        """
+        Get indices of items whose name starts with the query.
+        """
+        query = normalizeStructureName(query)
+        firstIndex = bisect.bisect_left(self.sortedNames, (query,))
+        matches = []
+        for name, itemIndex in self.sortedNames[firstIndex:]:
+            if not name.startswith(query):
+                break
+            matches.append(itemIndex)
+        return matches
+
+    def findMatches(self, query):
+        """
+        Get indices of items whose name contains the query.
+        """
+        query = normalizeStructureName(query)
+        if self._lastQuery is not None and self._lastQuery in query:
+            # The query was extended, matches can only be among the previous matches
+            candidates = self._lastMatches
+        elif len(query) >= 3:
+            trigramItemIndices = []
+            for trigram in {query[i:i + 3] for i in range(len(query) - 2)}:
+                if trigram not in self.trigramIndex:
+                    trigramItemIndices = None
+                    break
+                trigramItemIndices.append(self.trigramIndex[trigram])
+            if trigramItemIndices is None:
+                candidates = []
+            else:
+                trigramItemIndices.sort(key=len)
+                candidates = set(trigramItemIndices[0]).intersection(*trigramItemIndices[1:])
+        else:
+            candidates = range(len(self.names))
+        matches = [itemIndex for itemIndex in candidates if query in self.names[itemIndex]]
+        self._lastQuery = query
+        self._lastMatches = matches
+        return matches
+
+    def getAncestorIndices(self, itemIndices):
+        """
+        Get indices of all groups that contain any of the items (directly or through other groups).
+        """
+        ancestorIndices = set()
+        indicesToVisit = list(itemIndices)
+        while indicesToVisit:
+            for parentIndex in self.parentIndices[indicesToVisit.pop()]:
+                if parentIndex not in ancestorIndices:
+                    ancestorIndices.add(parentIndex)
+                    indicesToVisit.append(parentIndex)
+        return ancestorIndices
+
+    def getDescendantIndices(self, itemIndices):
+        """
+        Get indices of all members of the items (recursively).
+        """
+        descendantIndices = set()
+        indicesToVisit = list(itemIndices)
+        while indicesToVisit:
+            for memberIndex in self.memberIndices[indicesToVisit.pop()]:
+                if memberIndex not in descendantIndices:
+                    descendantIndices.add(memberIndex)
+                    indicesToVisit.append(memberIndex)
+        return descendantIndices
+
+    def getMatchingBranches(self, query, prefix=False):
+        """
+        Get @ids of the items that match the query and of the items that must be shown to display them.
+        Returns (matchingIds, ancestorIds, visibleIds): ancestors are the groups that contain the matching items,
+        visible items are the matching items, their ancestors, and their members.
+        """
+        matches = self.findPrefixMatches(query) if prefix else self.findMatches(query)
+        ancestorIndices = self.getAncestorIndices(matches)
+        visibleIndices = self.getDescendantIndices(matches)
+        visibleIndices.update(ancestorIndices)
+        visibleIndices.update(matches)
+        return ({self.ids[itemIndex] for itemIndex in matches}, {self.ids[itemIndex] for itemIndex in ancestorIndices},
+            {self.ids[itemIndex] for itemIndex in visibleIndices})
@@ -0,0 +1,7 @@
+# Helpers of the AtlasEditor module that do not depend on Slicer (e.g. for running in worker processes).
+# They use OpenAnatomyExportLib (of the OpenAnatomyExport module) for handling atlas structure names.
+from .LabelMapIO import *
+from .LabelMapUtils import *
+from .LabelMapCompression import *
+from .AtlasRecipe import *
+from .StructureSearchIndex import *
@@ -0,0 +1,291 @@
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import qt
+import slicer
+from slicer.ScriptedLoadableModule import *
+
+from AtlasEditor import AtlasEditorLogic
+
+
+#
+# Synthetic atlas generation
+#
+
+def createSyntheticAtlasStructure(numberOfLabels, hierarchyDepth):
+    """
+    Create atlas structure JSON items for structures "structure 1", "structure 2", ... organized into
+    a balanced group hierarchy. hierarchyDepth is the number of group levels below the root group.
+    Returns the list of atlas structure items.
+    """
+    structureIds = [f"#structure{labelValue}" for labelValue in range(1, numberOfLabels + 1)]
+    items = [{"@id": structureId, "@type": "Structure", "annotation": {"name": f"structure {labelValue}"}}
+        for labelValue, structureId in enumerate(structureIds, start=1)]
+
+    # Number of members of each group, so that the requested depth is reached
+    branchingFactor = max(2, int(np.ceil(numberOfLabels ** (1.0 / max(hierarchyDepth, 1)))))
+    levelMemberIds = structureIds
+    for level in range(hierarchyDepth, 0, -1):
+        groupIds = []
+        for groupIndex, firstMemberIndex in enumerate(range(0, len(levelMemberIds), branchingFactor)):
+            groupId = f"#group{level}_{groupIndex}"
+            items.append({"@id": groupId, "@type": "Group", "annotation": {"name": f"group {level} {groupIndex}"},
+                "member": levelMemberIds[firstMemberIndex:firstMemberIndex + branchingFactor]})
+            groupIds.append(groupId)
+        levelMemberIds = groupIds
+
+    items.append({"@id": "#root", "@type": "Group", "annotation": {"name": "synthetic atlas"}, "member": levelMemberIds})
+    items.insert(0, {"@id": "#__header__", "@type": "Header", "root": ["#root"]})
+    return items
+
+
+def createSyntheticLabelArray(volumeSize, numberOfLabels):
+    """
+    Create a label volume (volumeSize^3 voxels) that contains an ellipsoid-shaped foreground, split into numberOfLabels
+    compact structures, surrounded by background (as in real atlases, most voxels are background).
+    Each label is present in the volume, so that all structures can be found by merge and remove.
+    """
+    coordinates = np.indices((volumeSize, volumeSize, volumeSize), dtype=np.float32) / volumeSize
+    foreground = (((coordinates - 0.5) / np.array([0.45, 0.4, 0.35], dtype=np.float32).reshape(3, 1, 1, 1)) ** 2).sum(axis=0) < 1.0
+    foregroundVoxelCount = np.count_nonzero(foreground)
+    if foregroundVoxelCount < numberOfLabels:
+        raise ValueError(f"Volume size {volumeSize} is too small for {numberOfLabels} labels")
+    # Order foreground voxels by small blocks and split them into equal-sized chunks, one chunk for each label
+    gridSize = 2 * int(np.ceil(numberOfLabels ** (1.0 / 3.0)))
+    blockIndices = np.minimum((coordinates[:, foreground] * gridSize).astype(np.int32), gridSize - 1)
+    voxelOrder = np.argsort((blockIndices[0] * gridSize + blockIndices[1]) * gridSize + blockIndices[2], kind="stable")
+    labelDtype = np.int16 if numberOfLabels < 2**15 else np.int32
+    foregroundLabels = np.empty(foregroundVoxelCount, dtype=labelDtype)
+    foregroundLabels[voxelOrder] = np.arange(foregroundVoxelCount, dtype=np.int64) * numberOfLabels // foregroundVoxelCount + 1
+    labelArray = np.zeros(foreground.shape, dtype=labelDtype)
+    labelArray[foreground] = foregroundLabels
+    return labelArray
+
+
+def createSyntheticAtlasNodes(volumeSize, numberOfLabels, name="SyntheticAtlas"):
+    """
+    Create label map volume node and matching color table node (color names are the structure names).
+    """
+    colorNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLColorTableNode", name + "-lut")
+    colorNode.SetTypeToUser()
+    colorNode.SetNumberOfColors(numberOfLabels + 1)
+    colorNode.SetColor(0, "background", 0.0, 0.0, 0.0, 0.0)
+    randomGenerator = np.random.default_rng(numberOfLabels)
+    for labelValue, color in enumerate(randomGenerator.random((numberOfLabels, 3)), start=1):
+        colorNode.SetColor(labelValue, f"structure {labelValue}", color[0], color[1], color[2], 1.0)
+
+    labelMapVolumeNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode", name)
+    slicer.util.updateVolumeFromArray(labelMapVolumeNode, createSyntheticLabelArray(volumeSize, numberOfLabels))
+    labelMapVolumeNode.CreateDefaultDisplayNodes()
+    labelMapVolumeNode.GetDisplayNode().SetAndObserveColorNodeID(colorNode.GetID())
+    return labelMapVolumeNode
+
+
+#
+# Resident memory measurement
+#
+
+def getResidentMemory():
+    """
+    Get current resident memory size of the process in bytes. Returns None if it cannot be determined
+    (psutil is not installed and the operating system is not Linux).
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def resetPeakResidentMemory():
+    """
+    Reset the peak resident memory size that the operating system tracks for the process (only supported on Linux).
+    Returns True if getPeakResidentMemory can be used for getting the peak since this call.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return getPeakResidentMemory() is not None
+    except OSError:
+        return False
+
+
+def getPeakResidentMemory():
+    """
+    Get peak resident memory size of the process in bytes since the last resetPeakResidentMemory call.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 2**10
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class ResidentMemorySampler:
+    """
+    Find peak resident memory size by sampling it in a background thread, for operating systems that cannot
+    reset the tracked peak. Memory that is allocated and released within a single VTK call that holds the
+    Python global interpreter lock is not seen by the sampler.
+    """
+
+    def __init__(self, samplingIntervalSec=0.01):
+        self.samplingIntervalSec = samplingIntervalSec
+        self.peakResidentMemory = getResidentMemory()
+        self.stopEvent = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def sample(self):
+        while not self.stopEvent.wait(self.samplingIntervalSec):
+            self.peakResidentMemory = max(self.peakResidentMemory, getResidentMemory())
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop sampling and return the peak resident memory size in bytes.
+        """
+        self.stopEvent.set()
+        self.thread.join()
+        return max(self.peakResidentMemory, getResidentMemory())
+
+
+#
+# AtlasEditorBenchmark
+#
+
+class AtlasEditorBenchmark(ScriptedLoadableModuleTest):
+    """
+    Measure runtime and memory usage of AtlasEditor logic operations on synthetic atlases.
+
+    For each operation the increase of resident memory of the process is recorded (peak during the operation and
+    retained after the operation, relative to the memory before the operation), which includes VTK and segment editor
+    allocations. Peak of Python and numpy allocations (traced by tracemalloc) is recorded separately.
+
+    Configurations are specified by ATLASEDITOR_BENCHMARK_CONFIGURATIONS environment variable as a comma-separated
+    list of <volume size>:<number of labels>:<hierarchy depth> (default is a small configuration that runs quickly
+    as a regular test), for example: 64:100:2,128:1000:3,256:5000:4
+
+    Results are appended to the JSON file specified by ATLASEDITOR_BENCHMARK_OUTPUT environment variable
+    (default: AtlasEditorBenchmark.json in Slicer's temporary folder).
+    """
+
+    def setUp(self):
+        slicer.mrmlScene.Clear(0)
+
+    def runTest(self):
+        self.setUp()
+        self.test_AtlasEditorBenchmark()
+
+    @staticmethod
+    def getConfigurations():
+        configurationsText = os.environ.get("ATLASEDITOR_BENCHMARK_CONFIGURATIONS", "32:100:2")
+        configurations = []
+        for configurationText in configurationsText.split(","):
+            volumeSize, numberOfLabels, hierarchyDepth = [int(value) for value in configurationText.split(":")]
+            configurations.append({"volumeSize": volumeSize, "numberOfLabels": numberOfLabels, "hierarchyDepth": hierarchyDepth})
+        return configurations
+
+    @staticmethod
+    def measure(measurements, operationName, function, *args):
+        """
+        Run function and store its runtime and memory usage in measurements.
+        Resident memory increase values are None if resident memory size cannot be determined on this system.
+        """
+        residentMemoryBefore = getResidentMemory()
+        residentMemorySampler = None
+        if residentMemoryBefore is not None and not resetPeakResidentMemory():
+            residentMemorySampler = ResidentMemorySampler()
+            residentMemorySampler.start()
+        tracemallocStarted = not tracemalloc.is_tracing()
+        if tracemallocStarted:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        startTime = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            elapsedTimeSec = time.perf_counter() - startTime
+            peakTracedMemory = tracemalloc.get_traced_memory()[1]
+            if tracemallocStarted:
+                tracemalloc.stop()
+            peakResidentMemoryIncreaseMB = None
+            residentMemoryIncreaseMB = None
+            if residentMemoryBefore is not None:
+                residentMemoryAfter = getResidentMemory()
+                peakResidentMemory = residentMemorySampler.stop() if residentMemorySampler else getPeakResidentMemory()
+                peakResidentMemoryIncreaseMB = round((max(peakResidentMemory, residentMemoryAfter) - residentMemoryBefore) / 2**20, 2)
+                residentMemoryIncreaseMB = round((residentMemoryAfter - residentMemoryBefore) / 2**20, 2)
+            measurements[operationName] = {
+                "timeSec": round(elapsedTimeSec, 4),
+                "peakResidentMemoryIncreaseMB": peakResidentMemoryIncreaseMB,
+                "residentMemoryIncreaseMB": residentMemoryIncreaseMB,
+                "peakTracedMemoryMB": round(peakTracedMemory / 2**20, 2),
+                }
+            logging.info(f"{operationName}: {elapsedTimeSec:.3f} s, peak resident memory increase {peakResidentMemoryIncreaseMB} MB, "
+                f"peak traced memory {peakTracedMemory / 2**20:.1f} MB")
+
+    def runConfiguration(self, volumeSize, numberOfLabels, hierarchyDepth):
+        slicer.mrmlScene.Clear(0)
+        measurements = {}
+
+        structureFilePath = os.path.join(slicer.app.temporaryPath, f"AtlasEditorBenchmark-{numberOfLabels}-{hierarchyDepth}.json")
+        with open(structureFilePath, "w") as f:
+            json.dump(createSyntheticAtlasStructure(numberOfLabels, hierarchyDepth), f)
+        inputLabelMap = self.measure(measurements, "createSyntheticAtlas", createSyntheticAtlasNodes, volumeSize, numberOfLabels)
+        outputLabelMap = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode", "SyntheticAtlasOutput")
+
+        logic = AtlasEditorLogic()
+        structureTreeWidget = qt.QTreeWidget()
+        self.measure(measurements, "setup", logic.setup, inputLabelMap, outputLabelMap, structureFilePath, structureTreeWidget)
+        self.measure(measurements, "updateStructureView", logic.updateStructureView)
+
+        # Check half of the top-level groups (all their members are checked automatically)
+        rootItem = logic.atlasStructureTree
+        for childIndex in range(0, rootItem.childCount(), 2):
+            rootItem.child(childIndex).setCheckState(0, qt.Qt.Checked)
+        checkedItems = self.measure(measurements, "getCheckedItems", logic.getCheckedItems)
+        self.assertTrue(checkedItems)
+
+        self.measure(measurements, "merge", logic.merge, inputLabelMap, outputLabelMap)
+        self.measure(measurements, "remove", logic.remove, inputLabelMap, outputLabelMap)
+
+        structureTreeWidget.clear()
+        os.remove(structureFilePath)
+        return measurements
+
+    def test_AtlasEditorBenchmark(self):
+        self.delayDisplay("Starting the benchmark")
+
+        results = []
+        for configuration in self.getConfigurations():
+            self.delayDisplay(f"Benchmark configuration: {configuration}")
+            measurements = self.runConfiguration(**configuration)
+            results.append({
+                "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "slicerVersion": slicer.app.applicationVersion,
+                "configuration": configuration,
+                "measurements": measurements,
+                })
+
+        outputFilePath = os.environ.get("ATLASEDITOR_BENCHMARK_OUTPUT", os.path.join(slicer.app.temporaryPath, "AtlasEditorBenchmark.json"))
+        previousResults = []
+        if os.path.exists(outputFilePath):
+            with open(outputFilePath) as f:
+                previousResults = json.load(f)
+        with open(outputFilePath, "w") as f:
+            json.dump(previousResults + results, f, indent=2)
+        self.delayDisplay(f"Benchmark results written to {outputFilePath}")
@@ -1,10 +1,13 @@
 import os
 import re
-import unittest
-from unittest.runner import TextTestResult
 import vtk, qt, ctk, slicer
 from slicer.ScriptedLoadableModule import *
+from slicer.util import VTKObservationMixin
 import logging
+import time
+
+from OpenAnatomyExportLib import AtlasStructure, Profiling
+from OpenAnatomyExportLib.Profiling import profiledLogicMethod
 
 #
 # OpenAnatomyExport
@@ -32,11 +35,15 @@ Export model hierarchy or segmentation to OpenAnatomy-compatible glTF file.
 # OpenAnatomyExportWidget
 #
 
-class OpenAnatomyExportWidget(ScriptedLoadableModuleWidget):
+class OpenAnatomyExportWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
   """Uses ScriptedLoadableModuleWidget base class, available at:
   https://github.com/Slicer/Slicer/blob/master/Base/Python/slicer/ScriptedLoadableModule.py
   """
 
+  def __init__(self, parent=None):
+    ScriptedLoadableModuleWidget.__init__(self, parent)
+    VTKObservationMixin.__init__(self)  # needed for scene close observation
+
   def setup(self):
     ScriptedLoadableModuleWidget.setup(self)
 
@@ -54,6 +61,7 @@ class OpenAnatomyExportWidget(ScriptedLoadableModuleWidget):
 
     # Connections
     self.ui.exportButton.connect('clicked(bool)', self.onExportButton)
+    self.ui.cancelExportButton.connect('clicked(bool)', self.onCancelExportButton)
     self.ui.inputSelector.connect("currentItemChanged(vtkIdType)", self.onSelect)
     self.ui.outputFormatSelector.connect("currentIndexChanged(int)", self.onSelect)
 
@@ -61,6 +69,9 @@ class OpenAnatomyExportWidget(ScriptedLoadableModuleWidget):
     self.ui.imageInputSelector.connect("currentNodeChanged(vtkMRMLNode*)", self.onSelect)
     self.ui.imageOutputFormatSelector.connect("currentIndexChanged(int)", self.onSelect)
 
+    # Export cannot continue when the nodes it uses are removed
+    self.addObserver(slicer.mrmlScene, slicer.mrmlScene.StartCloseEvent, self.onSceneStartClose)
+
     # Add vertical spacer
     self.layout.addStretch(1)
 
@@ -68,13 +79,22 @@ class OpenAnatomyExportWidget(ScriptedLoadableModuleWidget):
     self.onSelect()
 
   def cleanup(self):
-    pass
+    self.removeObservers()
+    self.logic.abortExport()
+
+  def onSceneStartClose(self, caller, event):
+    self.logic.abortExport("Export aborted because the scene is closed.")
 
   def onSelect(self):
     currentItemId = self.ui.inputSelector.currentItem()
     shNode = slicer.vtkMRMLSubjectHierarchyNode.GetSubjectHierarchyNode(slicer.mrmlScene)
     owner = shNode.GetItemOwnerPluginName(currentItemId) if currentItemId else ""
-    self.ui.exportButton.enabled = (owner == "Folder" or owner == "Segmentations")
+    exportInProgress = self.logic.isExportInProgress()
+    self.ui.exportButton.enabled = (owner == "Folder" or owner == "Segmentations" or owner == "LabelMaps") and not exportInProgress
+    # Atlas structure file is only used for label map volume inputs
+    self.ui.atlasStructureFileSelector.enabled = self.isLabelMapInputSelected()
+    self.ui.cancelExportButton.enabled = exportInProgress
+    self.ui.exportProgressBar.visible = exportInProgress
 
     currentFormat = self.ui.outputFormatSelector.currentText
     self.ui.outputModelHierarchyLabel.visible = (currentFormat == "scene")
@@ -82,23 +102,55 @@ class OpenAnatomyExportWidget(ScriptedLoadableModuleWidget):
 
     self.ui.imageExportButton.enabled = self.ui.imageInputSelector.currentNode()
 
+  def isLabelMapInputSelected(self):
+    currentItemId = self.ui.inputSelector.currentItem()
+    shNode = slicer.vtkMRMLSubjectHierarchyNode.GetSubjectHierarchyNode(slicer.mrmlScene)
+    return bool(currentItemId) and shNode.GetItemOwnerPluginName(currentItemId) == "LabelMaps"
+
   def onExportButton(self):
-    slicer.app.setOverrideCursor(qt.Qt.WaitCursor)
+    self.ui.statusLabel.plainText = ''
+    self.addLog('Exporting...')
     try:
-      self.ui.statusLabel.plainText = ''
-      self.addLog('Exporting...')
       self.ui.outputFileFolderSelector.addCurrentPathToHistory()
       reductionFactor = self.ui.reductionFactorSliderWidget.value
       outputFormat = self.ui.outputFormatSelector.currentText
       outputFolder = self.ui.inputSelector.currentItem() if outputFormat == "models" else self.ui.outputFileFolderSelector.currentPath
-      self.logic.exportModel(self.ui.inputSelector.currentItem(), outputFolder, reductionFactor, outputFormat)
-      self.addLog('Export successful.')
+      atlasStructureFilePath = self.ui.atlasStructureFileSelector.currentPath if self.isLabelMapInputSelected() else None
+      streaming = self.ui.streamingExportCheckBox.checked
+      sceneViewsFilePath = self.ui.sceneViewsFileSelector.currentPath
+      sceneViews = self.logic.loadSceneViews(sceneViewsFilePath) if sceneViewsFilePath else None
+      self.logic.optimizeMeshes = self.ui.optimizeMeshesCheckBox.checked
+      self.logic.skipUnchangedOutputFiles = self.ui.skipUnchangedOutputFilesCheckBox.checked
+      self.logic.batchMeshesByMaterial = self.ui.batchMeshesByMaterialCheckBox.checked
+      self.logic.exportModelAsync(self.ui.inputSelector.currentItem(), outputFolder, reductionFactor, outputFormat, atlasStructureFilePath,
+        streaming, sceneViews, progressCallback=self.onExportProgress, completedCallback=self.onExportCompleted)
     except Exception as e:
       self.addLog("Error: {0}".format(str(e)))
       import traceback
       traceback.print_exc()
       self.addLog('Export failed.')
-    slicer.app.restoreOverrideCursor()
+    self.ui.exportProgressBar.value = 0
+    self.ui.exportProgressBar.format = "%p%"
+    self.onSelect()
+
+  def onCancelExportButton(self):
+    self.addLog('Cancelling export...')
+    self.logic.cancelExport()
+
+  def onExportProgress(self, progress):
+    if progress['expectedModels'] > 0:
+      self.ui.exportProgressBar.maximum = progress['expectedModels']
+      self.ui.exportProgressBar.value = progress['processedModels']
+    if progress['remainingSec'] is not None:
+      self.ui.exportProgressBar.format = "%p% (about {0:.0f} s remaining)".format(progress['remainingSec'])
+
+  def onExportCompleted(self, success, errorMessage):
+    if success:
+      self.addLog('Export successful.')
+    else:
+      self.addLog("Error: {0}".format(errorMessage))
+      self.addLog('Export failed.')
+    self.onSelect()
 
   def onImageExportButton(self):
     slicer.app.setOverrideCursor(qt.Qt.WaitCursor)
@@ -106,6 +158,7 @@ class OpenAnatomyExportWidget(ScriptedLoadableModuleWidget):
       self.ui.imageOutputFileFolderSelector.addCurrentPathToHistory()
       imageOutputFormat = self.ui.imageOutputFormatSelector.currentText
       imageOutputFolder = self.ui.imageOutputFileFolderSelector.currentPath
+      self.logic.skipUnchangedOutputFiles = self.ui.skipUnchangedOutputFilesCheckBox.checked
       self.logic.exportImage(self.ui.imageInputSelector.currentNode(), imageOutputFormat, imageOutputFolder)
       slicer.util.delayDisplay('Export successful.')
     except Exception as e:
@@ -119,7 +172,6 @@ class OpenAnatomyExportWidget(ScriptedLoadableModuleWidget):
     """Append text to log window
     """
     self.ui.statusLabel.appendPlainText(text)
-    slicer.app.processEvents() # force update
 
 #
 # OpenAnatomyExportLogic
@@ -140,6 +192,19 @@ class OpenAnatomyExportLogic(ScriptedLoadableModuleLogic):
     self.logCallback = None
     self._exportToFile = True  # Save to files or just to the scene, normally on, maybe useful to turn off for debugging
     self.reductionFactor = 0.9
+    self.maximumTrianglesPerTile = 200000  # 3D Tiles export: octree cells with more triangles are subdivided
+    self.maximumTileDepth = 6
+    self.labelMapSmoothingFactor = 0.5  # surface smoothing when exporting label map volumes, 0 means no smoothing
+    self.optimizeMeshes = False  # reorder vertices and triangles of exported meshes for faster rendering
+    self.vertexCacheSize = 16  # post-transform vertex cache size assumed by mesh optimization
+    # If enabled then output files are written into a staging folder first and only files whose content changed are
+    # moved to the output folder. Hashes of all output files are listed in the manifest file in the output folder.
+    self.skipUnchangedOutputFiles = False
+    self.outputManifestFileName = "OpenAnatomyExportManifest.json"
+    self._outputStagingFolder = None
+    # If enabled then opaque glTF meshes that only differ in color are merged into one mesh for each material
+    # (colors are stored as vertex colors), which reduces the number of draw calls in viewers.
+    self.batchMeshesByMaterial = False
 
     # Slicer uses Gouraud lighting model by default, while glTF requires PBR.
     # Material properties conversion in VTK makes the model appear in glTF very dull, faded out,
@@ -158,6 +223,25 @@ class OpenAnatomyExportLogic(ScriptedLoadableModuleLogic):
     self._temporaryExportNodes = []  # temporary nodes used during exportModel
     self._gltfNodes = []
     self._gltfMeshes = []
+    self._atlasStructureJSON = None  # atlas structure used for creating the glTF node hierarchy
+    self._sourceSegmentationNode = None  # segmentation that the exported models were created from
+
+    # Profiling: if an output folder is set then CPU (cProfile) and memory (tracemalloc) profiling results
+    # of export operations are written there. Can be enabled by setting OPENANATOMY_PROFILING_DIR environment variable.
+    self.profilingOutputFolder = Profiling.getProfilingOutputFolder()
+    self.profilingNumberOfTopAllocations = 25
+
+    # Asynchronous export (exportModelAsync)
+    self.exportTimeSliceSec = 0.1  # the application is not responsive while processing this long chunks of the export
+    self._exportSteps = None
+    self._exportTimer = None
+    self._exportProgressCallback = None
+    self._exportCompletedCallback = None
+    self._exportCancelRequested = False
+    self._exportStartTime = 0.0
+    self._exportProfilingSession = None
+    self._exportProfilingInputSize = None
+    self._modelProcessingStartTime = 0.0
 
 
   def addLog(self, text):
@@ -166,6 +250,27 @@ class OpenAnatomyExportLogic(ScriptedLoadableModuleLogic):
       self.logCallback(text)
 
 
+  def getInputSizeDescription(self, inputData):
+    """Get short description of the size of the input data (subject hierarchy item or node), used for naming profiling results.
+    """
+    shNode = slicer.vtkMRMLSubjectHierarchyNode.GetSubjectHierarchyNode(slicer.mrmlScene)
+    if isinstance(inputData, int):
+      dataNode = shNode.GetItemDataNode(inputData)
+      if not dataNode:
+        modelNodes = vtk.vtkCollection()
+        shNode.GetDataNodesInBranch(inputData, modelNodes, "vtkMRMLModelNode")
+        return f"{modelNodes.GetNumberOfItems()}models"
+      inputData = dataNode
+    if inputData is None:
+      return "unknown"
+    if inputData.IsA("vtkMRMLSegmentationNode"):
+      return f"{inputData.GetSegmentation().GetNumberOfSegments()}segments"
+    if inputData.IsA("vtkMRMLVolumeNode") and inputData.GetImageData():
+      return "x".join(str(dimension) for dimension in inputData.GetImageData().GetDimensions())
+    if inputData.IsA("vtkMRMLModelNode") and inputData.GetPolyData():
+      return f"{inputData.GetPolyData().GetNumberOfPoints()}points"
+    return inputData.GetClassName()
+
   def isValidInputOutputData(self, inputNode):
     """Validates if the output is not the same as input
     """
@@ -175,182 +280,1273 @@ class OpenAnatomyExportLogic(ScriptedLoadableModuleLogic):
     return True
 
 
-  def exportModel(self, inputItem, outputFolder=None, reductionFactor=None, outputFormat=None):
+  @profiledLogicMethod
+  def exportModel(self, inputItem, outputFolder=None, reductionFactor=None, outputFormat=None, atlasStructureFilePath=None, streaming=False,
+    sceneViews=None):
+    """Export segmentation, label map volume, or model folder.
+    :param atlasStructureFilePath: optional OpenAnatomy atlas structure JSON file, only for label map volume input.
+      If specified then the glTF node hierarchy is created from the groups of the atlas structure.
+    :param streaming: if enabled then segments of a segmentation are exported to glTF one at a time, without creating model nodes
+      for all the segments, therefore memory usage does not grow with the number of segments.
+    :param sceneViews: optional list of views to add as additional scenes to glTF output (see loadSceneViews and addGltfSceneViews).
+      Scenes share the meshes and buffers, so each view only adds a small amount of data to the file.
+      Views are defined in a JSON file instead of being read from Slicer scene view nodes, because scene view nodes store
+      a snapshot of the whole scene, which does not map to the exported glTF nodes, and views of an atlas are
+      typically authored once and reused for each export.
+    """
+    for progress in self.exportModelSteps(inputItem, outputFolder, reductionFactor, outputFormat, atlasStructureFilePath, streaming, sceneViews):
+      pass
+
+  def exportModelAsync(self, inputItem, outputFolder=None, reductionFactor=None, outputFormat=None, atlasStructureFilePath=None,
+    streaming=False, sceneViews=None, progressCallback=None, completedCallback=None):
+    """Start exporting segmentation, label map volume, or model folder without blocking the application.
+    VTK and MRML cannot be used from a background thread, therefore the export is performed on the main thread
+    in short chunks driven by a timer, so that the application remains responsive between processing of models.
+    :param progressCallback: called with the progress dictionary (see getExportProgress) after each processing step.
+    :param completedCallback: called with (success, errorMessage) when the export is completed, failed, or cancelled.
+    """
+    if self.isExportInProgress():
+      raise RuntimeError("Export is already in progress")
+    self._exportSteps = self.exportModelSteps(inputItem, outputFolder, reductionFactor, outputFormat, atlasStructureFilePath, streaming, sceneViews)
+    self._exportProgressCallback = progressCallback
+    self._exportCompletedCallback = completedCallback
+    self._exportCancelRequested = False
+    self._exportProfilingSession = Profiling.startProfiling() if self.profilingOutputFolder else None
+    if self._exportProfilingSession:
+      self._exportProfilingInputSize = self.getInputSizeDescription(inputItem)
+      # Profiler is only enabled while export steps are processed
+      self._exportProfilingSession['profiler'].disable()
+    self._exportTimer = qt.QTimer()
+    self._exportTimer.setInterval(0)
+    self._exportTimer.connect('timeout()', self.processExportSteps)
+    self._exportTimer.start()
+
+  def isExportInProgress(self):
+    return self._exportSteps is not None
+
+  def cancelExport(self):
+    """Request cancellation of the export started by exportModelAsync. The export stops (and temporary nodes are removed)
+    after the currently processed model is completed.
+    """
+    if self.isExportInProgress():
+      self._exportCancelRequested = True
+
+  def abortExport(self, errorMessage="Export aborted."):
+    """Stop the export started by exportModelAsync immediately (cancelExport waits until the currently processed
+    model is completed). Temporary nodes are removed and completedCallback is called before this method returns.
+    """
+    if not self.isExportInProgress():
+      return
+    # Closing the generator removes the temporary nodes
+    self._exportSteps.close()
+    self.addLog(errorMessage)
+    self.finishExportAsync(False, errorMessage)
+
+  def processExportSteps(self):
+    """Perform export steps until the time slice is used up. Called by the export timer.
+    """
+    timeSliceStartTime = time.time()
+    if self._exportProfilingSession:
+      self._exportProfilingSession['profiler'].enable()
+    try:
+      while time.time() - timeSliceStartTime < self.exportTimeSliceSec:
+        if self._exportCancelRequested:
+          self.abortExport("Export cancelled.")
+          return
+        progress = next(self._exportSteps)
+        if self._exportProgressCallback:
+          self._exportProgressCallback(progress)
+          if not self.isExportInProgress():
+            # Export was aborted in the progress callback
+            return
+    except StopIteration:
+      self.finishExportAsync(True, None)
+    except Exception as e:
+      import traceback
+      traceback.print_exc()
+      self.finishExportAsync(False, str(e))
+    finally:
+      if self._exportProfilingSession:
+        self._exportProfilingSession['profiler'].disable()
+
+  def finishExportAsync(self, success, errorMessage):
+    if self._exportProfilingSession:
+      self._exportProfilingSession['profiler'].disable()
+      profilingResultPath = Profiling.stopProfiling(self._exportProfilingSession, self.profilingOutputFolder, "exportModelAsync",
+        self._exportProfilingInputSize, self.profilingNumberOfTopAllocations)
+      self.addLog(f"Profiling results written to {profilingResultPath}")
+      self._exportProfilingSession = None
+    self._exportTimer.stop()
+    self._exportTimer = None
+    self._exportSteps = None
+    completedCallback = self._exportCompletedCallback
+    self._exportProgressCallback = None
+    self._exportCompletedCallback = None
+    if completedCallback:
+      completedCallback(success, errorMessage)
+
+  def getExportProgress(self, currentItemName=""):
+    """Get current export progress.
+    Remaining time is estimated from the average processing time of the models processed so far.
+    :return: dictionary with processedModels, expectedModels, currentItemName, elapsedSec, remainingSec
+      (remainingSec is None if it cannot be estimated yet)
+    """
+    currentTime = time.time()
+    remainingSec = None
+    if self._numberOfProcessedModels > 0 and self._numberOfExpectedModels >= self._numberOfProcessedModels:
+      averageModelProcessingTimeSec = (currentTime - self._modelProcessingStartTime) / self._numberOfProcessedModels
+      remainingSec = averageModelProcessingTimeSec * (self._numberOfExpectedModels - self._numberOfProcessedModels)
+    return {
+      'processedModels': self._numberOfProcessedModels,
+      'expectedModels': self._numberOfExpectedModels,
+      'currentItemName': currentItemName,
+      'elapsedSec': currentTime - self._exportStartTime,
+      'remainingSec': remainingSec,
+      }
+
+  def exportModelSteps(self, inputItem, outputFolder=None, reductionFactor=None, outputFormat=None, atlasStructureFilePath=None, streaming=False,
+    sceneViews=None):
+    """Generator that performs the same export as exportModel, yielding the current progress (see getExportProgress)
+    after each processed model. Temporary nodes are removed when the generator is closed before completion.
+    """
     if outputFormat is None:
       outputFormat = "glTF"
     if reductionFactor is not None:
       self.reductionFactor = reductionFactor
     self._exportToFile = (outputFormat != "scene")
+    self._exportStartTime = time.time()
+    self._modelProcessingStartTime = self._exportStartTime
+    self._outputShFolderItemId = None
+    self._atlasStructureJSON = None
+    self._sourceSegmentationNode = None
     if outputFolder is None:
       if self._exportToFile:
         raise ValueError("Output folder must be specified if output format is not 'scene'")
+    if self.batchMeshesByMaterial and outputFormat == "glTF" and sceneViews:
+      raise ValueError("Batching meshes by material cannot be combined with scene views")
+    if sceneViews and outputFormat != "glTF":
+      raise ValueError("Scene views are only supported for glTF output format")
 
     shNode = slicer.vtkMRMLSubjectHierarchyNode.GetSubjectHierarchyNode(slicer.mrmlScene)
-    inputName = shNode.GetItemName(inputItem)
-    # Remove characters from name that cannot be used in file names
-    inputName = slicer.app.ioManager().forceFileNameValidCharacters(inputName)
-
-    # Get input as a subject hierarchy folder
-    owner = shNode.GetItemOwnerPluginName(inputItem)
-    if owner == "Folder":
-      # Input is already a model hiearachy
-      inputShFolderItemId = inputItem
-      self._outputShFolderItemId = shNode.CreateFolderItem(shNode.GetSceneItemID(), inputName + " export")
-    elif owner == "Segmentations":
-      # Export segmentation to model hierarchy
-      segLogic = slicer.modules.segmentations.logic()
-      folderName = inputName + '_Models'
-      inputShFolderItemId = shNode.CreateFolderItem(shNode.GetSceneItemID(), folderName)
-      inputSegmentationNode = shNode.GetItemDataNode(inputItem)
-      self.addLog('Export segmentation to models. This may take a few minutes.')
-      success = segLogic.ExportAllSegmentsToModels(inputSegmentationNode, inputShFolderItemId)
-
-      self._outputShFolderItemId = inputShFolderItemId
-    else:
-      raise ValueError("Input item must be a segmentation node or a folder containing model nodes")
-
-    modelNodes = vtk.vtkCollection()
-    shNode.GetDataNodesInBranch(inputShFolderItemId, modelNodes, "vtkMRMLModelNode")
-    planeNodes = vtk.vtkCollection()
-    shNode.GetDataNodesInBranch(inputShFolderItemId, planeNodes, "vtkMRMLMarkupsPlaneNode")
-    self._numberOfExpectedModels = modelNodes.GetNumberOfItems() + planeNodes.GetNumberOfItems()
-    self._numberOfProcessedModels = 0
-    self._gltfNodes = []
-    self._gltfMeshes = []
+    if atlasStructureFilePath and shNode.GetItemOwnerPluginName(inputItem) != "LabelMaps":
+      raise ValueError("Atlas structure file can only be used for exporting a label map volume")
+    try:
+      if atlasStructureFilePath:
+        import json
+        with open(atlasStructureFilePath) as f:
+          self._atlasStructureJSON = json.load(f)
+      inputName = shNode.GetItemName(inputItem)
+      # Remove characters from name that cannot be used in file names
+      inputName = slicer.app.ioManager().forceFileNameValidCharacters(inputName)
+
+      # Get input as a subject hierarchy folder
+      owner = shNode.GetItemOwnerPluginName(inputItem)
+      inputLabelMapVolumeNode = None
+      streamingSegmentationNode = None
+      if owner == "LabelMaps":
+        # Label map surfaces are extracted directly, no input folder is needed
+        inputLabelMapVolumeNode = shNode.GetItemDataNode(inputItem)
+        inputShFolderItemId = None
+        self._outputShFolderItemId = None if self._exportToFile else shNode.CreateFolderItem(shNode.GetSceneItemID(), inputName + " export")
+      elif owner == "Folder":
+        # Input is already a model hiearachy
+        inputShFolderItemId = inputItem
+        self._outputShFolderItemId = shNode.CreateFolderItem(shNode.GetSceneItemID(), inputName + " export")
+      elif owner == "Segmentations" and streaming:
+        if outputFormat != "glTF":
+          raise ValueError("Exporting segments one at a time is only supported for glTF output format")
+        if self.batchMeshesByMaterial:
+          raise ValueError("Batching meshes by material is not supported when exporting segments one at a time")
+        # Segments are exported directly to file, no input folder is needed
+        streamingSegmentationNode = shNode.GetItemDataNode(inputItem)
+        inputShFolderItemId = None
+      elif owner == "Segmentations":
+        # Export segmentation to model hierarchy
+        segLogic = slicer.modules.segmentations.logic()
+        folderName = inputName + '_Models'
+        inputShFolderItemId = shNode.CreateFolderItem(shNode.GetSceneItemID(), folderName)
+        inputSegmentationNode = shNode.GetItemDataNode(inputItem)
+        self._sourceSegmentationNode = inputSegmentationNode
+        self.addLog('Export segmentation to models. This may take a few minutes.')
+        success = segLogic.ExportAllSegmentsToModels(inputSegmentationNode, inputShFolderItemId)
+
+        self._outputShFolderItemId = inputShFolderItemId
+        yield self.getExportProgress(folderName)
+      else:
+        raise ValueError("Input item must be a segmentation node, a label map volume node, or a folder containing model nodes")
+
+      self._numberOfProcessedModels = 0
+      self._gltfNodes = []
+      self._gltfMeshes = []
+
+      writeFolder = outputFolder
+      if self._exportToFile and self.skipUnchangedOutputFiles:
+        self._outputStagingFolder = self.createOutputStagingFolder(outputFolder)
+        writeFolder = self._outputStagingFolder
+
+      if streamingSegmentationNode:
+        outputFilePath = os.path.join(writeFolder, inputName + '.gltf')
+        yield from self.exportSegmentationToGltfSteps(streamingSegmentationNode, outputFilePath, boostGouraudColor=True, sceneViews=sceneViews)
+      elif inputLabelMapVolumeNode:
+        yield from self.addLabelMapToRendererSteps(inputLabelMapVolumeNode, boostGouraudColor = (outputFormat in ["glTF", "3D Tiles"]))
+      else:
+        modelNodes = vtk.vtkCollection()
+        shNode.GetDataNodesInBranch(inputShFolderItemId, modelNodes, "vtkMRMLModelNode")
+        planeNodes = vtk.vtkCollection()
+        shNode.GetDataNodesInBranch(inputShFolderItemId, planeNodes, "vtkMRMLMarkupsPlaneNode")
+        self._numberOfExpectedModels = modelNodes.GetNumberOfItems() + planeNodes.GetNumberOfItems()
+        self._modelProcessingStartTime = time.time()
+
+        # Add models to a self._renderer
+        yield from self.addModelsToRendererSteps(inputShFolderItemId, boostGouraudColor = (outputFormat in ["glTF", "3D Tiles"]))
+
+      if self._exportToFile and not streamingSegmentationNode:
+        outputFileName = inputName
+        # import datetime
+        # dateTimeStr = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        # outputFileName += dateTimeStr
+        outputFilePathBase = os.path.join(writeFolder, outputFileName)
+        if outputFormat == "glTF":
+          exporter = vtk.vtkGLTFExporter()
+          outputFilePath = outputFilePathBase+'.gltf'
+          exporter.SetFileName(outputFilePath)
+          exporter.InlineDataOn()  # save to single file
+          exporter.SaveNormalOn()  # save surface normals
+        elif outputFormat == "OBJ":
+          exporter = vtk.vtkOBJExporter()
+          outputFilePath = outputFilePathBase + '.obj'
+          exporter.SetFilePrefix(outputFilePathBase)
+        elif outputFormat == "3D Tiles":
+          exporter = None
+          outputFilePath = outputFilePathBase
+        else:
+          raise ValueError("Output format must be scene, glTF, OBJ, or 3D Tiles")
 
-    # Add models to a self._renderer
-    self.addModelsToRenderer(inputShFolderItemId, boostGouraudColor = (outputFormat == "glTF"))
+        self.addLog(f"Writing file {outputFilePath}...")
+        yield self.getExportProgress(outputFilePath)
+        if exporter:
+          exporter.SetRenderWindow(self._renderWindow)
+          exporter.Write()
+        else:
+          self.exportTiles(outputFilePath)
 
-    if self._exportToFile:
-      outputFileName = inputName
-      # import datetime
-      # dateTimeStr = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-      # outputFileName += dateTimeStr
-      outputFilePathBase = os.path.join(outputFolder, outputFileName)
-      if outputFormat == "glTF":
-        exporter = vtk.vtkGLTFExporter()
-        outputFilePath = outputFilePathBase+'.gltf'
-        exporter.SetFileName(outputFilePath)
-        exporter.InlineDataOn()  # save to single file
-        exporter.SaveNormalOn()  # save surface normals
-      elif outputFormat == "OBJ":
-        exporter = vtk.vtkOBJExporter()
-        outputFilePath = outputFilePathBase + '.obj'
-        exporter.SetFilePrefix(outputFilePathBase)
-      else:
-        raise ValueError("Output format must be scene, glTF, or OBJ")
+        if outputFormat == "glTF":
+          self.fixUpGltfFile(outputFilePath, self._gltfMeshes, self._gltfNodes, sceneViews)
 
-      self.addLog(f"Writing file {outputFilePath}...")
-      exporter.SetRenderWindow(self._renderWindow)
-      exporter.Write()
+          # TODO:
+          # - Add option to change up vector (glTF defines the y axis as up, https://github.com/KhronosGroup/glTF/issues/1043
+          #   https://castle-engine.io/manual_up.php)
 
-      if outputFormat == "glTF":
+      if self._outputStagingFolder:
+        self.publishOutputFiles(self._outputStagingFolder, outputFolder, inputName, f"model/{outputFormat}")
 
-        # Fix up the VTK-generated glTF file
+      # # Preview
+      # iren = vtk.vtkRenderWindowInteractor()
+      # iren.SetRenderWindow(renderWindow)
+      # iren.Initialize()
+      # renderer.ResetCamera()
+      # renderer.GetActiveCamera().Zoom(1.5)
+      # renderWindow.Render()
+      # iren.Start()
 
-        import json
-        with open(outputFilePath, 'r') as f:
-          jsonData = json.load(f)
-
-        # Update mesh names
-        for meshIndex, mesh in enumerate(self._gltfMeshes):
-          jsonData['meshes'][meshIndex]['name'] = mesh['name']
-
-        # VTK uses "OPAQUE" alpha mode for all meshes, which would make all nodes appear opaque.
-        # Replace alpha mode by "BLEND" for semi-transparent meshes.
-        for material in jsonData['materials']:
-          rgbaColor = material['pbrMetallicRoughness']['baseColorFactor']
-          if rgbaColor[3] < 1.0:
+    finally:
+      # Remove temporary nodes
+      for node in self._temporaryExportNodes:
+        slicer.mrmlScene.RemoveNode(node)
+      self._temporaryExportNodes = []
+
+      self._numberOfExpectedModels = 0
+      self._numberOfProcessedModels = 0
+      self._renderer = None
+      self._renderWindow = None
+      self._decimationParameterNode = None
+      self._atlasStructureJSON = None
+      self._sourceSegmentationNode = None
+
+      if self._exportToFile and self._outputShFolderItemId:
+        shNode.RemoveItem(self._outputShFolderItemId)
+
+      if self._outputStagingFolder:
+        import shutil
+        shutil.rmtree(self._outputStagingFolder, ignore_errors=True)
+        self._outputStagingFolder = None
+
+  def getGltfRootNodeMatrix(self):
+    """Get transform of the glTF root node, which maps the LPS coordinate system (in the scene's length unit)
+    to the glTF coordinate system.
+    """
+    # According to glTF specifications (3.4. Coordinate System and Units
+    # https://registry.khronos.org/glTF/specs/2.0/glTF-2.0.html#coordinate-system-and-units):
+    #
+    #   glTF uses a right-handed coordinate system. glTF defines +Y as up, +Z as forward, and -X as right; the front of a glTF asset faces +Z.
+    #   The units for all linear distances are meters.
+
+    # View up direction in glTF is +Y.
+    # We map that to anatomical S direction by this transform (from LPS to LSA coordinate system).
+    scaleToMeters = self.getScaleToMeters()
+
+    # Transform from LPS coordinate system (in millimeters) to LSA coordinate system (in meters)
+    return [
+        scaleToMeters,    0.0,    0.0,    0.0,
+        0.0,    0.0,   -scaleToMeters,    0.0,
+        0.0,    scaleToMeters,    0.0,    0.0,
+        0.0,    0.0,    0.0,    1.0
+        ]
+
+  def fixUpGltfFile(self, outputFilePath, gltfMeshes, gltfNodes, sceneViews=None):
+    """Fix up the VTK-generated glTF file: set mesh names, alpha mode, node hierarchy (root node is the last
+    item in gltfNodes) and transform from LPS millimeters to the glTF coordinate system.
+    Additional scenes are added for sceneViews (see addGltfSceneViews).
+    If batchMeshesByMaterial is enabled then meshes are merged (see batchGltfMeshesByMaterial).
+    """
+    import json
+    with open(outputFilePath, 'r') as f:
+      jsonData = json.load(f)
+
+    # Update mesh names
+    for meshIndex, mesh in enumerate(gltfMeshes):
+      jsonData['meshes'][meshIndex]['name'] = mesh['name']
+
+    # VTK uses "OPAQUE" alpha mode for all meshes, which would make all nodes appear opaque.
+    # Replace alpha mode by "BLEND" for semi-transparent meshes.
+    for material in jsonData['materials']:
+      rgbaColor = material['pbrMetallicRoughness']['baseColorFactor']
+      if rgbaColor[3] < 1.0:
+        material['alphaMode'] = 'BLEND'
+
+    # Add camera nodes from the VTK-exported file
+    for node in enumerate(gltfNodes):
+      if 'camera' in node:
+        gltfNodes.append(node)
+
+    # Replace the entire hierarchy
+    jsonData['nodes'] = gltfNodes
+
+    # Set up root node
+    rootNodeIndex = len(gltfNodes)-1
+    jsonData['nodes'][rootNodeIndex]['matrix'] = self.getGltfRootNodeMatrix()
+
+    # The scene root is the last node in the gltfNodes list
+    jsonData['scenes'][0]['nodes'] = [rootNodeIndex]
+
+    # Mesh nodes are direct or indirect children of the root node, without any other transforms
+    import numpy as np
+    meshToWorld = np.array(jsonData['nodes'][rootNodeIndex]['matrix']).reshape(4, 4).T[:3, :3]
+    buffers = self.readGltfBuffers(jsonData, outputFilePath)
+    self.addGltfBoundsAndStatistics(jsonData, buffers, meshToWorld)
+
+    if self.batchMeshesByMaterial:
+      self.batchGltfMeshesByMaterial(jsonData, buffers)
+
+    if sceneViews:
+      self.addGltfSceneViews(jsonData, sceneViews)
+
+    jsonData['asset']['generator'] = f"{slicer.app.applicationName} {slicer.app.applicationVersion}"
+
+    with open(outputFilePath, 'w') as f:
+      f.write(json.dumps(jsonData, indent=3))
+
+  @staticmethod
+  def loadSceneViews(sceneViewsFilePath):
+    """Load scene view definitions from a JSON file. The file contains a list of views, each defining
+    visibility and opacity of nodes by name (nodes that are not listed are shown with their original opacity):
+      [{"name": "Skeleton", "visibility": {"Skin": false}, "opacity": {"Muscles": 0.3}}, ...]
+    """
+    import json
+    with open(sceneViewsFilePath) as f:
+      sceneViews = json.load(f)
+    if not isinstance(sceneViews, list) or not all(isinstance(sceneView, dict) and sceneView.get('name') for sceneView in sceneViews):
+      raise ValueError(f"Scene views file must contain a list of views, each with a name: {sceneViewsFilePath}")
+    return sceneViews
+
+  def addGltfSceneViews(self, jsonData, sceneViews):
+    """Add a glTF scene for each scene view. Scenes of the views contain copies of the nodes of the default scene
+    that are visible in that view. Meshes are shared between scenes, only opacity changes require new mesh and
+    material objects (which refer to the same accessors), therefore each view adds only a small amount of JSON.
+    If visibility of a group node is turned off then all its children are hidden.
+    If opacity is set for a group node then it applies to all its children (unless opacity is set for a child).
+    """
+    import copy
+    defaultRootNodeIndex = jsonData['scenes'][0]['nodes'][0]
+    allNodeNames = {node.get('name') for node in jsonData['nodes']}
+    for sceneView in sceneViews:
+      visibility = sceneView.get('visibility', {})
+      opacity = sceneView.get('opacity', {})
+      notFoundNames = sorted((set(visibility) | set(opacity)) - allNodeNames)
+      if notFoundNames:
+        self.addLog(f"  Warning: nodes not found for scene view '{sceneView['name']}': {', '.join(notFoundNames)}")
+      meshIndexByOpacity = {}
+      materialIndexByOpacity = {}
+
+      def getMaterialIndex(materialIndex, materialOpacity):
+        if jsonData['materials'][materialIndex]['pbrMetallicRoughness']['baseColorFactor'][3] == materialOpacity:
+          return materialIndex
+        if (materialIndex, materialOpacity) not in materialIndexByOpacity:
+          material = copy.deepcopy(jsonData['materials'][materialIndex])
+          material['pbrMetallicRoughness']['baseColorFactor'][3] = materialOpacity
+          if materialOpacity < 1.0:
             material['alphaMode'] = 'BLEND'
+          else:
+            material.pop('alphaMode', None)
+          jsonData['materials'].append(material)
+          materialIndexByOpacity[(materialIndex, materialOpacity)] = len(jsonData['materials']) - 1
+        return materialIndexByOpacity[(materialIndex, materialOpacity)]
+
+      def getMeshIndex(meshIndex, meshOpacity):
+        if meshOpacity is None:
+          return meshIndex
+        if (meshIndex, meshOpacity) not in meshIndexByOpacity:
+          mesh = copy.deepcopy(jsonData['meshes'][meshIndex])
+          for primitive in mesh['primitives']:
+            if 'material' in primitive:
+              primitive['material'] = getMaterialIndex(primitive['material'], meshOpacity)
+          if mesh == jsonData['meshes'][meshIndex]:
+            # opacity is not changed
+            return meshIndex
+          jsonData['meshes'].append(mesh)
+          meshIndexByOpacity[(meshIndex, meshOpacity)] = len(jsonData['meshes']) - 1
+        return meshIndexByOpacity[(meshIndex, meshOpacity)]
+
+      def copyVisibleNodes(nodeIndex, inheritedOpacity):
+        """Copy node and its visible children. Returns index of the new node, None if nothing is visible."""
+        node = jsonData['nodes'][nodeIndex]
+        if not visibility.get(node.get('name'), True):
+          return None
+        nodeOpacity = opacity.get(node.get('name'), inheritedOpacity)
+        nodeCopy = {key: value for key, value in node.items() if key not in ['children', 'mesh']}
+        if 'mesh' in node:
+          nodeCopy['mesh'] = getMeshIndex(node['mesh'], nodeOpacity)
+        childIndices = [copyVisibleNodes(childIndex, nodeOpacity) for childIndex in node.get('children', [])]
+        childIndices = [childIndex for childIndex in childIndices if childIndex is not None]
+        if childIndices:
+          nodeCopy['children'] = childIndices
+        elif 'mesh' not in node and 'camera' not in node:
+          # empty group
+          return None
+        jsonData['nodes'].append(nodeCopy)
+        return len(jsonData['nodes']) - 1
+
+      rootNodeIndex = copyVisibleNodes(defaultRootNodeIndex, None)
+      jsonData['scenes'].append({'name': sceneView['name'], 'nodes': [rootNodeIndex] if rootNodeIndex is not None else []})
+
+  @staticmethod
+  def readGltfBuffers(jsonData, gltfFilePath):
+    """Get content of all buffers of a glTF file as bytes (embedded base64 or external files).
+    """
+    import base64
+    buffers = []
+    for buffer in jsonData.get('buffers', []):
+      uri = buffer.get('uri', '')
+      if uri.startswith('data:'):
+        buffers.append(base64.b64decode(uri.split(',', 1)[1]))
+      else:
+        with open(os.path.join(os.path.dirname(gltfFilePath), uri), 'rb') as f:
+          buffers.append(f.read())
+    return buffers
 
-        # Add camera nodes from the VTK-exported file
-        for node in enumerate(self._gltfNodes):
-          if 'camera' in node:
-            self._gltfNodes.append(node)
-
-        # Replace the entire hierarchy
-        jsonData['nodes'] = self._gltfNodes
-
-        # Set up root node
-        rootNodeIndex = len(self._gltfNodes)-1
-
-        # According to glTF specifications (3.4. Coordinate System and Units
-        # https://registry.khronos.org/glTF/specs/2.0/glTF-2.0.html#coordinate-system-and-units):
-        #
-        #   glTF uses a right-handed coordinate system. glTF defines +Y as up, +Z as forward, and -X as right; the front of a glTF asset faces +Z.
-        #   The units for all linear distances are meters.
-
-        # View up direction in glTF is +Y.
-        # We map that to anatomical S direction by this transform (from LPS to LSA coordinate system).
-
-        # Default coordinate system unit in Slicer is millimeters, therefore we need to scale the model
-        # from the scene's length unit. Currently only "mm" and "m" units are supported.
-        selectionNode = slicer.mrmlScene.GetNodeByID("vtkMRMLSelectionNodeSingleton")
-        unitNode = slicer.mrmlScene.GetNodeByID(selectionNode.GetUnitNodeID("length"))
-        lengthUnitSuffix = unitNode.GetSuffix()
-        if lengthUnitSuffix == "mm":
-          scaleToMeters = 0.001
-        elif lengthUnitSuffix == "m":
-          scaleToMeters = 1.0
+  @staticmethod
+  def readGltfAccessor(jsonData, buffers, accessorIndex):
+    """Get content of a glTF accessor as a numpy array of shape (count, number of components).
+    """
+    import numpy as np
+    componentTypes = {5120: np.int8, 5121: np.uint8, 5122: np.int16, 5123: np.uint16, 5125: np.uint32, 5126: np.float32}
+    numberOfComponents = {'SCALAR': 1, 'VEC2': 2, 'VEC3': 3, 'VEC4': 4, 'MAT2': 4, 'MAT3': 9, 'MAT4': 16}
+    accessor = jsonData['accessors'][accessorIndex]
+    dtype = np.dtype(componentTypes[accessor['componentType']]).newbyteorder('<')
+    components = numberOfComponents[accessor['type']]
+    count = accessor['count']
+    if 'bufferView' not in accessor:
+      return np.zeros((count, components), dtype=dtype)
+    bufferView = jsonData['bufferViews'][accessor['bufferView']]
+    offset = bufferView.get('byteOffset', 0) + accessor.get('byteOffset', 0)
+    stride = bufferView.get('byteStride', dtype.itemsize * components)
+    return np.ndarray(shape=(count, components), dtype=dtype, buffer=buffers[bufferView['buffer']],
+      offset=offset, strides=(stride, dtype.itemsize))
+
+  def addGltfBoundsAndStatistics(self, jsonData, buffers, meshToWorld):
+    """Make accessor min/max values complete and store axis-aligned bounds, centroid, and triangle count
+    (in the glTF scene coordinate system) in extras of each mesh node, so that viewers can build spatial indices
+    and cull meshes without reading vertex buffers.
+    meshToWorld is a 3x3 matrix that transforms mesh coordinates to the scene coordinate system.
+    """
+    import numpy as np
+
+    # Accessor min/max
+    for accessorIndex, accessor in enumerate(jsonData.get('accessors', [])):
+      if 'min' in accessor and 'max' in accessor:
+        continue
+      values = self.readGltfAccessor(jsonData, buffers, accessorIndex)
+      if len(values) == 0:
+        continue
+      isFloat = accessor['componentType'] == 5126
+      accessor['min'] = [float(value) if isFloat else int(value) for value in values.min(axis=0)]
+      accessor['max'] = [float(value) if isFloat else int(value) for value in values.max(axis=0)]
+
+    # Mesh statistics
+    meshStatistics = []
+    for mesh in jsonData.get('meshes', []):
+      trianglePoints = []
+      boundsMin = np.full(3, np.inf)
+      boundsMax = np.full(3, -np.inf)
+      for primitive in mesh['primitives']:
+        if 'POSITION' not in primitive['attributes']:
+          continue
+        positions = self.readGltfAccessor(jsonData, buffers, primitive['attributes']['POSITION']) @ meshToWorld.T
+        if len(positions) == 0:
+          continue
+        boundsMin = np.minimum(boundsMin, positions.min(axis=0))
+        boundsMax = np.maximum(boundsMax, positions.max(axis=0))
+        if primitive.get('mode', 4) != 4:  # only triangles are counted
+          continue
+        if 'indices' in primitive:
+          indices = self.readGltfAccessor(jsonData, buffers, primitive['indices']).reshape(-1)
         else:
-          msg = f"Unsupported length unit ({lengthUnitSuffix}). Exported glTF file will not be scaled to meters!"
-          self.addLog(msg)
-          logging.warning(msg)
-          scaleToMeters = 1.0
-
-        # Transform from LPS coordinate system (in millimeters) to LSA coordinate system (in meters)
-        jsonData['nodes'][rootNodeIndex]['matrix'] = [
-            scaleToMeters,    0.0,    0.0,    0.0,
-            0.0,    0.0,   -scaleToMeters,    0.0,
-            0.0,    scaleToMeters,    0.0,    0.0,
-            0.0,    0.0,    0.0,    1.0
-            ]
-
-        # The scene root is the last node in the self._gltfNodes list
-        jsonData['scenes'][0]['nodes'] = [rootNodeIndex]
-
-        jsonData['asset']['generator'] = f"{slicer.app.applicationName} {slicer.app.applicationVersion}"
-
-        with open(outputFilePath, 'w') as f:
-          f.write(json.dumps(jsonData, indent=3))
-
-        # TODO:
-        # - Add scene view states as scenes
-        # - Add option to change up vector (glTF defines the y axis as up, https://github.com/KhronosGroup/glTF/issues/1043
-        #   https://castle-engine.io/manual_up.php)
-
-    # # Preview
-    # iren = vtk.vtkRenderWindowInteractor()
-    # iren.SetRenderWindow(renderWindow)
-    # iren.Initialize()
-    # renderer.ResetCamera()
-    # renderer.GetActiveCamera().Zoom(1.5)
-    # renderWindow.Render()
-    # iren.Start()
-
-    # Remove temporary nodes
-    for node in self._temporaryExportNodes:
-      slicer.mrmlScene.RemoveNode(node)
-    self._temporaryExportNodes = []
-
-    self._numberOfExpectedModels = 0
-    self._numberOfProcessedModels = 0
-    self._renderer = None
-    self._renderWindow = None
-    self._decimationParameterNode = None
+          indices = np.arange(len(positions))
+        trianglePoints.append(positions[indices[:len(indices) // 3 * 3].reshape(-1, 3)])
+      meshStatistics.append(self.getMeshStatistics(boundsMin, boundsMax, np.concatenate(trianglePoints) if trianglePoints else None))
+
+    for node in jsonData['nodes']:
+      if 'mesh' in node:
+        node['extras'] = dict(node.get('extras', {}), **meshStatistics[node['mesh']])
+
+  def batchGltfMeshesByMaterial(self, jsonData, buffers):
+    """Merge opaque triangle meshes that have the same material (except base color) into a single mesh, to reduce
+    the number of draw calls in viewers. Base color of each original mesh is stored as vertex color (COLOR_0).
+    Each vertex of a merged mesh has a feature ID (_FEATURE_ID_0 attribute, see EXT_mesh_features extension),
+    which is the index of the original node in the 'structures' list in the extras of the merged node.
+    Items of the list contain name and extras of the original node and its range in the index buffer
+    (firstIndex, indexCount), so that picked structures can be identified and drawn separately.
+    Merged nodes are removed from the hierarchy (along with groups that become empty) and the new nodes are added
+    as children of the root node. Buffers are replaced by a single embedded buffer that contains only the used data.
+    Accessor min/max values and node statistics must be already set (see addGltfBoundsAndStatistics).
+    """
+    import base64
+    import json
+    import numpy as np
+
+    nodes = jsonData['nodes']
+    materials = jsonData.get('materials', [])
+
+    # Group mesh nodes by material
+    nodeIndicesByMaterial = {}
+    for nodeIndex, node in enumerate(nodes):
+      if 'mesh' not in node or any(key in node for key in ['matrix', 'translation', 'rotation', 'scale', 'children']):
+        continue
+      primitives = jsonData['meshes'][node['mesh']]['primitives']
+      if len(primitives) != 1 or primitives[0].get('mode', 4) != 4 or 'material' not in primitives[0] or 'targets' in primitives[0]:
+        continue
+      if not set(primitives[0]['attributes']).issubset({'POSITION', 'NORMAL'}) or 'POSITION' not in primitives[0]['attributes']:
+        continue
+      material = materials[primitives[0]['material']]
+      pbr = material.get('pbrMetallicRoughness', {})
+      if material.get('alphaMode', 'OPAQUE') != 'OPAQUE' or pbr.get('baseColorFactor', [1.0] * 4)[3] < 1.0 or 'baseColorTexture' in pbr:
+        continue
+      materialWithoutColor = dict(material, pbrMetallicRoughness=dict(pbr, baseColorFactor=None), name=None)
+      materialKey = (json.dumps(materialWithoutColor, sort_keys=True), tuple(sorted(primitives[0]['attributes'])))
+      nodeIndicesByMaterial.setdefault(materialKey, []).append(nodeIndex)
+
+    batches = [nodeIndices for nodeIndices in nodeIndicesByMaterial.values() if len(nodeIndices) > 1]
+    if not batches:
+      return
+
+    # Accessors that are created here are stored as arrays until the buffer is rewritten
+    accessorArrays = {}
+
+    def addAccessor(array, componentType, accessorType, normalized=False):
+      accessor = {'componentType': componentType, 'count': len(array), 'type': accessorType}
+      if normalized:
+        accessor['normalized'] = True
+      jsonData['accessors'].append(accessor)
+      accessorArrays[len(jsonData['accessors']) - 1] = array
+      return len(jsonData['accessors']) - 1
+
+    batchedNodeIndices = set()
+    batchNodes = []
+    for batchIndex, nodeIndices in enumerate(batches):
+      attributeNames = sorted(jsonData['meshes'][nodes[nodeIndices[0]]['mesh']]['primitives'][0]['attributes'])
+      attributeArrays = {attributeName: [] for attributeName in attributeNames}
+      colors = []
+      featureIds = []
+      indices = []
+      structures = []
+      numberOfVertices = 0
+      numberOfIndices = 0
+      for featureId, nodeIndex in enumerate(nodeIndices):
+        node = nodes[nodeIndex]
+        primitive = jsonData['meshes'][node['mesh']]['primitives'][0]
+        for attributeName in attributeNames:
+          attributeArrays[attributeName].append(self.readGltfAccessor(jsonData, buffers, primitive['attributes'][attributeName]))
+        nodeNumberOfVertices = len(attributeArrays['POSITION'][-1])
+        if 'indices' in primitive:
+          primitiveIndices = self.readGltfAccessor(jsonData, buffers, primitive['indices']).reshape(-1).astype(np.uint32)
+        else:
+          primitiveIndices = np.arange(nodeNumberOfVertices, dtype=np.uint32)
+        indices.append(primitiveIndices + numberOfVertices)
+        baseColor = materials[primitive['material']].get('pbrMetallicRoughness', {}).get('baseColorFactor', [1.0] * 4)
+        colors.append(np.tile(np.round(np.clip(baseColor[:3], 0.0, 1.0) * 255.0).astype(np.uint8).tolist() + [255], (nodeNumberOfVertices, 1)))
+        featureIds.append(np.full((nodeNumberOfVertices, 1), featureId, dtype=np.float32))
+        structures.append(dict(node.get('extras', {}), name=node.get('name', ''), firstIndex=numberOfIndices, indexCount=len(primitiveIndices)))
+        numberOfVertices += nodeNumberOfVertices
+        numberOfIndices += len(primitiveIndices)
+        batchedNodeIndices.add(nodeIndex)
+
+      attributes = {}
+      for attributeName in attributeNames:
+        attributes[attributeName] = addAccessor(np.concatenate(attributeArrays[attributeName]).astype('<f4'), 5126, 'VEC3')
+      attributes['COLOR_0'] = addAccessor(np.concatenate(colors).astype(np.uint8), 5121, 'VEC4', normalized=True)
+      attributes['_FEATURE_ID_0'] = addAccessor(np.concatenate(featureIds).astype('<f4'), 5126, 'SCALAR')
+      indices = np.concatenate(indices)
+      # The maximum value of the index component type is reserved (primitive restart)
+      indices = indices.astype('<u2') if numberOfVertices < 65535 else indices.astype('<u4')
+      indicesAccessorIndex = addAccessor(indices.reshape(-1, 1), 5123 if indices.dtype.itemsize == 2 else 5125, 'SCALAR')
+
+      # Vertex colors are multiplied by the base color, therefore base color of the merged material is white
+      firstPrimitive = jsonData['meshes'][nodes[nodeIndices[0]]['mesh']]['primitives'][0]
+      material = json.loads(json.dumps(materials[firstPrimitive['material']]))
+      material.setdefault('pbrMetallicRoughness', {})['baseColorFactor'] = [1.0, 1.0, 1.0, 1.0]
+      material['name'] = f"Batch {batchIndex + 1}"
+      materials.append(material)
+
+      batchName = f"Batch {batchIndex + 1}"
+      jsonData['meshes'].append({'name': batchName, 'primitives': [{'attributes': attributes, 'indices': indicesAccessorIndex,
+        'material': len(materials) - 1, 'mode': 4, 'extensions': {'EXT_mesh_features': {'featureIds': [{'featureCount': len(nodeIndices),
+        'attribute': 0, 'label': "structure"}]}}}]})
+      extras = {'triangleCount': sum(structure.get('triangleCount', 0) for structure in structures), 'structures': structures}
+      structuresWithBounds = [structure for structure in structures if 'boundsMin' in structure]
+      if structuresWithBounds:
+        extras['boundsMin'] = [float(value) for value in np.min([structure['boundsMin'] for structure in structuresWithBounds], axis=0)]
+        extras['boundsMax'] = [float(value) for value in np.max([structure['boundsMax'] for structure in structuresWithBounds], axis=0)]
+        extras['centroid'] = [(minimum + maximum) / 2.0 for minimum, maximum in zip(extras['boundsMin'], extras['boundsMax'])]
+      batchNodes.append({'name': batchName, 'mesh': len(jsonData['meshes']) - 1, 'extras': extras})
+    jsonData.setdefault('extensionsUsed', [])
+    if 'EXT_mesh_features' not in jsonData['extensionsUsed']:
+      jsonData['extensionsUsed'].append('EXT_mesh_features')
+
+    # Remove merged nodes and groups that became empty from the hierarchy, and add the new nodes to the root node
+    removedNodeIndices = set(batchedNodeIndices)
+
+    def removeEmptyChildren(nodeIndex):
+      node = nodes[nodeIndex]
+      if 'children' in node:
+        node['children'] = [childIndex for childIndex in node['children'] if childIndex not in removedNodeIndices and removeEmptyChildren(childIndex)]
+        if not node['children']:
+          del node['children']
+          if 'mesh' not in node and 'camera' not in node:
+            removedNodeIndices.add(nodeIndex)
+            return False
+      return True
 
-    if self._exportToFile:
-      shNode.RemoveItem(self._outputShFolderItemId)
+    rootNodeIndex = jsonData['scenes'][0]['nodes'][0]
+    rootNode = nodes[rootNodeIndex]
+    rootNode['children'] = [childIndex for childIndex in rootNode.get('children', [])
+      if childIndex not in removedNodeIndices and removeEmptyChildren(childIndex)]
+    rootNode['children'].extend(range(len(nodes), len(nodes) + len(batchNodes)))
+    nodes.extend(batchNodes)
+
+    newNodeIndices = {}
+    for nodeIndex in range(len(nodes)):
+      if nodeIndex not in removedNodeIndices:
+        newNodeIndices[nodeIndex] = len(newNodeIndices)
+    jsonData['nodes'] = [nodes[nodeIndex] for nodeIndex in newNodeIndices]
+    for node in jsonData['nodes']:
+      if 'children' in node:
+        node['children'] = [newNodeIndices[childIndex] for childIndex in node['children']]
+    for scene in jsonData['scenes']:
+      scene['nodes'] = [newNodeIndices[nodeIndex] for nodeIndex in scene.get('nodes', []) if nodeIndex in newNodeIndices]
+
+    # Remove meshes and materials that are not used anymore
+    newMeshIndices = {}
+    for node in jsonData['nodes']:
+      if 'mesh' in node:
+        node['mesh'] = newMeshIndices.setdefault(node['mesh'], len(newMeshIndices))
+    meshes = jsonData['meshes']
+    jsonData['meshes'] = [meshes[meshIndex] for meshIndex in sorted(newMeshIndices, key=newMeshIndices.get)]
+    newMaterialIndices = {}
+    for mesh in jsonData['meshes']:
+      for primitive in mesh['primitives']:
+        if 'material' in primitive:
+          primitive['material'] = newMaterialIndices.setdefault(primitive['material'], len(newMaterialIndices))
+    jsonData['materials'] = [materials[materialIndex] for materialIndex in sorted(newMaterialIndices, key=newMaterialIndices.get)]
+
+    # Write used accessors into a new buffer
+    newAccessorIndices = {}
+    indicesAccessorIndices = set()
+    for mesh in jsonData['meshes']:
+      for primitive in mesh['primitives']:
+        for attributeName, accessorIndex in primitive['attributes'].items():
+          primitive['attributes'][attributeName] = newAccessorIndices.setdefault(accessorIndex, len(newAccessorIndices))
+        if 'indices' in primitive:
+          indicesAccessorIndices.add(primitive['indices'])
+          primitive['indices'] = newAccessorIndices.setdefault(primitive['indices'], len(newAccessorIndices))
+    usedAccessorIndices = sorted(newAccessorIndices, key=newAccessorIndices.get)
+    for accessorIndex in usedAccessorIndices:
+      if accessorIndex not in accessorArrays:
+        accessorArrays[accessorIndex] = self.readGltfAccessor(jsonData, buffers, accessorIndex)
+    accessors = jsonData['accessors']
+    jsonData['accessors'] = []
+    jsonData['bufferViews'] = []
+    bufferData = bytearray()
+    for accessorIndex in usedAccessorIndices:
+      accessor = accessors[accessorIndex]
+      array = accessorArrays[accessorIndex]
+      if len(array) > 0 and ('min' not in accessor or 'max' not in accessor):
+        isFloat = accessor['componentType'] == 5126
+        accessor['min'] = [float(value) if isFloat else int(value) for value in array.min(axis=0)]
+        accessor['max'] = [float(value) if isFloat else int(value) for value in array.max(axis=0)]
+      bufferData.extend(b'\0' * (-len(bufferData) % 4))  # accessors must be aligned to 4 bytes
+      data = np.ascontiguousarray(array).tobytes()
+      jsonData['bufferViews'].append({'buffer': 0, 'byteOffset': len(bufferData), 'byteLength': len(data),
+        'target': 34963 if accessorIndex in indicesAccessorIndices else 34962})
+      bufferData.extend(data)
+      accessor = {key: value for key, value in accessor.items() if key not in ['bufferView', 'byteOffset']}
+      accessor['bufferView'] = len(jsonData['bufferViews']) - 1
+      jsonData['accessors'].append(accessor)
+    jsonData['buffers'] = [{'byteLength': len(bufferData), 'uri': "data:application/octet-stream;base64," + base64.b64encode(bufferData).decode('ascii')}]
+
+  @staticmethod
+  def getMeshStatistics(boundsMin, boundsMax, trianglePoints=None):
+    """Get mesh statistics that are stored in glTF node extras: bounds, centroid (area-weighted), and triangle count.
+    :param trianglePoints: numpy array of shape (number of triangles, 3, 3)
+    """
+    import numpy as np
+    statistics = {'triangleCount': 0}
+    if np.all(np.isfinite(boundsMin)):
+      statistics['boundsMin'] = [float(value) for value in boundsMin]
+      statistics['boundsMax'] = [float(value) for value in boundsMax]
+      statistics['centroid'] = [float(value) for value in (np.asarray(boundsMin) + np.asarray(boundsMax)) / 2.0]
+    if trianglePoints is not None and len(trianglePoints) > 0:
+      statistics['triangleCount'] = len(trianglePoints)
+      # Area-weighted centroid of the surface
+      areas = np.linalg.norm(np.cross(trianglePoints[:, 1] - trianglePoints[:, 0], trianglePoints[:, 2] - trianglePoints[:, 0]), axis=1) / 2.0
+      if areas.sum() > 0:
+        statistics['centroid'] = [float(value) for value in (trianglePoints.mean(axis=1) * areas[:, np.newaxis]).sum(axis=0) / areas.sum()]
+    return statistics
+
+  def getScaleToMeters(self):
+    """Get scaling factor from the scene's length unit to meters.
+    Default coordinate system unit in Slicer is millimeters, therefore we need to scale the model
+    from the scene's length unit. Currently only "mm" and "m" units are supported.
+    """
+    selectionNode = slicer.mrmlScene.GetNodeByID("vtkMRMLSelectionNodeSingleton")
+    unitNode = slicer.mrmlScene.GetNodeByID(selectionNode.GetUnitNodeID("length"))
+    lengthUnitSuffix = unitNode.GetSuffix()
+    if lengthUnitSuffix == "mm":
+      scaleToMeters = 0.001
+    elif lengthUnitSuffix == "m":
+      scaleToMeters = 1.0
+    else:
+      msg = f"Unsupported length unit ({lengthUnitSuffix}). Exported glTF file will not be scaled to meters!"
+      self.addLog(msg)
+      logging.warning(msg)
+      scaleToMeters = 1.0
+    return scaleToMeters
+
+  @staticmethod
+  def createPolyDataFromTriangles(points, triangles, normals=None):
+    """Create polydata from a subset of triangles of a mesh (numpy arrays), keeping only the used points.
+    """
+    import numpy as np
+    from vtk.util import numpy_support
+    pointIds, connectivity = np.unique(triangles, return_inverse=True)
+    polyPoints = vtk.vtkPoints()
+    polyPoints.SetData(numpy_support.numpy_to_vtk(points[pointIds], deep=True))
+    polys = vtk.vtkCellArray()
+    polys.SetData(3, numpy_support.numpy_to_vtkIdTypeArray(connectivity.reshape(-1).astype(numpy_support.ID_TYPE_CODE), deep=True))
+    polyData = vtk.vtkPolyData()
+    polyData.SetPoints(polyPoints)
+    polyData.SetPolys(polys)
+    if normals is not None:
+      normalArray = numpy_support.numpy_to_vtk(normals[pointIds], deep=True)
+      normalArray.SetName("NORMAL")
+      polyData.GetPointData().SetNormals(normalArray)
+    return polyData
 
+  @staticmethod
+  def getTriangleMeshArrays(polyData):
+    """Get points, triangles, and point normals of a triangle mesh as numpy arrays.
+    """
+    import numpy as np
+    from vtk.util import numpy_support
+    if polyData.GetNumberOfPoints() == 0 or polyData.GetNumberOfPolys() == 0:
+      return np.zeros((0, 3)), np.zeros((0, 3), dtype=int), None
+    points = numpy_support.vtk_to_numpy(polyData.GetPoints().GetData())
+    triangles = numpy_support.vtk_to_numpy(polyData.GetPolys().GetConnectivityArray()).reshape(-1, 3)
+    normalArray = polyData.GetPointData().GetNormals()
+    normals = numpy_support.vtk_to_numpy(normalArray) if normalArray else None
+    return points, triangles, normals
+
+  @staticmethod
+  def computeVertexCacheMissRatio(triangles, cacheSize=16):
+    """Compute average cache miss ratio (ACMR, number of vertex shader invocations per triangle)
+    of a triangle list, by simulating a FIFO post-transform vertex cache.
+    """
+    import collections
+    if len(triangles) == 0:
+      return 0.0
+    cachedVertices = collections.deque()
+    cachedVertexSet = set()
+    numberOfMisses = 0
+    for vertex in triangles.ravel().tolist():
+      if vertex in cachedVertexSet:
+        continue
+      numberOfMisses += 1
+      cachedVertices.append(vertex)
+      cachedVertexSet.add(vertex)
+      if len(cachedVertices) > cacheSize:
+        cachedVertexSet.discard(cachedVertices.popleft())
+    return numberOfMisses / len(triangles)
+
+  @staticmethod
+  def getVertexCacheOptimizedTriangleOrder(triangles, numberOfVertices, cacheSize=16):
+    """Reorder triangles for vertex cache efficiency using the "Tipsify" algorithm
+    (Sander, Nehab, Barczak: Fast Triangle Reordering for Vertex Locality and Reduced Overdraw, 2007).
+    Triangles are emitted by fanning around vertices that are likely to be still in the cache.
+    :return: triangle order and start index of clusters (a new cluster is started when fanning cannot continue
+      from a vertex in the cache). Clusters can be reordered without affecting cache efficiency.
+    """
+    import numpy as np
+    numberOfTriangles = len(triangles)
+    flatTriangles = triangles.ravel()
+    # Vertex -> triangles adjacency
+    vertexTriangleCounts = np.bincount(flatTriangles, minlength=numberOfVertices)
+    adjacencyOffsets = np.concatenate([[0], np.cumsum(vertexTriangleCounts)]).tolist()
+    adjacentTriangles = (np.argsort(flatTriangles, kind="stable") // 3).tolist()
+    liveTriangleCounts = vertexTriangleCounts.tolist()
+    triangleVertices = triangles.tolist()
+
+    cacheTimeStamps = [0] * numberOfVertices
+    emitted = [False] * numberOfTriangles
+    deadEndStack = []
+    triangleOrder = []
+    clusterStarts = []
+    cacheTime = cacheSize + 1
+    nextInputVertex = 0
+    fanningVertex = -1
+    while True:
+      if fanningVertex < 0:
+        # Cannot continue from a cached vertex, start a new cluster from a recently used vertex or from the next unprocessed input vertex
+        while deadEndStack:
+          vertex = deadEndStack.pop()
+          if liveTriangleCounts[vertex] > 0:
+            fanningVertex = vertex
+            break
+        else:
+          while nextInputVertex < numberOfVertices and liveTriangleCounts[nextInputVertex] == 0:
+            nextInputVertex += 1
+          if nextInputVertex >= numberOfVertices:
+            break
+          fanningVertex = nextInputVertex
+        clusterStarts.append(len(triangleOrder))
+
+      # Emit all remaining triangles around the fanning vertex
+      candidates = []
+      for triangle in adjacentTriangles[adjacencyOffsets[fanningVertex]:adjacencyOffsets[fanningVertex + 1]]:
+        if emitted[triangle]:
+          continue
+        emitted[triangle] = True
+        triangleOrder.append(triangle)
+        for vertex in triangleVertices[triangle]:
+          deadEndStack.append(vertex)
+          candidates.append(vertex)
+          liveTriangleCounts[vertex] -= 1
+          if cacheTime - cacheTimeStamps[vertex] > cacheSize:
+            cacheTimeStamps[vertex] = cacheTime
+            cacheTime += 1
+
+      # Continue with the candidate that will stay in the cache for the longest time while all its triangles are emitted
+      fanningVertex = -1
+      bestPriority = -1
+      for vertex in candidates:
+        if liveTriangleCounts[vertex] == 0:
+          continue
+        priority = 0
+        if cacheTime - cacheTimeStamps[vertex] + 2 * liveTriangleCounts[vertex] <= cacheSize:
+          priority = cacheTime - cacheTimeStamps[vertex]
+        if priority > bestPriority:
+          bestPriority = priority
+          fanningVertex = vertex
+
+    return np.array(triangleOrder, dtype=np.int64), clusterStarts
+
+  def optimizeMeshForGpu(self, polyData):
+    """Optimize a triangle mesh for rendering: weld identical vertices, reorder triangles for vertex cache
+    efficiency and reduced overdraw, and reorder vertices in the order of their first use (vertex fetch locality).
+    All point data arrays are preserved.
+    :return: optimized polydata, ACMR before and after optimization; or None if the mesh is not a triangle mesh.
+    """
+    import numpy as np
+    from vtk.util import numpy_support
+
+    if (polyData.GetNumberOfPolys() == 0 or polyData.GetNumberOfLines() > 0 or polyData.GetNumberOfVerts() > 0
+        or polyData.GetNumberOfStrips() > 0 or polyData.GetPolys().IsHomogeneous() != 3
+        or polyData.GetCellData().GetNumberOfArrays() > 0):
+      return None
+
+    points = numpy_support.vtk_to_numpy(polyData.GetPoints().GetData())
+    triangles = numpy_support.vtk_to_numpy(polyData.GetPolys().GetConnectivityArray()).reshape(-1, 3).astype(np.int64)
+    pointData = polyData.GetPointData()
+    if any(pointData.GetArray(arrayIndex) is None for arrayIndex in range(pointData.GetNumberOfArrays())):
+      # non-numeric point data
+      return None
+    pointArrays = [numpy_support.vtk_to_numpy(pointData.GetArray(arrayIndex)) for arrayIndex in range(pointData.GetNumberOfArrays())]
+    cacheMissRatioBefore = self.computeVertexCacheMissRatio(triangles, self.vertexCacheSize)
+
+    # Weld vertices that have exactly the same position and point data
+    vertexAttributes = np.hstack([points.astype(np.float64)] + [array.reshape(len(points), -1).astype(np.float64) for array in pointArrays])
+    _, firstVertexIndices, vertexIdMap = np.unique(vertexAttributes, axis=0, return_index=True, return_inverse=True)
+    triangles = vertexIdMap.reshape(-1)[triangles]
+    # Remove triangles that became degenerate
+    triangles = triangles[(triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2]) & (triangles[:, 2] != triangles[:, 0])]
+    if len(triangles) == 0:
+      return None
+
+    # Reorder triangles for vertex cache
+    triangleOrder, clusterStarts = self.getVertexCacheOptimizedTriangleOrder(triangles, len(firstVertexIndices), self.vertexCacheSize)
+    triangles = triangles[triangleOrder]
+
+    # Reduce overdraw: draw clusters that face outwards first (view-independent sorting),
+    # as they are likely to occlude the rest of the mesh
+    trianglePoints = points[firstVertexIndices[triangles]].astype(np.float64)
+    areaWeightedNormals = np.cross(trianglePoints[:, 1] - trianglePoints[:, 0], trianglePoints[:, 2] - trianglePoints[:, 0])
+    triangleCentroids = trianglePoints.mean(axis=1)
+    meshCentroid = triangleCentroids.mean(axis=0)
+    clusterEnds = clusterStarts[1:] + [len(triangles)]
+    clusterSortKeys = []
+    for clusterStart, clusterEnd in zip(clusterStarts, clusterEnds):
+      clusterNormal = areaWeightedNormals[clusterStart:clusterEnd].sum(axis=0)
+      clusterNormalLength = np.linalg.norm(clusterNormal)
+      if clusterNormalLength > 0:
+        clusterNormal /= clusterNormalLength
+      clusterSortKeys.append(np.dot(triangleCentroids[clusterStart:clusterEnd].mean(axis=0) - meshCentroid, clusterNormal))
+    clusterOrder = np.argsort(-np.array(clusterSortKeys), kind="stable")
+    triangles = np.concatenate([triangles[clusterStarts[clusterIndex]:clusterEnds[clusterIndex]] for clusterIndex in clusterOrder])
+
+    # Reorder vertices by first use
+    usedVertexIds, firstUseIndices = np.unique(triangles.ravel(), return_index=True)
+    vertexOrder = usedVertexIds[np.argsort(firstUseIndices)]
+    newVertexIds = np.zeros(len(firstVertexIndices), dtype=np.int64)
+    newVertexIds[vertexOrder] = np.arange(len(vertexOrder))
+    triangles = newVertexIds[triangles]
+    originalVertexIds = firstVertexIndices[vertexOrder]
+
+    cacheMissRatioAfter = self.computeVertexCacheMissRatio(triangles, self.vertexCacheSize)
+
+    optimizedPolyData = vtk.vtkPolyData()
+    optimizedPoints = vtk.vtkPoints()
+    optimizedPoints.SetData(numpy_support.numpy_to_vtk(points[originalVertexIds], deep=True))
+    optimizedPolyData.SetPoints(optimizedPoints)
+    polys = vtk.vtkCellArray()
+    polys.SetData(3, numpy_support.numpy_to_vtkIdTypeArray(triangles.ravel().astype(numpy_support.ID_TYPE_CODE), deep=True))
+    optimizedPolyData.SetPolys(polys)
+    for arrayIndex, array in enumerate(pointArrays):
+      optimizedArray = numpy_support.numpy_to_vtk(np.ascontiguousarray(array[originalVertexIds]), deep=True)
+      optimizedArray.SetName(pointData.GetArray(arrayIndex).GetName())
+      optimizedPolyData.GetPointData().AddArray(optimizedArray)
+    optimizedPointData = optimizedPolyData.GetPointData()
+    for attributeType in range(vtk.vtkDataSetAttributes.NUM_ATTRIBUTES):
+      attributeArray = pointData.GetAbstractAttribute(attributeType)
+      if attributeArray is not None and attributeArray.GetName():
+        optimizedPointData.SetActiveAttribute(attributeArray.GetName(), attributeType)
+
+    return optimizedPolyData, cacheMissRatioBefore, cacheMissRatioAfter
+
+  def optimizeOutputMesh(self, polyData):
+    """Optimize mesh for GPU rendering if enabled (see optimizeMeshForGpu) and log the cache efficiency improvement.
+    """
+    if not self.optimizeMeshes:
+      return polyData
+    result = self.optimizeMeshForGpu(polyData)
+    if result is None:
+      return polyData
+    optimizedPolyData, cacheMissRatioBefore, cacheMissRatioAfter = result
+    self.addLog(f"  Vertex cache optimization: ACMR {cacheMissRatioBefore:.3f} -> {cacheMissRatioAfter:.3f}")
+    return optimizedPolyData
+
+  def exportTiles(self, outputFolderPath):
+    """Write models of self._renderer as a 3D Tiles tile set (tileset.json index and glTF tile contents).
+    Triangles are assigned to octree cells by their centroid. Cells are subdivided until they contain at most
+    self.maximumTrianglesPerTile triangles. Parent tiles contain the same meshes decimated by reductionFactor
+    once for each level above the leaves, so that viewers can show coarse geometry first and refine it
+    progressively.
+    """
+    import json
+    import numpy as np
+
+    tileReductionFactor = self.reductionFactor if self.reductionFactor > 0.0 else 0.5
+    scaleToMeters = self.getScaleToMeters()
+
+    # Collect meshes (already decimated, in LPS coordinate system)
+    meshes = []
+    actors = self._renderer.GetActors()
+    actors.InitTraversal()
+    for meshIndex in range(actors.GetNumberOfItems()):
+      actor = actors.GetNextActor()
+      triangulator = vtk.vtkTriangleFilter()
+      triangulator.SetInputConnection(actor.GetMapper().GetInputConnection(0, 0))
+      triangulator.PassLinesOff()
+      triangulator.PassVertsOff()
+      triangulator.Update()
+      meshes.append({'name': self._gltfMeshes[meshIndex]['name'], 'property': actor.GetProperty(),
+        'levelPolyData': [triangulator.GetOutput()], 'levels': []})
+
+    def getMeshLevel(mesh, level):
+      """Get points, triangles, normals, centroids of a mesh at a decimation level (0 = full resolution)"""
+      while len(mesh['levelPolyData']) <= level:
+        decimation = vtk.vtkQuadricDecimation()
+        decimation.SetInputData(mesh['levelPolyData'][-1])
+        decimation.SetTargetReduction(tileReductionFactor)
+        decimation.VolumePreservationOn()
+        normals = vtk.vtkPolyDataNormals()
+        normals.SetInputConnection(decimation.GetOutputPort())
+        normals.SplittingOff()
+        normals.Update()
+        levelPolyData = normals.GetOutput()
+        if self.optimizeMeshes:
+          result = self.optimizeMeshForGpu(levelPolyData)
+          if result is not None:
+            levelPolyData = result[0]
+        mesh['levelPolyData'].append(levelPolyData)
+      while len(mesh['levels']) <= level:
+        points, triangles, normals = self.getTriangleMeshArrays(mesh['levelPolyData'][len(mesh['levels'])])
+        centroids = points[triangles].mean(axis=1) if len(triangles) else np.zeros((0, 3))
+        mesh['levels'].append((points, triangles, normals, centroids))
+      return mesh['levels'][level]
+
+    def isInCell(centroids, cellMin, cellMax):
+      return np.all((centroids >= cellMin) & (centroids < cellMax), axis=1)
+
+    # Build octree from full resolution triangles
+    allCentroids = [getMeshLevel(mesh, 0)[3] for mesh in meshes]
+    nonEmptyCentroids = [centroids for centroids in allCentroids if len(centroids)]
+    if not nonEmptyCentroids:
+      raise ValueError("No surface meshes to export")
+    rootMin = np.min([centroids.min(axis=0) for centroids in nonEmptyCentroids], axis=0)
+    rootMax = np.max([centroids.max(axis=0) for centroids in nonEmptyCentroids], axis=0)
+    rootMax = rootMax + 1e-6 * max(np.linalg.norm(rootMax - rootMin), 1.0)  # make the upper bound exclusive
+
+    def buildOctree(cellMin, cellMax, depth, name):
+      numberOfTriangles = sum(np.count_nonzero(isInCell(centroids, cellMin, cellMax)) for centroids in allCentroids)
+      tile = {'min': cellMin, 'max': cellMax, 'name': name, 'children': [], 'height': 0}
+      if numberOfTriangles <= self.maximumTrianglesPerTile or depth >= self.maximumTileDepth:
+        return tile
+      cellCenter = (cellMin + cellMax) / 2.0
+      for octant in range(8):
+        octantSelector = np.array([(octant >> axis) & 1 for axis in range(3)], dtype=bool)
+        childMin = np.where(octantSelector, cellCenter, cellMin)
+        childMax = np.where(octantSelector, cellMax, cellCenter)
+        if any(np.any(isInCell(centroids, childMin, childMax)) for centroids in allCentroids):
+          tile['children'].append(buildOctree(childMin, childMax, depth + 1, f"{name}_{octant}"))
+      tile['height'] = 1 + max(child['height'] for child in tile['children'])
+      return tile
+
+    rootTile = buildOctree(rootMin, rootMax, 0, "tile")
+
+    # Write tile contents and create tile set description
+    tilesFolderPath = os.path.join(outputFolderPath, "tiles")
+    os.makedirs(tilesFolderPath, exist_ok=True)
+
+    def writeTile(tile):
+      childTilesJson = [writeTile(child) for child in tile['children']]
+
+      renderer = vtk.vtkRenderer()
+      renderWindow = vtk.vtkRenderWindow()
+      renderWindow.AddRenderer(renderer)
+      tileGltfMeshes = []
+      tileGltfNodes = []
+      boundsMin = np.full(3, np.inf)
+      boundsMax = np.full(3, -np.inf)
+      edgeLengths = []
+      for mesh in meshes:
+        # Bounds must contain content of all descendant tiles, which use lower levels
+        for level in range(tile['height'] + 1):
+          points, triangles, normals, centroids = getMeshLevel(mesh, level)
+          inCell = isInCell(centroids, tile['min'], tile['max'])
+          if not np.any(inCell):
+            continue
+          cellPoints = points[triangles[inCell]].reshape(-1, 3)
+          boundsMin = np.minimum(boundsMin, cellPoints.min(axis=0))
+          boundsMax = np.maximum(boundsMax, cellPoints.max(axis=0))
+          if level != tile['height']:
+            continue
+          # This level is the content of the tile
+          trianglePoints = points[triangles[inCell]]
+          edgeLengths.append(np.linalg.norm(trianglePoints - np.roll(trianglePoints, 1, axis=1), axis=2).ravel())
+          producer = vtk.vtkTrivialProducer()
+          producer.SetOutput(self.createPolyDataFromTriangles(points, triangles[inCell], normals))
+          mapper = vtk.vtkPolyDataMapper()
+          mapper.SetInputConnection(producer.GetOutputPort())
+          actor = vtk.vtkActor()
+          actor.SetMapper(mapper)
+          actor.GetProperty().DeepCopy(mesh['property'])
+          renderer.AddActor(actor)
+          tileGltfNodes.append({'mesh': len(tileGltfMeshes), 'name': mesh['name']})
+          tileGltfMeshes.append({'name': mesh['name']})
+
+      tileJson = {}
+      if tileGltfMeshes:
+        tileGltfNodes.append({'name': tile['name'], 'children': list(range(len(tileGltfNodes)))})
+        tileFilePath = os.path.join(tilesFolderPath, tile['name'] + ".gltf")
+        exporter = vtk.vtkGLTFExporter()
+        exporter.SetFileName(tileFilePath)
+        exporter.InlineDataOn()
+        exporter.SaveNormalOn()
+        exporter.SetRenderWindow(renderWindow)
+        exporter.Write()
+        self.fixUpGltfFile(tileFilePath, tileGltfMeshes, tileGltfNodes)
+        tileJson['content'] = {'uri': "tiles/" + tile['name'] + ".gltf"}
+
+      # Tile set coordinate system is LPS in meters: glTF content is in LSA (see fixUpGltfFile) and
+      # 3D Tiles rotates glTF content from y-up to z-up.
+      center = (boundsMin + boundsMax) / 2.0 * scaleToMeters
+      halfSize = np.maximum((boundsMax - boundsMin) / 2.0 * scaleToMeters, 1e-9)
+      tileJson['boundingVolume'] = {'box': [
+        center[0], center[1], center[2],
+        halfSize[0], 0.0, 0.0,
+        0.0, halfSize[1], 0.0,
+        0.0, 0.0, halfSize[2]]}
+      if childTilesJson:
+        # Geometric error of the coarse content is estimated from its average edge length
+        geometricError = float(np.concatenate(edgeLengths).mean()) * scaleToMeters if edgeLengths else 0.0
+        tileJson['geometricError'] = max([geometricError] + [child['geometricError'] for child in childTilesJson])
+        tileJson['refine'] = "REPLACE"
+        tileJson['children'] = childTilesJson
+      else:
+        tileJson['geometricError'] = 0.0
+      tileJson['boundingVolume']['box'] = [float(value) for value in tileJson['boundingVolume']['box']]
+      return tileJson
+
+    rootTileJson = writeTile(rootTile)
+    tileset = {
+      'asset': {'version': "1.1", 'generator': f"{slicer.app.applicationName} {slicer.app.applicationVersion}"},
+      'geometricError': max(rootTileJson['geometricError'] * 2.0, float(np.linalg.norm(rootMax - rootMin)) * scaleToMeters),
+      'root': rootTileJson,
+      }
+    if 'refine' not in rootTileJson:
+      rootTileJson['refine'] = "REPLACE"
+    with open(os.path.join(outputFolderPath, "tileset.json"), 'w') as f:
+      f.write(json.dumps(tileset, indent=2))
+
+  @profiledLogicMethod
   def exportImage(self, volumeNode, outputFormat, outputFolder):
-    writer=vtk.vtkXMLImageDataWriter()
-    writer.SetFileName("{0}/{1}.vti".format(outputFolder, volumeNode.GetName()))
-    writer.SetInputData(volumeNode.GetImageData())
-    writer.SetCompressorTypeToZLib()
-    writer.Write()
+    writeFolder = self.createOutputStagingFolder(outputFolder) if self.skipUnchangedOutputFiles else outputFolder
+    try:
+      writer=vtk.vtkXMLImageDataWriter()
+      writer.SetFileName("{0}/{1}.vti".format(writeFolder, volumeNode.GetName()))
+      writer.SetInputData(volumeNode.GetImageData())
+      writer.SetCompressorTypeToZLib()
+      writer.Write()
+      if writeFolder != outputFolder:
+        self.publishOutputFiles(writeFolder, outputFolder, volumeNode.GetName(), f"image/{outputFormat}")
+    finally:
+      if writeFolder != outputFolder:
+        import shutil
+        shutil.rmtree(writeFolder, ignore_errors=True)
+
+  def createOutputStagingFolder(self, outputFolder):
+    """Create a temporary folder for writing output files (see skipUnchangedOutputFiles). It is created inside
+    the output folder, so that files can be moved from there to the output folder by renaming.
+    """
+    import tempfile
+    os.makedirs(outputFolder, exist_ok=True)
+    return tempfile.mkdtemp(prefix=".staging-", dir=outputFolder)
+
+  def publishOutputFiles(self, stagingFolder, outputFolder, exportName=None, exportKind=None):
+    """Move files from the staging folder to the output folder, except files that have the same content as the file
+    already in the output folder, and update hashes in the manifest file of the output folder.
+    Unchanged files are not touched, so file synchronization tools and client caches do not see them as modified.
+    Files that a previous export of the same name and kind published but the current export does not produce anymore
+    (for example, tiles of a coarser tile set) are removed. Files of other exports in the output folder are kept,
+    including exports of the same name to another format (for example, glTF and OBJ, or an image and its models).
+    :param exportName: name of the export (input name), stored in the manifest to find files of previous exports.
+    :param exportKind: type and format of the export (such as "model/glTF" or "image/vti"), stored in the manifest.
+    :return: relative paths of files that were changed or removed
+    """
+    import copy
+    manifestFilePath = os.path.join(outputFolder, self.outputManifestFileName)
+    manifest = {'files': {}}
+    if os.path.exists(manifestFilePath):
+      import json
+      with open(manifestFilePath) as f:
+        manifest = json.load(f)
+    previousManifest = copy.deepcopy(manifest)
+    changedFiles = []
+    publishedFiles = set()
+    numberOfUnchangedFiles = 0
+    for folder, subfolders, fileNames in os.walk(stagingFolder):
+      for fileName in fileNames:
+        stagedFilePath = os.path.join(folder, fileName)
+        relativePath = os.path.relpath(stagedFilePath, stagingFolder).replace("\\", "/")
+        outputFilePath = os.path.join(outputFolder, relativePath)
+        fileHash = self.getFileContentHash(stagedFilePath)
+        if os.path.exists(outputFilePath) and self.getOutputFileHash(outputFilePath, manifest['files'].get(relativePath)) == fileHash:
+          numberOfUnchangedFiles += 1
+        else:
+          os.makedirs(os.path.dirname(outputFilePath), exist_ok=True)
+          os.replace(stagedFilePath, outputFilePath)
+          changedFiles.append(relativePath)
+        outputFileStat = os.stat(outputFilePath)
+        manifest['files'][relativePath] = {'sha256': fileHash, 'size': outputFileStat.st_size, 'mtime': outputFileStat.st_mtime}
+        if exportName is not None:
+          manifest['files'][relativePath]['export'] = exportName
+          manifest['files'][relativePath]['exportKind'] = exportKind
+        publishedFiles.add(relativePath)
+
+    # Remove files that the previous export of the same name and kind published but this export did not produce
+    removedFiles = []
+    if exportName is not None:
+      for relativePath, manifestEntry in list(manifest['files'].items()):
+        if (relativePath in publishedFiles or manifestEntry.get('export') != exportName
+          or manifestEntry.get('exportKind') != exportKind):
+          continue
+        outputFilePath = os.path.join(outputFolder, relativePath)
+        if os.path.exists(outputFilePath):
+          os.remove(outputFilePath)
+        # Remove folders that became empty
+        folder = os.path.dirname(os.path.abspath(outputFilePath))
+        while folder != os.path.abspath(outputFolder) and os.path.isdir(folder) and not os.listdir(folder):
+          os.rmdir(folder)
+          folder = os.path.dirname(folder)
+        del manifest['files'][relativePath]
+        removedFiles.append(relativePath)
+
+    if manifest != previousManifest or not os.path.exists(manifestFilePath):
+      self.writeJsonFile(manifestFilePath, manifest)
+    self.addLog(f"Output files: {len(changedFiles)} changed, {numberOfUnchangedFiles} unchanged (not written again), {len(removedFiles)} removed.")
+    return changedFiles + removedFiles
+
+  def getOutputFileHash(self, filePath, manifestEntry):
+    """Get content hash of an output file. Hash is taken from the manifest entry if the file has not changed since then.
+    """
+    if manifestEntry:
+      fileStat = os.stat(filePath)
+      if manifestEntry.get('size') == fileStat.st_size and manifestEntry.get('mtime') == fileStat.st_mtime:
+        return manifestEntry['sha256']
+    return self.getFileContentHash(filePath)
+
+  @staticmethod
+  def getFileContentHash(filePath, chunkSize=1024*1024):
+    import hashlib
+    fileHash = hashlib.sha256()
+    with open(filePath, 'rb') as f:
+      for chunk in iter(lambda: f.read(chunkSize), b''):
+        fileHash.update(chunk)
+    return fileHash.hexdigest()
+
+  @staticmethod
+  def writeJsonFile(filePath, data):
+    """Write JSON file atomically, so that readers never see partially written content.
+    """
+    import json
+    temporaryFilePath = filePath + ".tmp"
+    with open(temporaryFilePath, 'w') as f:
+      json.dump(data, f, indent=2)
+    os.replace(temporaryFilePath, filePath)
 
 
-  def addModelsToRenderer(self, shFolderItemId, boostGouraudColor=False):
+  def addModelsToRendererSteps(self, shFolderItemId, boostGouraudColor=False):
+    """Add all models in the subject hierarchy folder (recursively) to self._renderer.
+    Generator, yields the current progress after each processed model.
+    """
     if not shFolderItemId:
       raise ValueError("Subject hierarchy folder does not exist.")
 
@@ -363,26 +1559,26 @@ class OpenAnatomyExportLogic(ScriptedLoadableModuleLogic):
         self._renderWindow = vtk.vtkRenderWindow()
         self._renderWindow.AddRenderer(self._renderer)
 
-    slicer.app.pauseRender()
-    try:
-
-      shNode = slicer.vtkMRMLSubjectHierarchyNode.GetSubjectHierarchyNode(slicer.mrmlScene)
-      folderName = shNode.GetItemName(shFolderItemId)
-      # Remove characters from name that cannot be used in file names
-      folderName = slicer.app.ioManager().forceFileNameValidCharacters(folderName)
-      self.addLog(f"Writing {folderName}...")
-
-      # Write all children of this item (recursively)
-      childIds = vtk.vtkIdList()
-      shNode.GetItemChildren(shFolderItemId, childIds)
-      for itemIdIndex in range(childIds.GetNumberOfIds()):
-        shItemId = childIds.GetId(itemIdIndex)
-        dataNode = shNode.GetItemDataNode(shItemId)
-        dataNotNone = dataNode is not None
-        isModel = dataNotNone and dataNode.IsA("vtkMRMLModelNode")
-        isMarkupsPlane = dataNotNone and dataNode.IsA("vtkMRMLMarkupsPlaneNode")
-        dataIsValid = (isModel or isMarkupsPlane)
-        if dataIsValid:
+    shNode = slicer.vtkMRMLSubjectHierarchyNode.GetSubjectHierarchyNode(slicer.mrmlScene)
+    folderName = shNode.GetItemName(shFolderItemId)
+    # Remove characters from name that cannot be used in file names
+    folderName = slicer.app.ioManager().forceFileNameValidCharacters(folderName)
+    self.addLog(f"Writing {folderName}...")
+
+    # Write all children of this item (recursively)
+    childIds = vtk.vtkIdList()
+    shNode.GetItemChildren(shFolderItemId, childIds)
+    for itemIdIndex in range(childIds.GetNumberOfIds()):
+      shItemId = childIds.GetId(itemIdIndex)
+      dataNode = shNode.GetItemDataNode(shItemId)
+      dataNotNone = dataNode is not None
+      isModel = dataNotNone and dataNode.IsA("vtkMRMLModelNode")
+      isMarkupsPlane = dataNotNone and dataNode.IsA("vtkMRMLMarkupsPlaneNode")
+      dataIsValid = (isModel or isMarkupsPlane)
+      if dataIsValid:
+        # Rendering is only paused while processing a model, to keep the application responsive between export steps
+        slicer.app.pauseRender()
+        try:
           if dataNode.IsA("vtkMRMLModelNode"):
             inputModelNode = dataNode
           else:
@@ -414,38 +1610,423 @@ class OpenAnatomyExportLogic(ScriptedLoadableModuleLogic):
             gltfMeshIndex = len(self._gltfMeshes)
             self._gltfMeshes.append({'name': meshName})
             gltfMeshNodeIndex = len(self._gltfNodes)
-            self._gltfNodes.append({'mesh': gltfMeshIndex, 'name': meshName})
+            self._gltfNodes.append({'mesh': gltfMeshIndex, 'name': meshName, 'extras': self.getSourceExtras(dataNode)})
             gltfFolderNodeChildren.append(gltfMeshNodeIndex)
 
           if dataNode and dataNode.IsA("vtkMRMLMarkupsPlaneNode"):
             slicer.mrmlScene.RemoveNode(inputModelNode)
+        finally:
+          slicer.app.resumeRender()
+        yield self.getExportProgress(meshName)
+
+      # Write all children of this child item
+      grandChildIds = vtk.vtkIdList()
+      shNode.GetItemChildren(shItemId, grandChildIds)
+      if grandChildIds.GetNumberOfIds() > 0:
+        yield from self.addModelsToRendererSteps(shItemId, boostGouraudColor)
+        # added highest-level parent folder is the last node
+        gltfFolderNodeIndex = len(self._gltfNodes)-1
+        gltfFolderNodeChildren.append(gltfFolderNodeIndex)
+
+    # Processed all items in the folder, now save the folder information
+    self._gltfNodes.append({'name': folderName, 'children': gltfFolderNodeChildren})
+
+
+  def getSourceExtras(self, dataNode):
+    """Get glTF node extras that identify the source of an exported model: segment ID if the model was created
+    from a segment of the exported segmentation, otherwise the ID of the model (or markups plane) node.
+    """
+    if self._sourceSegmentationNode:
+      segmentId = self._sourceSegmentationNode.GetSegmentation().GetSegmentIdBySegmentName(dataNode.GetName())
+      if segmentId:
+        return {'segmentId': segmentId}
+    return {'nodeId': dataNode.GetID()}
+
+  def extractLabelSurfaces(self, labelMapVolumeNode):
+    """Extract surfaces of all labels of a label map volume in a single pass
+    (discrete flying edges), smoothed but not decimated.
+    :return: dictionary of label value -> polydata in RAS coordinate system
+    """
+    import numpy as np
+    labelValues = [int(labelValue) for labelValue in np.unique(slicer.util.arrayFromVolume(labelMapVolumeNode)) if labelValue != 0]
+    ijkToRas = vtk.vtkMatrix4x4()
+    labelMapVolumeNode.GetIJKToRASMatrix(ijkToRas)
+    return self.extractLabelSurfacesFromImage(labelMapVolumeNode.GetImageData(), ijkToRas, labelMapVolumeNode.GetParentTransformNode(),
+      labelValues, self.labelMapSmoothingFactor)
+
+  def extractLabelSurfacesFromImage(self, imageData, ijkToRas, parentTransformNode, labelValues, smoothingFactor):
+    """Extract surfaces of the specified labels of an image in a single pass (discrete flying edges), smoothed but not decimated.
+    :return: dictionary of label value -> polydata in RAS coordinate system
+    """
+    import numpy as np
+    from vtk.util import numpy_support
+
+    if not labelValues:
+      return {}
+
+    # Flying edges ignores image direction, therefore surfaces are extracted in IJK coordinate system
+    # and transformed to RAS afterwards.
+    ijkImageData = vtk.vtkImageData()
+    ijkImageData.ShallowCopy(imageData)
+    ijkImageData.SetOrigin(0.0, 0.0, 0.0)
+    ijkImageData.SetSpacing(1.0, 1.0, 1.0)
+
+    # Pad the image so that surfaces are closed where labels touch the image boundary
+    extent = ijkImageData.GetExtent()
+    padder = vtk.vtkImageConstantPad()
+    padder.SetInputData(ijkImageData)
+    padder.SetOutputWholeExtent(extent[0] - 1, extent[1] + 1, extent[2] - 1, extent[3] + 1, extent[4] - 1, extent[5] + 1)
+    padder.SetConstant(0)
+
+    surfaceExtractor = vtk.vtkDiscreteFlyingEdges3D()
+    surfaceExtractor.SetInputConnection(padder.GetOutputPort())
+    surfaceExtractor.ComputeScalarsOn()  # label value of each point, used for splitting the output by label
+    surfaceExtractor.ComputeNormalsOff()
+    surfaceExtractor.ComputeGradientsOff()
+    for valueIndex, labelValue in enumerate(labelValues):
+      surfaceExtractor.SetValue(valueIndex, labelValue)
+    surfaceConnection = surfaceExtractor.GetOutputPort()
+
+    # Points of different labels are not shared, so smoothing the whole output at once
+    # is the same as smoothing each label surface separately.
+    if smoothingFactor > 0:
+      smoother = vtk.vtkWindowedSincPolyDataFilter()
+      smoother.SetInputConnection(surfaceConnection)
+      smoother.SetNumberOfIterations(20)
+      smoother.SetPassBand(pow(10.0, -4.0 * smoothingFactor))
+      smoother.BoundarySmoothingOff()
+      smoother.FeatureEdgeSmoothingOff()
+      smoother.NonManifoldSmoothingOn()
+      smoother.NormalizeCoordinatesOn()
+      surfaceConnection = smoother.GetOutputPort()
+
+    transformToWorld = vtk.vtkGeneralTransform()
+    slicer.vtkMRMLTransformNode.GetTransformBetweenNodes(parentTransformNode, None, transformToWorld)
+    transformToWorld.Concatenate(ijkToRas)
+    transformer = vtk.vtkTransformPolyDataFilter()
+    transformer.SetTransform(transformToWorld)
+    transformer.SetInputConnection(surfaceConnection)
+    outputFilter = transformer
+    if ijkToRas.Determinant() < 0:
+      # Mirroring inverts the triangle winding, which would make surface normals point inward
+      reverser = vtk.vtkReverseSense()
+      reverser.SetInputConnection(transformer.GetOutputPort())
+      reverser.ReverseCellsOn()
+      reverser.ReverseNormalsOff()
+      outputFilter = reverser
+    outputFilter.Update()
+    surfaces = outputFilter.GetOutput()
+    if surfaces.GetNumberOfPoints() == 0:
+      return {}
+
+    # Split output by label value
+    points = numpy_support.vtk_to_numpy(surfaces.GetPoints().GetData())
+    pointLabels = numpy_support.vtk_to_numpy(surfaces.GetPointData().GetScalars())
+    triangles = numpy_support.vtk_to_numpy(surfaces.GetPolys().GetConnectivityArray()).reshape(-1, 3)
+    triangleOrder = np.argsort(pointLabels[triangles[:, 0]], kind="stable")
+    sortedTriangleLabels = pointLabels[triangles[triangleOrder, 0]]
+    splitLabelValues, splitStarts = np.unique(sortedTriangleLabels, return_index=True)
+    splitEnds = np.append(splitStarts[1:], len(triangleOrder))
+
+    labelSurfaces = {}
+    for labelValue, start, end in zip(splitLabelValues, splitStarts, splitEnds):
+      labelSurfaces[int(labelValue)] = self.createPolyDataFromTriangles(points, triangles[triangleOrder[start:end]])
+    return labelSurfaces
+
+  def getDecimatedSurface(self, polyData):
+    """Decimate surface by self.reductionFactor and compute point normals.
+    Small models are not decimated (see addModelToRenderer).
+    """
+    if self.reductionFactor > 0.0 and polyData.GetNumberOfPoints() >= 50:
+      decimation = vtk.vtkQuadricDecimation()
+      decimation.SetInputData(polyData)
+      decimation.SetTargetReduction(self.reductionFactor)
+      decimation.VolumePreservationOn()
+      decimation.Update()
+      polyData = decimation.GetOutput()
+
+    normals = vtk.vtkPolyDataNormals()
+    normals.SetInputData(polyData)
+    normals.SplittingOff()
+    normals.Update()
+    return normals.GetOutput()
+
+  def getSegmentSurface(self, segmentationNode, segmentId):
+    """Get closed surface of a single segment (in RAS coordinate system), without creating the closed surface
+    representation of the whole segmentation. Existing closed surface representation is used if available.
+    """
+    segmentation = segmentationNode.GetSegmentation()
+    closedSurfaceName = slicer.vtkSegmentationConverter.GetSegmentationClosedSurfaceRepresentationName()
+    if segmentation.ContainsRepresentation(closedSurfaceName):
+      polyData = vtk.vtkPolyData()
+      segmentationNode.GetClosedSurfaceRepresentation(segmentId, polyData)
+      if segmentationNode.GetParentTransformNode():
+        transformToWorld = vtk.vtkGeneralTransform()
+        slicer.vtkMRMLTransformNode.GetTransformBetweenNodes(segmentationNode.GetParentTransformNode(), None, transformToWorld)
+        transformer = vtk.vtkTransformPolyDataFilter()
+        transformer.SetTransform(transformToWorld)
+        transformer.SetInputData(polyData)
+        transformer.Update()
+        polyData = transformer.GetOutput()
+      return polyData
+
+    # Binary labelmap of this segment only (segment voxels are 1)
+    labelmap = slicer.vtkOrientedImageData()
+    segmentationNode.GetBinaryLabelmapRepresentation(segmentId, labelmap)
+    if labelmap.IsEmpty():
+      return vtk.vtkPolyData()
+    imageToWorld = vtk.vtkMatrix4x4()
+    labelmap.GetImageToWorldMatrix(imageToWorld)
+    try:
+      smoothingFactor = float(segmentation.GetConversionParameter("Smoothing factor"))
+    except ValueError:
+      smoothingFactor = self.labelMapSmoothingFactor
+    labelSurfaces = self.extractLabelSurfacesFromImage(labelmap, imageToWorld, segmentationNode.GetParentTransformNode(), [1], smoothingFactor)
+    return labelSurfaces.get(1, vtk.vtkPolyData())
+
+  def exportSegmentationToGltfSteps(self, segmentationNode, outputFilePath, boostGouraudColor=False, sceneViews=None):
+    """Write segments to a glTF file one at a time: surface of each segment is created, decimated, appended to the
+    output, and then released. Memory usage does not depend on the number of segments.
+    Additional scenes are added for sceneViews (see addGltfSceneViews).
+    Generator, yields the current progress after each processed segment.
+    """
+    import base64
+    import json
+    import numpy as np
+
+    segmentation = segmentationNode.GetSegmentation()
+    segmentIds = vtk.vtkStringArray()
+    segmentation.GetSegmentIDs(segmentIds)
+    segmentIds = [segmentIds.GetValue(index) for index in range(segmentIds.GetNumberOfValues())]
+    displayNode = segmentationNode.GetDisplayNode()
+    self._numberOfExpectedModels = len(segmentIds)
+    self._modelProcessingStartTime = time.time()
+
+    jsonData = {
+      'asset': {'version': "2.0", 'generator': f"{slicer.app.applicationName} {slicer.app.applicationVersion}"},
+      'scene': 0, 'scenes': [{'nodes': []}], 'nodes': [], 'meshes': [], 'materials': [],
+      'accessors': [], 'bufferViews': [], 'buffers': []}
+    rootNodeMatrix = self.getGltfRootNodeMatrix()
+    meshToWorld = np.array(rootNodeMatrix).reshape(4, 4).T[:3, :3]
+    rasToLps = np.array([-1.0, -1.0, 1.0])
+
+    # Mesh data is appended to a temporary binary file, which is embedded into the glTF file at the end
+    binaryFilePath = outputFilePath + ".bin.tmp"
+    try:
+      with open(binaryFilePath, 'wb') as binaryFile:
 
-        # Write all children of this child item
-        grandChildIds = vtk.vtkIdList()
-        shNode.GetItemChildren(shItemId, grandChildIds)
-        if grandChildIds.GetNumberOfIds() > 0:
-          self.addModelsToRenderer(shItemId, boostGouraudColor)
-          # added highest-level parent folder is the last node
-          gltfFolderNodeIndex = len(self._gltfNodes)-1
-          gltfFolderNodeChildren.append(gltfFolderNodeIndex)
+        def addBufferView(array, target):
+          binaryFile.write(b'\0' * (-binaryFile.tell() % 4))  # accessors must be aligned to 4 bytes
+          jsonData['bufferViews'].append({'buffer': 0, 'byteOffset': binaryFile.tell(), 'byteLength': array.nbytes, 'target': target})
+          binaryFile.write(array.tobytes())
+          return len(jsonData['bufferViews']) - 1
 
-      # Processed all items in the folder, now save the folder information
-      self._gltfNodes.append({'name': folderName, 'children': gltfFolderNodeChildren})
+        for segmentId in segmentIds:
+          segment = segmentation.GetSegment(segmentId)
+          meshName = segment.GetName()
+          self._numberOfProcessedModels += 1
+          self.addLog("Model {0}/{1}: {2}".format(self._numberOfProcessedModels, self._numberOfExpectedModels, meshName))
+
+          outputPolyData = self.getDecimatedSurface(self.getSegmentSurface(segmentationNode, segmentId))
+          outputPolyData = self.optimizeOutputMesh(outputPolyData)
+          points, triangles, normals = self.getTriangleMeshArrays(outputPolyData)
+          outputPolyData = None
+          if len(triangles) == 0:
+            self.addLog("  Warning: empty model, not exported.")
+            yield self.getExportProgress(meshName)
+            continue
+
+          points = (points * rasToLps).astype('<f4')
+          normals = (normals * rasToLps).astype('<f4') if normals is not None else None
+          triangles = triangles.astype('<u4')
+
+          attributes = {}
+          jsonData['accessors'].append({'bufferView': addBufferView(points, 34962), 'componentType': 5126, 'count': len(points),
+            'type': "VEC3", 'min': [float(value) for value in points.min(axis=0)], 'max': [float(value) for value in points.max(axis=0)]})
+          attributes['POSITION'] = len(jsonData['accessors']) - 1
+          if normals is not None:
+            jsonData['accessors'].append({'bufferView': addBufferView(normals, 34962), 'componentType': 5126, 'count': len(normals), 'type': "VEC3"})
+            attributes['NORMAL'] = len(jsonData['accessors']) - 1
+          jsonData['accessors'].append({'bufferView': addBufferView(triangles, 34963), 'componentType': 5125, 'count': triangles.size,
+            'type': "SCALAR", 'min': [int(triangles.min())], 'max': [int(triangles.max())]})
+          indicesAccessorIndex = len(jsonData['accessors']) - 1
+
+          colorRGB = list(segment.GetColor())
+          if boostGouraudColor:
+            colorRGB = self.getBoostedGouraudColor(colorRGB)
+          opacity = displayNode.GetSegmentOpacity3D(segmentId) if displayNode else 1.0
+          material = {'pbrMetallicRoughness': {'baseColorFactor': [float(value) for value in colorRGB] + [float(opacity)],
+            'metallicFactor': 0.0, 'roughnessFactor': 0.5}}
+          if opacity < 1.0:
+            material['alphaMode'] = 'BLEND'
+          jsonData['materials'].append(material)
+
+          jsonData['meshes'].append({'name': meshName, 'primitives': [{'attributes': attributes, 'indices': indicesAccessorIndex,
+            'material': len(jsonData['materials']) - 1, 'mode': 4}]})
+          worldPoints = points.astype(np.float64) @ meshToWorld.T
+          jsonData['nodes'].append({'mesh': len(jsonData['meshes']) - 1, 'name': meshName,
+            'extras': dict(self.getMeshStatistics(worldPoints.min(axis=0), worldPoints.max(axis=0), worldPoints[triangles.astype(np.int64)]),
+            segmentId=segmentId)})
+          worldPoints = None
+          yield self.getExportProgress(meshName)
+
+        bufferByteLength = binaryFile.tell()
 
+      rootNodeName = slicer.app.ioManager().forceFileNameValidCharacters(segmentationNode.GetName())
+      jsonData['nodes'].append({'name': rootNodeName, 'children': list(range(len(jsonData['nodes']))), 'matrix': rootNodeMatrix})
+      jsonData['scenes'][0]['nodes'] = [len(jsonData['nodes']) - 1]
+      if sceneViews:
+        self.addGltfSceneViews(jsonData, sceneViews)
+
+      self.addLog(f"Writing file {outputFilePath}...")
+      yield self.getExportProgress(outputFilePath)
+      dataUriPlaceholder = "@BUFFER_DATA@"
+      jsonData['buffers'].append({'byteLength': bufferByteLength, 'uri': "data:application/octet-stream;base64," + dataUriPlaceholder})
+      jsonTextBeforeData, jsonTextAfterData = json.dumps(jsonData, indent=3).split(dataUriPlaceholder)
+      with open(outputFilePath, 'w') as outputFile, open(binaryFilePath, 'rb') as binaryFile:
+        outputFile.write(jsonTextBeforeData)
+        # Encode in chunks (chunk size is a multiple of 3 so that base64 encoded chunks can be concatenated)
+        chunkSize = 3 * 1024 * 1024
+        while True:
+          chunk = binaryFile.read(chunkSize)
+          if not chunk:
+            break
+          outputFile.write(base64.b64encode(chunk).decode('ascii'))
+        outputFile.write(jsonTextAfterData)
     finally:
-      slicer.app.resumeRender()
+      if os.path.exists(binaryFilePath):
+        os.remove(binaryFilePath)
+
+  def addLabelMapToRendererSteps(self, labelMapVolumeNode, boostGouraudColor=False):
+    """Add surfaces of all labels of a label map volume to self._renderer, without creating
+    intermediate segmentation and model nodes. Model nodes are only created if output is the scene.
+    Generator, yields the current progress after each processed label.
+    """
+    if self._exportToFile:
+      if not self._renderer:
+        self._renderer = vtk.vtkRenderer()
+      if not self._renderWindow:
+        self._renderWindow = vtk.vtkRenderWindow()
+        self._renderWindow.AddRenderer(self._renderer)
 
+    self.addLog("Extract surfaces from label map...")
+    labelSurfaces = self.extractLabelSurfaces(labelMapVolumeNode)
+    self._numberOfExpectedModels = len(labelSurfaces)
+    self._modelProcessingStartTime = time.time()
+    yield self.getExportProgress()
+
+    colorNode = labelMapVolumeNode.GetDisplayNode().GetColorNode() if labelMapVolumeNode.GetDisplayNode() else None
+    shNode = slicer.vtkMRMLSubjectHierarchyNode.GetSubjectHierarchyNode(slicer.mrmlScene)
+    gltfFolderNodeChildren = []
+    for labelValue, labelSurface in labelSurfaces.items():
+      meshName = colorNode.GetColorName(labelValue) if colorNode else ""
+      if not meshName or meshName == "(none)":
+        meshName = f"Label {labelValue}"
+      color = [0.5, 0.5, 0.5, 1.0]
+      if colorNode:
+        colorNode.GetColor(labelValue, color)
+      self._numberOfProcessedModels += 1
+      self.addLog("Model {0}/{1}: {2}".format(self._numberOfProcessedModels, self._numberOfExpectedModels, meshName))
+
+      outputPolyData = self.getDecimatedSurface(labelSurface)
+      if outputPolyData.GetNumberOfPoints()==0 or outputPolyData.GetNumberOfCells()==0:
+        self.addLog("  Warning: empty model, not exported.")
+        yield self.getExportProgress(meshName)
+        continue
+
+      if self._exportToFile:
+        # Normal array name is hardcoded into glTF exporter to "NORMAL".
+        outputPolyData.GetPointData().GetNormals().SetName("NORMAL")
+        outputPolyData = self.optimizeOutputMesh(outputPolyData)
+        displayNode = slicer.vtkMRMLModelDisplayNode()  # only used for storing display properties, not added to the scene
+        displayNode.SetColor(color[0:3])
+        producer = vtk.vtkTrivialProducer()
+        producer.SetOutput(outputPolyData)
+        self.addPolyDataToRenderer(producer.GetOutputPort(), displayNode, boostGouraudColor)
+      else:
+        outputModelNode = slicer.modules.models.logic().AddModel(outputPolyData)
+        outputModelNode.SetName(meshName)
+        outputModelNode.GetDisplayNode().SetColor(color[0:3])
+        shNode.SetItemParent(shNode.GetItemByDataNode(outputModelNode), self._outputShFolderItemId)
+
+      gltfMeshIndex = len(self._gltfMeshes)
+      self._gltfMeshes.append({'name': meshName})
+      gltfMeshNodeIndex = len(self._gltfNodes)
+      self._gltfNodes.append({'mesh': gltfMeshIndex, 'name': meshName, 'extras': {'labelValue': labelValue}})
+      gltfFolderNodeChildren.append(gltfMeshNodeIndex)
+      yield self.getExportProgress(meshName)
+
+    folderName = slicer.app.ioManager().forceFileNameValidCharacters(labelMapVolumeNode.GetName())
+    if self._atlasStructureJSON:
+      labelValueByName = {}
+      if colorNode:
+        for labelValue in labelSurfaces:
+          colorName = colorNode.GetColorName(labelValue)
+          if colorName and colorName != "(none)":
+            labelValueByName[AtlasStructure.normalizeStructureName(colorName)] = labelValue
+      self.addAtlasStructureHierarchyToGltf(folderName, gltfFolderNodeChildren, labelValueByName)
+    else:
+      self._gltfNodes.append({'name': folderName, 'children': gltfFolderNodeChildren})
+
+  def addAtlasStructureNodesToGltf(self, structureIds, structureItemsById, meshNodeIndexByStructureId, usedMeshNodeIndices):
+    """Add glTF nodes for groups of the atlas structure JSON, recursively.
+    :return: list of glTF node indices of the items
+    """
+    nodeIndices = []
+    for structureId in structureIds:
+      item = structureItemsById.get(structureId)
+      if item is None:
+        continue
+      if item['@type'] == "Group":
+        childNodeIndices = self.addAtlasStructureNodesToGltf(item['member'], structureItemsById, meshNodeIndexByStructureId, usedMeshNodeIndices)
+        if childNodeIndices:
+          nodeIndices.append(len(self._gltfNodes))
+          self._gltfNodes.append({'name': item['annotation']['name'], 'children': childNodeIndices})
+      elif item['@type'] == "Structure":
+        meshNodeIndex = meshNodeIndexByStructureId.get(structureId)
+        if meshNodeIndex is None:
+          continue
+        if meshNodeIndex in usedMeshNodeIndices:
+          # A glTF node can only have one parent, add another node that refers to the same mesh
+          meshNode = dict(self._gltfNodes[meshNodeIndex])
+          meshNode['extras'] = dict(meshNode.get('extras', {}))
+          self._gltfNodes.append(meshNode)
+          meshNodeIndex = len(self._gltfNodes) - 1
+        self._gltfNodes[meshNodeIndex].setdefault('extras', {})['structureId'] = item['@id']
+        usedMeshNodeIndices.add(meshNodeIndex)
+        nodeIndices.append(meshNodeIndex)
+    return nodeIndices
+
+  def addAtlasStructureHierarchyToGltf(self, rootName, meshNodeIndices, labelValueByName):
+    """Add glTF nodes for the hierarchy defined in the atlas structure JSON (self._atlasStructureJSON),
+    without creating any subject hierarchy items. Meshes that are not in the atlas structure are added
+    directly under the root node, which is the last node.
+    Structures are matched to mesh nodes by label value ('labelValue' in the node extras): an index of
+    structure ID -> mesh node index is computed first, using the label values of structure names.
+    :param labelValueByName: label value of each normalized structure name (see normalizeStructureName),
+      typically from the color table of the label map.
+    """
+    meshNodeIndexByLabelValue = {self._gltfNodes[nodeIndex]['extras']['labelValue']: nodeIndex for nodeIndex in meshNodeIndices}
+    structureItemsById = {}
+    meshNodeIndexByStructureId = {}
+    rootIds = []
+    for item in self._atlasStructureJSON:
+      structureItemsById[item['@id']] = item
+      if item['@id'] == "#__header__":
+        rootIds.extend(item['root'])
+      elif item['@type'] == "Structure":
+        labelValue = labelValueByName.get(AtlasStructure.normalizeStructureName(item['annotation']['name']))
+        if labelValue in meshNodeIndexByLabelValue:
+          meshNodeIndexByStructureId[item['@id']] = meshNodeIndexByLabelValue[labelValue]
+    usedMeshNodeIndices = set()
+    rootChildren = self.addAtlasStructureNodesToGltf(rootIds, structureItemsById, meshNodeIndexByStructureId, usedMeshNodeIndices)
+    rootChildren.extend(nodeIndex for nodeIndex in meshNodeIndices if nodeIndex not in usedMeshNodeIndices)
+    self._gltfNodes.append({'name': rootName, 'children': rootChildren})
 
   def addModelToRenderer(self, inputModelNode, outputModelNode, boostGouraudColor=False):
     '''Update output model in the scene and if valid add to self._renderer.
     :return: True if an actor is added to the renderer.
     '''
-    decimation = slicer.modules.decimation
-    if not self._decimationParameterNode:
-      self._decimationParameterNode = slicer.modules.decimation.logic().CreateNodeInScene()
-      self._decimationParameterNode.SetParameterAsFloat("reductionFactor", self.reductionFactor)
-      self._temporaryExportNodes.append(self._decimationParameterNode)
-
     # Quadric decimation
     #
     # Models with very small number of points are not decimated, as the memory saving is
@@ -479,6 +2060,13 @@ class OpenAnatomyExportLogic(ScriptedLoadableModuleLogic):
       else:
         originalNormals = None
 
+      # The decimation parameter node is only created when a model is actually decimated
+      decimation = slicer.modules.decimation
+      if not self._decimationParameterNode:
+        self._decimationParameterNode = decimation.logic().CreateNodeInScene()
+        self._decimationParameterNode.SetParameterAsFloat("reductionFactor", self.reductionFactor)
+        self._temporaryExportNodes.append(self._decimationParameterNode)
+
       self._decimationParameterNode.SetParameterAsNode("inputModel", inputModelNode)
       self._decimationParameterNode.SetParameterAsNode("outputModel", outputModelNode)
       slicer.cli.runSync(decimation, self._decimationParameterNode)
@@ -506,8 +2094,17 @@ class OpenAnatomyExportLogic(ScriptedLoadableModuleLogic):
     normalArray = outputPolyData.GetPointData().GetNormals()
     if normalArray is not None:  # polylines and vertices do not have normals
       normalArray.SetName("NORMAL")
+    outputPolyData = self.optimizeOutputMesh(outputPolyData)
     outputModelNode.SetAndObservePolyData(outputPolyData)
 
+    self.addPolyDataToRenderer(outputModelNode.GetPolyDataConnection(), outputModelNode.GetDisplayNode(), boostGouraudColor)
+
+    return True
+
+  def addPolyDataToRenderer(self, polyDataConnection, displayNode, boostGouraudColor=False):
+    """Add an actor to self._renderer that displays the polydata (in RAS coordinate system)
+    using the color and material properties of the display node.
+    """
     ras2lps = vtk.vtkMatrix4x4()
     ras2lps.SetElement(0,0,-1)
     ras2lps.SetElement(1,1,-1)
@@ -515,13 +2112,12 @@ class OpenAnatomyExportLogic(ScriptedLoadableModuleLogic):
     ras2lpsTransform.SetMatrix(ras2lps)
     transformer = vtk.vtkTransformPolyDataFilter()
     transformer.SetTransform(ras2lpsTransform)
-    transformer.SetInputConnection(outputModelNode.GetPolyDataConnection())
+    transformer.SetInputConnection(polyDataConnection)
 
     actor = vtk.vtkActor()
     mapper = vtk.vtkPolyDataMapper()
     mapper.SetInputConnection(transformer.GetOutputPort())
     actor.SetMapper(mapper)
-    displayNode = outputModelNode.GetDisplayNode()
 
     colorRGB = displayNode.GetColor()
     if displayNode.GetInterpolation() == slicer.vtkMRMLDisplayNode.PBRInterpolation:
@@ -531,13 +2127,7 @@ class OpenAnatomyExportLogic(ScriptedLoadableModuleLogic):
       actor.GetProperty().SetRoughness(displayNode.GetRoughness())
     else:
       if boostGouraudColor:
-        bf = colorRGB
-        colorHSV = [0, 0, 0]
-        vtk.vtkMath.RGBToHSV(colorRGB, colorHSV)
-        colorHSV[1] = min(colorHSV[1] * self.saturationBoost, 1.0)  # increase saturation
-        colorHSV[2] = min(colorHSV[2] * self.brightnessBoost, 1.0)  # increase brightness
-        colorRGB = [0, 0, 0]
-        vtk.vtkMath.HSVToRGB(colorHSV, colorRGB)
+        colorRGB = self.getBoostedGouraudColor(colorRGB)
       actor.GetProperty().SetColor(colorRGB[0], colorRGB[1], colorRGB[2])
       actor.GetProperty().SetInterpolationToGouraud()
       actor.GetProperty().SetAmbient(displayNode.GetAmbient())
@@ -548,7 +2138,15 @@ class OpenAnatomyExportLogic(ScriptedLoadableModuleLogic):
     actor.GetProperty().SetOpacity(displayNode.GetOpacity())
     self._renderer.AddActor(actor)
 
-    return True
+  def getBoostedGouraudColor(self, colorRGB):
+    """Get color with increased saturation and brightness, to make Gouraud-shaded models look similar in glTF viewers (see saturationBoost)"""
+    colorHSV = [0, 0, 0]
+    vtk.vtkMath.RGBToHSV(colorRGB, colorHSV)
+    colorHSV[1] = min(colorHSV[1] * self.saturationBoost, 1.0)  # increase saturation
+    colorHSV[2] = min(colorHSV[2] * self.brightnessBoost, 1.0)  # increase brightness
+    colorRGB = [0, 0, 0]
+    vtk.vtkMath.HSVToRGB(colorHSV, colorRGB)
+    return colorRGB
 
   def createPlaneModelFromMarkupsPlane(self,planeMarkup):
     planeBounds = planeMarkup.GetPlaneBounds()
@@ -572,6 +2170,315 @@ class OpenAnatomyExportLogic(ScriptedLoadableModuleLogic):
 
     return planeModel
 
+#
+# OpenAnatomyExportWatchFolder
+#
+
+class OpenAnatomyExportWatchFolder:
+  """Service that watches a folder and automatically exports segmentations (.seg.nrrd, .seg.nii.gz, .seg.vtm)
+  and scenes containing models or segmentations (.mrb) that are added or modified in it.
+
+  It can run in a headless Slicer session, for example:
+
+    Slicer --no-splash --no-main-window --python-code "import OpenAnatomyExport; \\
+      OpenAnatomyExport.OpenAnatomyExportWatchFolder('/data/annotations', '/data/export').start()"
+
+  A file is processed when it has not changed for debounceSec. Content hashes are computed by a bounded pool of
+  worker threads and inputs whose content (and export settings) did not change since the last successful export
+  are skipped. VTK and MRML cannot be used from background threads, therefore exports run one at a time on the
+  main thread, using OpenAnatomyExportLogic.exportModelAsync, which keeps the application responsive.
+  Queue depth and export latency are written to a JSON status file in the output folder.
+  """
+
+  inputFileExtensions = [".seg.nrrd", ".seg.nii.gz", ".seg.vtm", ".mrb"]
+
+  def __init__(self, inputFolder, outputFolder, outputFormat="glTF", reductionFactor=None, streaming=True, logic=None):
+    """
+    :param streaming: export segments one at a time (glTF output only), see OpenAnatomyExportLogic.exportModel.
+    """
+    self.inputFolder = os.path.abspath(inputFolder)
+    self.outputFolder = os.path.abspath(outputFolder)
+    self.exportSettings = {
+      'outputFormat': outputFormat,
+      'reductionFactor': reductionFactor,
+      'streaming': streaming and outputFormat == "glTF",
+      }
+    self.logic = logic if logic else OpenAnatomyExportLogic()
+    self.pollIntervalSec = 1.0
+    self.debounceSec = 5.0  # files are exported only if they have not changed for this long
+    self.maximumNumberOfWorkers = 2  # number of threads used for computing content hashes
+    self.maximumNumberOfRecentErrors = 20
+    self.statusFilePath = os.path.join(self.outputFolder, "OpenAnatomyExportStatus.json")
+    # Content hash of the last successfully exported version of each input
+    self.stateFilePath = os.path.join(self.outputFolder, "OpenAnatomyExportState.json")
+
+    self._pollTimer = None
+    self._hashExecutor = None
+    self._fileSignatures = {}  # input path -> (size, modification time) when the file was last seen
+    self._fileChangeDetectionTimes = {}  # input path -> time when a not yet exported change of the file was detected
+    self._fileLastChangeTimes = {}  # input path -> time when the file was last seen changing
+    self._processedSignatures = {}  # input path -> (size, modification time) of the last processed version
+    self._hashFutures = {}  # input path -> (future, signature)
+    self._exportQueue = []  # list of (input path, content hash, signature)
+    self._currentExport = None
+    self._exportedContentHashes = {}
+    self._statistics = {
+      'exportsCompleted': 0,
+      'exportsFailed': 0,
+      'inputsSkippedUnchanged': 0,
+      'lastExportLatencySec': None,
+      'averageExportLatencySec': None,
+      }
+    self._recentErrors = []
+
+  def start(self):
+    if self._pollTimer:
+      return
+    os.makedirs(self.outputFolder, exist_ok=True)
+    if os.path.exists(self.stateFilePath):
+      import json
+      with open(self.stateFilePath) as f:
+        self._exportedContentHashes = json.load(f)
+    from concurrent.futures import ThreadPoolExecutor
+    self._hashExecutor = ThreadPoolExecutor(max_workers=self.maximumNumberOfWorkers)
+    self._pollTimer = qt.QTimer()
+    self._pollTimer.setInterval(int(self.pollIntervalSec * 1000))
+    self._pollTimer.connect('timeout()', self.processWatchFolder)
+    self._pollTimer.start()
+    self.logic.addLog(f"Watching {self.inputFolder} for inputs to export to {self.outputFolder}")
+    self.processWatchFolder()
+
+  def stop(self):
+    """Stop watching the folder. Export in progress is cancelled, queued inputs are exported when the service is started again.
+    """
+    if not self._pollTimer:
+      return
+    self._pollTimer.stop()
+    self._pollTimer = None
+    self._hashExecutor.shutdown(wait=False, cancel_futures=True)
+    self._hashExecutor = None
+    self._hashFutures = {}
+    self.logic.cancelExport()
+    self.writeStatusFile()
+
+  def isRunning(self):
+    return self._pollTimer is not None
+
+  def getInputFilePaths(self):
+    """Get all supported input files in the input folder and its subfolders (except the output folder).
+    """
+    inputFilePaths = []
+    for folder, subfolders, fileNames in os.walk(self.inputFolder):
+      subfolders[:] = [subfolder for subfolder in subfolders if os.path.join(folder, subfolder) != self.outputFolder]
+      for fileName in fileNames:
+        if any(fileName.lower().endswith(extension) for extension in self.inputFileExtensions):
+          inputFilePaths.append(os.path.join(folder, fileName))
+    return inputFilePaths
+
+  def getExportHash(self, contentHash):
+    """Hash of the input content and export settings. Inputs are exported again if any of them changed.
+    """
+    import hashlib
+    import json
+    return hashlib.sha256((contentHash + json.dumps(self.exportSettings, sort_keys=True)).encode()).hexdigest()
+
+  def processWatchFolder(self):
+    """Detect changed files, queue the ones that have not changed for debounceSec, and start the next export.
+    Called by the poll timer.
+    """
+    try:
+      self.detectChangedInputs()
+      self.collectContentHashes()
+      if not self.logic.isExportInProgress() and self._exportQueue:
+        self.startNextExport()
+    except Exception as e:
+      self.addError(f"Failed to process watch folder: {e}")
+    self.writeStatusFile()
+
+  def detectChangedInputs(self):
+    currentTime = time.time()
+    inputFilePaths = self.getInputFilePaths()
+    for inputFilePath in inputFilePaths:
+      try:
+        fileStat = os.stat(inputFilePath)
+      except OSError:
+        # removed since listing
+        continue
+      signature = (fileStat.st_size, fileStat.st_mtime)
+      if self._fileSignatures.get(inputFilePath) != signature:
+        # Changed (or new) file, wait until it is not modified for debounceSec
+        self._fileSignatures[inputFilePath] = signature
+        self._fileChangeDetectionTimes.setdefault(inputFilePath, currentTime)
+        self._fileLastChangeTimes[inputFilePath] = currentTime
+        continue
+      if (signature == self._processedSignatures.get(inputFilePath)
+        or inputFilePath in self._hashFutures
+        or any(queuedInput[0] == inputFilePath for queuedInput in self._exportQueue)
+        or (self._currentExport and self._currentExport['inputFilePath'] == inputFilePath)):
+        continue
+      if currentTime - self._fileLastChangeTimes.get(inputFilePath, 0) < self.debounceSec:
+        continue
+      self._hashFutures[inputFilePath] = (self._hashExecutor.submit(OpenAnatomyExportLogic.getFileContentHash, inputFilePath), signature)
+    # Forget removed files
+    existingFilePaths = set(inputFilePaths)
+    for inputFilePath in list(self._fileSignatures):
+      if inputFilePath not in existingFilePaths:
+        del self._fileSignatures[inputFilePath]
+        self._processedSignatures.pop(inputFilePath, None)
+        self._fileChangeDetectionTimes.pop(inputFilePath, None)
+        self._fileLastChangeTimes.pop(inputFilePath, None)
+
+  def collectContentHashes(self):
+    for inputFilePath, (future, signature) in list(self._hashFutures.items()):
+      if not future.done():
+        continue
+      del self._hashFutures[inputFilePath]
+      try:
+        exportHash = self.getExportHash(future.result())
+      except Exception as e:
+        self.addError(f"Failed to read {inputFilePath}: {e}")
+        continue
+      if self._exportedContentHashes.get(self.getRelativeInputPath(inputFilePath)) == exportHash:
+        self._processedSignatures[inputFilePath] = signature
+        self._fileChangeDetectionTimes.pop(inputFilePath, None)
+        self._statistics['inputsSkippedUnchanged'] += 1
+        self.logic.addLog(f"Skipped {inputFilePath} (not changed since last export)")
+        continue
+      self._exportQueue.append((inputFilePath, exportHash, signature))
+
+  def getRelativeInputPath(self, inputFilePath):
+    return os.path.relpath(inputFilePath, self.inputFolder).replace("\\", "/")
+
+  def getInputName(self, inputFilePath):
+    fileName = os.path.basename(inputFilePath)
+    for extension in self.inputFileExtensions:
+      if fileName.lower().endswith(extension):
+        return fileName[:-len(extension)]
+    return os.path.splitext(fileName)[0]
+
+  def loadInput(self, inputFilePath):
+    """Load input file into the scene.
+    :return: subject hierarchy item to export
+    """
+    shNode = slicer.vtkMRMLSubjectHierarchyNode.GetSubjectHierarchyNode(slicer.mrmlScene)
+    inputName = self.getInputName(inputFilePath)
+    if not inputFilePath.lower().endswith(".mrb"):
+      segmentationNode = slicer.util.loadSegmentation(inputFilePath)
+      segmentationNode.SetName(inputName)
+      return shNode.GetItemByDataNode(segmentationNode)
+
+    # Scene: export all models and segmentations of the scene as a single model folder
+    sceneItemId = shNode.GetSceneItemID()
+    topLevelItemIdsBefore = vtk.vtkIdList()
+    shNode.GetItemChildren(sceneItemId, topLevelItemIdsBefore)
+    existingTopLevelItemIds = set(topLevelItemIdsBefore.GetId(i) for i in range(topLevelItemIdsBefore.GetNumberOfIds()))
+    slicer.util.loadScene(inputFilePath)
+    folderItemId = shNode.CreateFolderItem(sceneItemId, inputName)
+    topLevelItemIds = vtk.vtkIdList()
+    shNode.GetItemChildren(sceneItemId, topLevelItemIds)
+    for i in range(topLevelItemIds.GetNumberOfIds()):
+      itemId = topLevelItemIds.GetId(i)
+      if itemId != folderItemId and itemId not in existingTopLevelItemIds:
+        shNode.SetItemParent(itemId, folderItemId)
+    segmentationNodes = vtk.vtkCollection()
+    shNode.GetDataNodesInBranch(folderItemId, segmentationNodes, "vtkMRMLSegmentationNode")
+    for segmentationNode in segmentationNodes:
+      slicer.modules.segmentations.logic().ExportAllSegmentsToModels(segmentationNode, folderItemId)
+    return folderItemId
+
+  def startNextExport(self):
+    inputFilePath, exportHash, signature = self._exportQueue.pop(0)
+    if not os.path.exists(inputFilePath):
+      return
+    self._currentExport = {
+      'inputFilePath': inputFilePath,
+      'exportHash': exportHash,
+      'signature': signature,
+      'startTime': time.time(),
+      'existingNodeIds': set(node.GetID() for node in slicer.util.getNodesByClass("vtkMRMLNode")),
+      }
+    self.logic.addLog(f"Exporting {inputFilePath}")
+    try:
+      inputItem = self.loadInput(inputFilePath)
+      self._currentExport['inputItem'] = inputItem
+      outputFolder = os.path.join(self.outputFolder, os.path.dirname(self.getRelativeInputPath(inputFilePath)))
+      os.makedirs(outputFolder, exist_ok=True)
+      streaming = self.exportSettings['streaming'] and not inputFilePath.lower().endswith(".mrb")
+      self.logic.exportModelAsync(inputItem, outputFolder, self.exportSettings['reductionFactor'], self.exportSettings['outputFormat'],
+        streaming=streaming, completedCallback=self.onExportCompleted)
+    except Exception as e:
+      if self._currentExport:
+        # failed before the export could be started
+        self.onExportCompleted(False, str(e))
+      else:
+        raise
+
+  def onExportCompleted(self, success, errorMessage):
+    currentExport = self._currentExport
+    self._currentExport = None
+    inputFilePath = currentExport['inputFilePath']
+
+    # Remove loaded input from the scene
+    shNode = slicer.vtkMRMLSubjectHierarchyNode.GetSubjectHierarchyNode(slicer.mrmlScene)
+    if currentExport.get('inputItem') and shNode.GetItemDataNode(currentExport['inputItem']) is None:
+      shNode.RemoveItem(currentExport['inputItem'])
+    for node in slicer.util.getNodesByClass("vtkMRMLNode"):
+      if node.GetID() not in currentExport['existingNodeIds'] and node.GetScene():
+        slicer.mrmlScene.RemoveNode(node)
+
+    self._processedSignatures[inputFilePath] = currentExport['signature']
+    if success:
+      completionTime = time.time()
+      latencySec = completionTime - self._fileChangeDetectionTimes.pop(inputFilePath, currentExport['startTime'])
+      statistics = self._statistics
+      statistics['exportsCompleted'] += 1
+      statistics['lastExportLatencySec'] = latencySec
+      averageLatencySec = statistics['averageExportLatencySec'] or 0.0
+      statistics['averageExportLatencySec'] = averageLatencySec + (latencySec - averageLatencySec) / statistics['exportsCompleted']
+      self._exportedContentHashes[self.getRelativeInputPath(inputFilePath)] = currentExport['exportHash']
+      self.logic.writeJsonFile(self.stateFilePath, self._exportedContentHashes)
+      self.logic.addLog(f"Exported {inputFilePath} in {completionTime - currentExport['startTime']:.1f} s")
+    else:
+      # Not retried until the file is modified again
+      self._fileChangeDetectionTimes.pop(inputFilePath, None)
+      self._statistics['exportsFailed'] += 1
+      self.addError(f"Failed to export {inputFilePath}: {errorMessage}")
+    self.writeStatusFile()
+
+  def addError(self, errorMessage):
+    logging.error(errorMessage)
+    self._recentErrors.append({'time': time.strftime("%Y-%m-%d %H:%M:%S"), 'message': errorMessage})
+    del self._recentErrors[:-self.maximumNumberOfRecentErrors]
+
+  def getStatus(self):
+    """Get status of the service.
+    :return: dictionary with queue depth (inputs that are waiting for hashing or export), queued inputs,
+      currently exported input, export statistics (latency is measured from detecting the file change
+      until completing the export), and recent errors.
+    """
+    currentTime = time.time()
+    queuedInputFilePaths = list(self._hashFutures) + [queuedInput[0] for queuedInput in self._exportQueue]
+    oldestChangeTime = min((self._fileChangeDetectionTimes.get(inputFilePath, currentTime) for inputFilePath in queuedInputFilePaths), default=None)
+    status = {
+      'running': self.isRunning(),
+      'updated': time.strftime("%Y-%m-%d %H:%M:%S"),
+      'inputFolder': self.inputFolder,
+      'outputFolder': self.outputFolder,
+      'queueDepth': len(queuedInputFilePaths),
+      'queuedInputs': [self.getRelativeInputPath(inputFilePath) for inputFilePath in queuedInputFilePaths],
+      'oldestQueuedInputAgeSec': currentTime - oldestChangeTime if oldestChangeTime is not None else None,
+      'currentExport': self.getRelativeInputPath(self._currentExport['inputFilePath']) if self._currentExport else None,
+      'recentErrors': self._recentErrors,
+      }
+    status.update(self._statistics)
+    return status
+
+  def writeStatusFile(self):
+    try:
+      self.logic.writeJsonFile(self.statusFilePath, self.getStatus())
+    except OSError as e:
+      logging.error(f"Failed to write status file {self.statusFilePath}: {e}")
+
 class OpenAnatomyExportTest(ScriptedLoadableModuleTest):
   """
   This is the test case for your scripted module.
@@ -589,6 +2496,34 @@ class OpenAnatomyExportTest(ScriptedLoadableModuleTest):
     """
     self.setUp()
     self.test_OpenAnatomyExport1()
+    self.setUp()
+    self.test_OpenAnatomyExportStartupTime()
+    self.setUp()
+    self.test_OpenAnatomyExportStreaming()
+    self.setUp()
+    self.test_OpenAnatomyExportWatchFolder()
+    self.setUp()
+    self.test_OpenAnatomyExportBatchMeshes()
+    self.setUp()
+    self.test_OpenAnatomyExportTiles()
+    self.setUp()
+    self.test_OpenAnatomyExportUnchangedOutputFiles()
+    self.setUp()
+    self.test_OpenAnatomyExportVertexCacheOptimization()
+    self.setUp()
+    self.test_OpenAnatomyExportCancel()
+    self.setUp()
+    self.test_OpenAnatomyExportNodeExtras()
+    self.setUp()
+    self.test_OpenAnatomyExportSceneViews()
+    self.setUp()
+    self.test_OpenAnatomyExportProfiling()
+    self.setUp()
+    self.test_OpenAnatomyExportAtlasStructureHierarchy()
+    self.setUp()
+    self.test_OpenAnatomyExportLabelMap()
+    self.setUp()
+    self.test_OpenAnatomyExportAbort()
 
   def test_OpenAnatomyExport1(self):
     """ Ideally you should have several levels of tests.  At the lowest level
@@ -618,3 +2553,899 @@ class OpenAnatomyExportTest(ScriptedLoadableModuleTest):
     logic = OpenAnatomyExportLogic()
     self.assertIsNotNone( logic.hasImageData(volumeNode) )
     self.delayDisplay('Test passed!')
+
+  def test_OpenAnatomyExportStartupTime(self):
+    """Test that loading the module (done at every application startup) and opening it the first time are fast.
+    Time budgets can be changed by OPENANATOMYEXPORT_STARTUP_TIME_BUDGET and OPENANATOMYEXPORT_FIRST_OPEN_TIME_BUDGET
+    environment variables (in seconds).
+    """
+    import importlib.util
+
+    self.delayDisplay("Starting the test")
+
+    startupTimeBudgetSec = float(os.environ.get("OPENANATOMYEXPORT_STARTUP_TIME_BUDGET", "0.5"))
+    firstOpenTimeBudgetSec = float(os.environ.get("OPENANATOMYEXPORT_FIRST_OPEN_TIME_BUDGET", "2.0"))
+
+    # Load a fresh copy of the module file, as at application startup
+    moduleSpec = importlib.util.spec_from_file_location("OpenAnatomyExportStartupTest", slicer.modules.openanatomyexport.path)
+    module = importlib.util.module_from_spec(moduleSpec)
+    startTime = time.perf_counter()
+    moduleSpec.loader.exec_module(module)
+    startupTimeSec = time.perf_counter() - startTime
+
+    # Open the module (create its widget)
+    startTime = time.perf_counter()
+    # Without a parent the widget is set up and shown by the constructor
+    widget = module.OpenAnatomyExportWidget()
+    firstOpenTimeSec = time.perf_counter() - startTime
+    # Export resources are only created when an export is started
+    self.assertIsNone(widget.logic._renderer)
+    self.assertIsNone(widget.logic._decimationParameterNode)
+    widget.cleanup()
+    widget.parent.deleteLater()
+
+    logging.info(f"OpenAnatomyExport startup time: {startupTimeSec:.3f} s, first open time: {firstOpenTimeSec:.3f} s")
+    self.assertLess(startupTimeSec, startupTimeBudgetSec)
+    self.assertLess(firstOpenTimeSec, firstOpenTimeBudgetSec)
+    self.delayDisplay('Test passed!')
+
+  def createTestSegmentation(self, name="Spheres"):
+    """Create a segmentation that contains a few spheres as closed surface segments.
+    """
+    segmentationNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSegmentationNode", name)
+    segmentationNode.CreateDefaultDisplayNodes()
+    for segmentIndex, (center, color) in enumerate([((0, 0, 0), (1.0, 0.0, 0.0)), ((30, 0, 0), (0.0, 1.0, 0.0)), ((0, 40, 10), (0.0, 0.0, 1.0))]):
+      sphere = vtk.vtkSphereSource()
+      sphere.SetCenter(center)
+      sphere.SetRadius(10 + segmentIndex)
+      sphere.SetThetaResolution(16)
+      sphere.SetPhiResolution(16)
+      sphere.Update()
+      segmentationNode.AddSegmentFromClosedSurfaceRepresentation(sphere.GetOutput(), f"sphere {segmentIndex}", color)
+    return segmentationNode
+
+  def test_OpenAnatomyExportStreaming(self):
+    """Test exporting segments to glTF one at a time (streaming).
+    """
+    import json
+    import tempfile
+    import numpy as np
+
+    self.delayDisplay("Starting the test")
+
+    segmentationNode = self.createTestSegmentation()
+    segmentation = segmentationNode.GetSegmentation()
+    shNode = slicer.vtkMRMLSubjectHierarchyNode.GetSubjectHierarchyNode(slicer.mrmlScene)
+    logic = OpenAnatomyExportLogic()
+    with tempfile.TemporaryDirectory() as outputFolder:
+      logic.exportModel(shNode.GetItemByDataNode(segmentationNode), outputFolder, reductionFactor=0.5, outputFormat="glTF", streaming=True)
+      # Temporary binary file is removed
+      self.assertEqual(os.listdir(outputFolder), ["Spheres.gltf"])
+      outputFilePath = os.path.join(outputFolder, "Spheres.gltf")
+      with open(outputFilePath) as f:
+        jsonData = json.load(f)
+      buffers = logic.readGltfBuffers(jsonData, outputFilePath)
+
+    numberOfSegments = segmentation.GetNumberOfSegments()
+    self.assertEqual(len(jsonData['nodes']), numberOfSegments + 1)
+    self.assertEqual(len(jsonData['meshes']), numberOfSegments)
+    self.assertEqual(len(jsonData['materials']), numberOfSegments)
+    rootNode = jsonData['nodes'][jsonData['scenes'][0]['nodes'][0]]
+    self.assertEqual(rootNode['children'], list(range(numberOfSegments)))
+
+    for segmentIndex in range(numberOfSegments):
+      segmentId = segmentation.GetNthSegmentID(segmentIndex)
+      segment = segmentation.GetSegment(segmentId)
+      node = jsonData['nodes'][segmentIndex]
+      self.assertEqual(node['name'], segment.GetName())
+      primitive = jsonData['meshes'][node['mesh']]['primitives'][0]
+      material = jsonData['materials'][primitive['material']]
+      np.testing.assert_allclose(material['pbrMetallicRoughness']['baseColorFactor'][:3], logic.getBoostedGouraudColor(segment.GetColor()))
+
+      # Exported triangles are the decimated surface of the segment in LPS coordinate system
+      expectedPoints, expectedTriangles, _ = logic.getTriangleMeshArrays(logic.getDecimatedSurface(logic.getSegmentSurface(segmentationNode, segmentId)))
+      positions = logic.readGltfAccessor(jsonData, buffers, primitive['attributes']['POSITION'])
+      triangles = logic.readGltfAccessor(jsonData, buffers, primitive['indices']).reshape(-1, 3)
+      self.assertEqual(len(positions), len(expectedPoints))
+      np.testing.assert_array_equal(triangles, expectedTriangles)
+      np.testing.assert_allclose(positions, expectedPoints * [-1.0, -1.0, 1.0], rtol=1e-6, atol=1e-4)
+      self.assertEqual(node['extras']['triangleCount'], len(expectedTriangles))
+      self.assertEqual(node['extras']['segmentId'], segmentId)
+
+    self.delayDisplay('Test passed!')
+
+  def test_OpenAnatomyExportWatchFolder(self):
+    """Test automatic export of segmentations that are added to or modified in a watched folder.
+    """
+    import json
+    import tempfile
+
+    self.delayDisplay("Starting the test")
+
+    def processWatchFolderUntil(watchFolder, condition, timeoutSec=60.0):
+      # Polling is done by the test. Content hashing runs in worker threads and exports are driven by a timer,
+      # therefore the folder is processed repeatedly until the expected state is reached.
+      startTime = time.time()
+      while time.time() - startTime < timeoutSec:
+        watchFolder.processWatchFolder()
+        slicer.app.processEvents()
+        if condition(watchFolder.getStatus()):
+          return watchFolder.getStatus()
+        time.sleep(0.01)
+      self.fail(f"Watch folder did not reach the expected state, status: {watchFolder.getStatus()}")
+
+    with tempfile.TemporaryDirectory() as tempDir:
+      inputFolder = os.path.join(tempDir, "input")
+      outputFolder = os.path.join(tempDir, "output")
+      os.makedirs(inputFolder)
+      inputFilePath = os.path.join(inputFolder, "Spheres.seg.vtm")
+      outputFilePath = os.path.join(outputFolder, "Spheres.gltf")
+      segmentationNode = self.createTestSegmentation()
+      slicer.util.saveNode(segmentationNode, inputFilePath)
+      slicer.mrmlScene.RemoveNode(segmentationNode)
+      numberOfNodesBeforeExport = slicer.mrmlScene.GetNumberOfNodes()
+
+      watchFolder = OpenAnatomyExportWatchFolder(inputFolder, outputFolder)
+      watchFolder.debounceSec = 0
+      watchFolder.pollIntervalSec = 3600  # the folder is processed by the test
+      watchFolder.start()
+      try:
+        # New file is exported
+        status = processWatchFolderUntil(watchFolder, lambda status: status['exportsCompleted'] + status['exportsFailed'] > 0)
+        self.assertEqual(status['exportsCompleted'], 1)
+        self.assertEqual(status['exportsFailed'], 0)
+        with open(outputFilePath) as f:
+          self.assertEqual(len(json.load(f)['meshes']), 3)
+        # Loaded input is removed from the scene
+        self.assertEqual(slicer.mrmlScene.GetNumberOfNodes(), numberOfNodesBeforeExport)
+        with open(watchFolder.statusFilePath) as f:
+          status = json.load(f)
+        self.assertEqual(status['exportsCompleted'], 1)
+        self.assertEqual(status['queueDepth'], 0)
+        self.assertEqual(status['queuedInputs'], [])
+        self.assertIsNone(status['currentExport'])
+        self.assertEqual(status['recentErrors'], [])
+        self.assertIsNotNone(status['lastExportLatencySec'])
+        with open(watchFolder.stateFilePath) as f:
+          self.assertEqual(list(json.load(f).keys()), ["Spheres.seg.vtm"])
+
+        # File is touched but its content is not changed: it is not exported again
+        outputModifiedTime = os.path.getmtime(outputFilePath)
+        inputModifiedTime = os.path.getmtime(inputFilePath) + 10
+        os.utime(inputFilePath, (inputModifiedTime, inputModifiedTime))
+        status = processWatchFolderUntil(watchFolder, lambda status: status['inputsSkippedUnchanged'] > 0)
+        self.assertEqual(status['inputsSkippedUnchanged'], 1)
+        self.assertEqual(status['exportsCompleted'], 1)
+        self.assertEqual(os.path.getmtime(outputFilePath), outputModifiedTime)
+        watchFolder.processWatchFolder()
+        self.assertEqual(watchFolder.getStatus()['queueDepth'], 0)
+
+        # Modified file is exported again
+        segmentationNode = slicer.util.loadSegmentation(inputFilePath)
+        segmentation = segmentationNode.GetSegmentation()
+        segmentation.RemoveSegment(segmentation.GetNthSegmentID(0))
+        slicer.util.saveNode(segmentationNode, inputFilePath)
+        slicer.mrmlScene.RemoveNode(segmentationNode)
+        status = processWatchFolderUntil(watchFolder, lambda status: status['exportsCompleted'] + status['exportsFailed'] > 1)
+        self.assertEqual(status['exportsCompleted'], 2)
+        self.assertEqual(status['exportsFailed'], 0)
+        with open(outputFilePath) as f:
+          self.assertEqual(len(json.load(f)['meshes']), 2)
+        with open(watchFolder.statusFilePath) as f:
+          self.assertEqual(json.load(f)['exportsCompleted'], 2)
+      finally:
+        watchFolder.stop()
+
+    self.delayDisplay('Test passed!')
+
+  @staticmethod
+  def createTestGltf(meshes, groups=None):
+    """Create glTF content for testing glTF post-processing (see fixUpGltfFile).
+    :param meshes: list of (name, points, triangles, RGBA color) tuples, points and triangles are numpy arrays
+    :param groups: optional dictionary of group name -> mesh indices. Group nodes and mesh nodes that are not in
+      any group are children of the root node, which is the last node.
+    :return: glTF JSON and buffers
+    """
+    import base64
+    import numpy as np
+    jsonData = {'asset': {'version': "2.0"}, 'scene': 0, 'scenes': [{'nodes': []}], 'nodes': [], 'meshes': [], 'materials': [],
+      'accessors': [], 'bufferViews': []}
+    bufferData = bytearray()
+
+    def addAccessor(array, componentType, accessorType, target):
+      bufferData.extend(b'\0' * (-len(bufferData) % 4))
+      jsonData['bufferViews'].append({'buffer': 0, 'byteOffset': len(bufferData), 'byteLength': array.nbytes, 'target': target})
+      bufferData.extend(array.tobytes())
+      jsonData['accessors'].append({'bufferView': len(jsonData['bufferViews']) - 1, 'componentType': componentType,
+        'count': len(array), 'type': accessorType})
+      return len(jsonData['accessors']) - 1
+
+    for name, points, triangles, color in meshes:
+      normals = np.tile([0.0, 0.0, 1.0], (len(points), 1))
+      attributes = {'POSITION': addAccessor(np.asarray(points, dtype='<f4'), 5126, "VEC3", 34962),
+        'NORMAL': addAccessor(normals.astype('<f4'), 5126, "VEC3", 34962)}
+      indicesAccessorIndex = addAccessor(np.asarray(triangles, dtype='<u2').ravel(), 5123, "SCALAR", 34963)
+      material = {'pbrMetallicRoughness': {'baseColorFactor': list(color), 'metallicFactor': 0.0, 'roughnessFactor': 0.5}}
+      if color[3] < 1.0:
+        material['alphaMode'] = 'BLEND'
+      jsonData['materials'].append(material)
+      jsonData['meshes'].append({'name': name, 'primitives': [{'attributes': attributes, 'indices': indicesAccessorIndex,
+        'material': len(jsonData['materials']) - 1, 'mode': 4}]})
+      jsonData['nodes'].append({'name': name, 'mesh': len(jsonData['meshes']) - 1})
+
+    rootChildren = []
+    groupedMeshIndices = set()
+    for groupName, meshIndices in (groups or {}).items():
+      rootChildren.append(len(jsonData['nodes']))
+      jsonData['nodes'].append({'name': groupName, 'children': list(meshIndices)})
+      groupedMeshIndices.update(meshIndices)
+    rootChildren.extend(meshIndex for meshIndex in range(len(meshes)) if meshIndex not in groupedMeshIndices)
+    jsonData['nodes'].append({'name': "root", 'children': rootChildren})
+    jsonData['scenes'][0]['nodes'] = [len(jsonData['nodes']) - 1]
+    jsonData['buffers'] = [{'byteLength': len(bufferData), 'uri': "data:application/octet-stream;base64," + base64.b64encode(bufferData).decode('ascii')}]
+    return jsonData, [bytes(bufferData)]
+
+  def test_OpenAnatomyExportBatchMeshes(self):
+    """Test merging of opaque glTF meshes that only differ in color into one mesh per material.
+    """
+    import copy
+    import numpy as np
+
+    self.delayDisplay("Starting the test")
+
+    quadTriangles = np.array([[0, 1, 2], [0, 2, 3]])
+    meshes = [
+      ("red", np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]]), quadTriangles, [1.0, 0.0, 0.0, 1.0]),
+      ("green", np.array([[0, 0, 1], [2, 0, 1], [2, 2, 1], [0, 2, 1], [1, 1, 3]]), np.array([[0, 1, 4], [1, 2, 4], [2, 3, 4]]), [0.0, 1.0, 0.0, 1.0]),
+      ("blue", np.array([[5, 5, 5], [6, 5, 5], [6, 6, 5], [5, 6, 5]]), quadTriangles, [0.0, 0.0, 1.0, 0.5]),
+      ("yellow", np.array([[-3, 0, 0], [-2, 0, 0], [-2, 1, 2]]), np.array([[0, 1, 2]]), [1.0, 1.0, 0.0, 1.0]),
+      ]
+    jsonData, buffers = self.createTestGltf(meshes, groups={"left": [0, 1], "right": [2, 3]})
+    originalJsonData = copy.deepcopy(jsonData)
+    originalBuffers = buffers
+
+    logic = OpenAnatomyExportLogic()
+    logic.addGltfBoundsAndStatistics(jsonData, buffers, np.eye(3))
+    structureExtras = {node['name']: node['extras'] for node in jsonData['nodes'] if 'mesh' in node}
+    logic.batchGltfMeshesByMaterial(jsonData, buffers)
+    buffers = logic.readGltfBuffers(jsonData, "")
+
+    # One mesh for the opaque material and one for the semi-transparent mesh
+    self.assertEqual(len(jsonData['meshes']), 2)
+    self.assertEqual(len(jsonData['materials']), 2)
+    self.assertEqual(len(jsonData['buffers']), 1)
+    nodesByName = {node['name']: node for node in jsonData['nodes']}
+    self.assertEqual(sorted(nodesByName), ["Batch 1", "blue", "right", "root"])
+    rootNode = jsonData['nodes'][jsonData['scenes'][0]['nodes'][0]]
+    self.assertEqual([jsonData['nodes'][childIndex]['name'] for childIndex in rootNode['children']], ["right", "Batch 1"])
+    self.assertEqual([jsonData['nodes'][childIndex]['name'] for childIndex in nodesByName["right"]['children']], ["blue"])
+    self.assertIn('EXT_mesh_features', jsonData['extensionsUsed'])
+
+    batchNode = nodesByName["Batch 1"]
+    primitive = jsonData['meshes'][batchNode['mesh']]['primitives'][0]
+    self.assertEqual(jsonData['materials'][primitive['material']]['pbrMetallicRoughness']['baseColorFactor'], [1.0, 1.0, 1.0, 1.0])
+    positions = logic.readGltfAccessor(jsonData, buffers, primitive['attributes']['POSITION'])
+    normals = logic.readGltfAccessor(jsonData, buffers, primitive['attributes']['NORMAL'])
+    colors = logic.readGltfAccessor(jsonData, buffers, primitive['attributes']['COLOR_0'])
+    featureIds = logic.readGltfAccessor(jsonData, buffers, primitive['attributes']['_FEATURE_ID_0']).ravel()
+    indices = logic.readGltfAccessor(jsonData, buffers, primitive['indices']).ravel()
+    numberOfVertices = 4 + 5 + 3
+    self.assertEqual(len(positions), numberOfVertices)
+    self.assertEqual(len(normals), numberOfVertices)
+    self.assertEqual(len(colors), numberOfVertices)
+    self.assertEqual(len(featureIds), numberOfVertices)
+    self.assertEqual(len(indices), (2 + 3 + 1) * 3)
+
+    structures = batchNode['extras']['structures']
+    self.assertEqual([structure['name'] for structure in structures], ["red", "green", "yellow"])
+    self.assertEqual([(structure['firstIndex'], structure['indexCount']) for structure in structures], [(0, 6), (6, 9), (15, 3)])
+    self.assertEqual(batchNode['extras']['triangleCount'], 6)
+    for featureId, structure in enumerate(structures):
+      # Original node statistics are kept
+      self.assertEqual(structure['boundsMin'], structureExtras[structure['name']]['boundsMin'])
+      name, points, triangles, color = meshes[[mesh[0] for mesh in meshes].index(structure['name'])]
+      structureIndices = indices[structure['firstIndex']:structure['firstIndex'] + structure['indexCount']]
+      # Repacked buffer contains the original geometry
+      np.testing.assert_array_equal(positions[structureIndices].reshape(-1, 3, 3), points[triangles])
+      self.assertTrue(np.all(featureIds[structureIndices] == featureId))
+      self.assertTrue(np.all(colors[structureIndices] == [round(component * 255) for component in color[:3]] + [255]))
+
+    # Semi-transparent mesh is not changed
+    bluePrimitive = jsonData['meshes'][nodesByName["blue"]['mesh']]['primitives'][0]
+    originalBluePrimitive = originalJsonData['meshes'][2]['primitives'][0]
+    np.testing.assert_array_equal(logic.readGltfAccessor(jsonData, buffers, bluePrimitive['attributes']['POSITION']),
+      logic.readGltfAccessor(originalJsonData, originalBuffers, originalBluePrimitive['attributes']['POSITION']))
+    self.assertEqual(jsonData['materials'][bluePrimitive['material']], originalJsonData['materials'][2])
+
+    self.delayDisplay('Test passed!')
+
+  def createTestModelFolder(self, name="Models"):
+    """Create a subject hierarchy folder that contains a few sphere models of different colors.
+    :return: subject hierarchy item of the folder
+    """
+    shNode = slicer.vtkMRMLSubjectHierarchyNode.GetSubjectHierarchyNode(slicer.mrmlScene)
+    folderItemId = shNode.CreateFolderItem(shNode.GetSceneItemID(), name)
+    for modelIndex, (center, color) in enumerate([((0, 0, 0), (1.0, 0.0, 0.0)), ((30, 0, 0), (0.0, 1.0, 0.0)), ((0, 40, 10), (0.0, 0.0, 1.0))]):
+      sphere = vtk.vtkSphereSource()
+      sphere.SetCenter(center)
+      sphere.SetRadius(10 + modelIndex)
+      sphere.SetThetaResolution(32)
+      sphere.SetPhiResolution(32)
+      sphere.Update()
+      modelNode = slicer.modules.models.logic().AddModel(sphere.GetOutput())
+      modelNode.SetName(f"sphere {modelIndex}")
+      modelNode.GetDisplayNode().SetColor(color)
+      shNode.SetItemParent(shNode.GetItemByDataNode(modelNode), folderItemId)
+    return folderItemId
+
+  def test_OpenAnatomyExportTiles(self):
+    """Test export of models as a 3D Tiles tile set.
+    """
+    import json
+    import tempfile
+    import numpy as np
+
+    self.delayDisplay("Starting the test")
+
+    folderItemId = self.createTestModelFolder()
+    logic = OpenAnatomyExportLogic()
+    logic.maximumTrianglesPerTile = 500
+    with tempfile.TemporaryDirectory() as outputFolder:
+      logic.exportModel(folderItemId, outputFolder, reductionFactor=0.5, outputFormat="3D Tiles")
+      tilesetFolder = os.path.join(outputFolder, "Models")
+      with open(os.path.join(tilesetFolder, "tileset.json")) as f:
+        tileset = json.load(f)
+
+      self.assertEqual(tileset['asset']['version'], "1.1")
+      rootTile = tileset['root']
+      self.assertGreaterEqual(tileset['geometricError'], rootTile['geometricError'])
+      self.assertEqual(rootTile['refine'], "REPLACE")
+      self.assertTrue(rootTile['children'], "Tiles are not subdivided")
+
+      def getBoxMinMax(tile):
+        box = np.array(tile['boundingVolume']['box'])
+        self.assertEqual(len(box), 12)
+        halfSize = np.abs(box[3:].reshape(3, 3)).sum(axis=0)
+        return box[:3] - halfSize, box[:3] + halfSize
+
+      leafTiles = []
+
+      def checkTile(tile, depth):
+        self.assertLessEqual(depth, logic.maximumTileDepth)
+        if 'content' in tile:
+          contentFilePath = os.path.join(tilesetFolder, tile['content']['uri'])
+          self.assertTrue(os.path.exists(contentFilePath), f"Tile content is missing: {tile['content']['uri']}")
+          with open(contentFilePath) as f:
+            self.assertTrue(json.load(f)['meshes'])
+        if not tile.get('children'):
+          self.assertIn('content', tile)
+          self.assertEqual(tile['geometricError'], 0.0)
+          leafTiles.append(tile)
+          return
+        self.assertEqual(tile['refine'], "REPLACE")
+        tileMin, tileMax = getBoxMinMax(tile)
+        for child in tile['children']:
+          # Geometric error decreases towards the leaves and children are inside their parent
+          self.assertLessEqual(child['geometricError'], tile['geometricError'])
+          childMin, childMax = getBoxMinMax(child)
+          tolerance = 1e-6 * max(np.linalg.norm(tileMax - tileMin), 1e-9)
+          self.assertTrue(np.all(childMin >= tileMin - tolerance) and np.all(childMax <= tileMax + tolerance),
+            f"Child tile box {childMin}-{childMax} is not inside parent tile box {tileMin}-{tileMax}")
+          checkTile(child, depth + 1)
+
+      checkTile(rootTile, 0)
+      self.assertGreater(len(leafTiles), 1)
+
+    self.delayDisplay('Test passed!')
+
+  def test_OpenAnatomyExportUnchangedOutputFiles(self):
+    """Test that unchanged output files are not written again and files that are not produced anymore are removed.
+    """
+    import json
+    import tempfile
+    import numpy as np
+
+    self.delayDisplay("Starting the test")
+
+    logic = OpenAnatomyExportLogic()
+    logic.skipUnchangedOutputFiles = True
+    with tempfile.TemporaryDirectory() as outputFolder:
+      manifestFilePath = os.path.join(outputFolder, logic.outputManifestFileName)
+      outputFilePath = os.path.join(outputFolder, "Models.gltf")
+
+      # Exporting the same input again does not modify output files or the manifest
+      folderItemId = self.createTestModelFolder()
+      logic.exportModel(folderItemId, outputFolder, reductionFactor=0.5, outputFormat="glTF")
+      with open(manifestFilePath) as f:
+        manifestContent = f.read()
+      self.assertEqual(list(json.loads(manifestContent)['files']), ["Models.gltf"])
+      outputModifiedTime = os.stat(outputFilePath).st_mtime_ns
+      manifestModifiedTime = os.stat(manifestFilePath).st_mtime_ns
+      time.sleep(0.1)
+      logic.exportModel(folderItemId, outputFolder, reductionFactor=0.5, outputFormat="glTF")
+      self.assertEqual(os.stat(outputFilePath).st_mtime_ns, outputModifiedTime)
+      self.assertEqual(os.stat(manifestFilePath).st_mtime_ns, manifestModifiedTime)
+      with open(manifestFilePath) as f:
+        self.assertEqual(f.read(), manifestContent)
+      # Staging folder is removed
+      self.assertEqual(sorted(os.listdir(outputFolder)), sorted([logic.outputManifestFileName, "Models.gltf"]))
+
+      def publishFiles(exportName, fileContents, exportKind="model/3D Tiles"):
+        stagingFolder = logic.createOutputStagingFolder(outputFolder)
+        for relativePath, content in fileContents.items():
+          os.makedirs(os.path.dirname(os.path.join(stagingFolder, relativePath)), exist_ok=True)
+          with open(os.path.join(stagingFolder, relativePath), "w") as f:
+            f.write(content)
+        try:
+          return logic.publishOutputFiles(stagingFolder, outputFolder, exportName, exportKind)
+        finally:
+          import shutil
+          shutil.rmtree(stagingFolder)
+
+      # Files that an export does not produce anymore are removed, files of other exports are kept
+      self.assertEqual(sorted(publishFiles("Tiles", {"Tiles/tileset.json": "1", "Tiles/tiles/tile_0.gltf": "a", "Tiles/tiles/tile_1.gltf": "b"})),
+        ["Tiles/tiles/tile_0.gltf", "Tiles/tiles/tile_1.gltf", "Tiles/tileset.json"])
+      self.assertEqual(sorted(publishFiles("Tiles", {"Tiles/tileset.json": "2", "Tiles/tiles/tile_0.gltf": "a"})),
+        ["Tiles/tiles/tile_1.gltf", "Tiles/tileset.json"])
+      self.assertFalse(os.path.exists(os.path.join(outputFolder, "Tiles/tiles/tile_1.gltf")))
+      self.assertEqual(sorted(publishFiles("Tiles", {"Tiles/tileset.json": "3"})), ["Tiles/tiles/tile_0.gltf", "Tiles/tileset.json"])
+      # Empty folders are removed
+      self.assertFalse(os.path.exists(os.path.join(outputFolder, "Tiles/tiles")))
+      with open(manifestFilePath) as f:
+        manifest = json.load(f)
+      self.assertEqual(sorted(manifest['files']), ["Models.gltf", "Tiles/tileset.json"])
+      self.assertEqual(manifest['files']["Models.gltf"]['export'], "Models")
+      self.assertEqual(manifest['files']["Models.gltf"]['exportKind'], "model/glTF")
+      self.assertTrue(os.path.exists(outputFilePath))
+
+      # Exports of the same name to another format or of another kind keep each other's files
+      logic.exportModel(folderItemId, outputFolder, reductionFactor=0.5, outputFormat="OBJ")
+      self.assertTrue(os.path.exists(os.path.join(outputFolder, "Models.obj")))
+      self.assertEqual(os.stat(outputFilePath).st_mtime_ns, outputModifiedTime)
+      volumeNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode", "Models")
+      slicer.util.updateVolumeFromArray(volumeNode, np.zeros([4, 5, 6], dtype=np.uint8))
+      logic.exportImage(volumeNode, "vti", outputFolder)
+      logic.exportModel(folderItemId, outputFolder, reductionFactor=0.5, outputFormat="glTF")
+      self.assertTrue(os.path.exists(os.path.join(outputFolder, "Models.obj")))
+      self.assertTrue(os.path.exists(os.path.join(outputFolder, "Models.vti")))
+      logic.exportImage(volumeNode, "vti", outputFolder)
+      self.assertTrue(os.path.exists(outputFilePath))
+      self.assertEqual(publishFiles("Atlas", {"Atlas.vti": "image"}, "image/vti"), ["Atlas.vti"])
+      self.assertEqual(publishFiles("Atlas", {"Atlas.gltf": "model"}, "model/glTF"), ["Atlas.gltf"])
+      self.assertTrue(os.path.exists(os.path.join(outputFolder, "Atlas.vti")))
+      # Files are still removed if the same export does not produce them anymore
+      self.assertEqual(publishFiles("Atlas", {"Atlas.vti": "image"}, "image/vti"), [])
+      self.assertEqual(publishFiles("Atlas", {}, "image/vti"), ["Atlas.vti"])
+      with open(manifestFilePath) as f:
+        manifest = json.load(f)
+      self.assertEqual(manifest['files']["Models.obj"]['exportKind'], "model/OBJ")
+      self.assertEqual(manifest['files']["Models.vti"]['exportKind'], "image/vti")
+      self.assertFalse(os.path.exists(os.path.join(outputFolder, "Atlas.vti")))
+
+    self.delayDisplay('Test passed!')
+
+  def test_OpenAnatomyExportVertexCacheOptimization(self):
+    """Test triangle reordering for vertex cache efficiency.
+    """
+    import numpy as np
+
+    self.delayDisplay("Starting the test")
+
+    # Grid mesh with triangles in random order
+    gridSize = 30
+    vertexIds = np.arange(gridSize * gridSize).reshape(gridSize, gridSize)
+    quadCorners = [vertexIds[:-1, :-1].ravel(), vertexIds[:-1, 1:].ravel(), vertexIds[1:, 1:].ravel(), vertexIds[1:, :-1].ravel()]
+    triangles = np.concatenate([np.stack([quadCorners[0], quadCorners[1], quadCorners[2]], axis=1),
+      np.stack([quadCorners[0], quadCorners[2], quadCorners[3]], axis=1)])
+    triangles = triangles[np.random.default_rng(0).permutation(len(triangles))]
+
+    logic = OpenAnatomyExportLogic()
+    for cacheSize in [8, 16, 32]:
+      triangleOrder, clusterStarts = logic.getVertexCacheOptimizedTriangleOrder(triangles, gridSize * gridSize, cacheSize)
+      # All triangles are kept, each of them once
+      np.testing.assert_array_equal(np.sort(triangleOrder), np.arange(len(triangles)))
+      self.assertEqual(clusterStarts[0], 0)
+      self.assertEqual(clusterStarts, sorted(set(clusterStarts)))
+      cacheMissRatioBefore = logic.computeVertexCacheMissRatio(triangles, cacheSize)
+      cacheMissRatioAfter = logic.computeVertexCacheMissRatio(triangles[triangleOrder], cacheSize)
+      self.assertLessEqual(cacheMissRatioAfter, cacheMissRatioBefore)
+      # Each vertex is shared by up to 6 triangles, the optimum is about 0.5 miss per triangle
+      self.assertLess(cacheMissRatioAfter, 1.0)
+
+    # Triangles in grid order are not made worse
+    orderedTriangles = triangles[np.argsort(triangles.min(axis=1), kind="stable")]
+    triangleOrder, clusterStarts = logic.getVertexCacheOptimizedTriangleOrder(orderedTriangles, gridSize * gridSize)
+    self.assertLessEqual(logic.computeVertexCacheMissRatio(orderedTriangles[triangleOrder]), logic.computeVertexCacheMissRatio(orderedTriangles))
+
+    self.delayDisplay('Test passed!')
+
+  def test_OpenAnatomyExportCancel(self):
+    """Test cancelling an asynchronous export.
+    """
+    import tempfile
+
+    self.delayDisplay("Starting the test")
+
+    segmentationNode = self.createTestSegmentation()
+    shNode = slicer.vtkMRMLSubjectHierarchyNode.GetSubjectHierarchyNode(slicer.mrmlScene)
+    numberOfNodesBeforeExport = slicer.mrmlScene.GetNumberOfNodes()
+    numberOfItemsBeforeExport = shNode.GetNumberOfItems()
+
+    logic = OpenAnatomyExportLogic()
+    progressUpdates = []
+    completedCalls = []
+
+    def onProgress(progress):
+      progressUpdates.append(progress)
+      # Cancel when the first step is completed (segments are exported to models)
+      logic.cancelExport()
+
+    with tempfile.TemporaryDirectory() as outputFolder:
+      logic.exportModelAsync(shNode.GetItemByDataNode(segmentationNode), outputFolder, outputFormat="glTF",
+        progressCallback=onProgress, completedCallback=lambda success, errorMessage: completedCalls.append((success, errorMessage)))
+      self.assertTrue(logic.isExportInProgress())
+      startTime = time.time()
+      while logic.isExportInProgress() and time.time() - startTime < 60.0:
+        slicer.app.processEvents()
+      self.assertFalse(logic.isExportInProgress())
+      self.assertEqual(len(progressUpdates), 1)
+      self.assertEqual(completedCalls, [(False, "Export cancelled.")])
+      self.assertEqual(os.listdir(outputFolder), [])
+
+    # Models, temporary nodes and subject hierarchy folders that were created by the export are removed
+    self.assertEqual(slicer.mrmlScene.GetNumberOfNodes(), numberOfNodesBeforeExport)
+    self.assertEqual(shNode.GetNumberOfItems(), numberOfItemsBeforeExport)
+
+    self.delayDisplay('Test passed!')
+
+  def test_OpenAnatomyExportNodeExtras(self):
+    """Test bounds, statistics, and source identifiers that are stored in extras of glTF mesh nodes.
+    """
+    import json
+    import tempfile
+    import numpy as np
+
+    self.delayDisplay("Starting the test")
+
+    meshes = [
+      ("quad", np.array([[0, 0, 0], [2, 0, 0], [2, 1, 0], [0, 1, 0]]), np.array([[0, 1, 2], [0, 2, 3]]), [1.0, 0.0, 0.0, 1.0]),
+      # a large and a small triangle: the centroid is area-weighted
+      ("triangles", np.array([[0, 0, 1], [4, 0, 1], [0, 4, 1], [10, 0, 1], [11, 0, 1], [10, 1, 1]]), np.array([[0, 1, 2], [3, 4, 5]]),
+        [0.0, 1.0, 0.0, 1.0]),
+      ]
+    jsonData, buffers = self.createTestGltf(meshes)
+    jsonData['nodes'][1]['extras'] = {'labelValue': 7}
+    # Swap x and y axes and scale z by 2
+    meshToWorld = np.array([[0.0, 1.0, 0.0], [1.0, 0.0, 0.0], [0.0, 0.0, 2.0]])
+    logic = OpenAnatomyExportLogic()
+    logic.addGltfBoundsAndStatistics(jsonData, buffers, meshToWorld)
+
+    quadExtras = jsonData['nodes'][0]['extras']
+    self.assertEqual(quadExtras['triangleCount'], 2)
+    np.testing.assert_allclose(quadExtras['boundsMin'], [0.0, 0.0, 0.0])
+    np.testing.assert_allclose(quadExtras['boundsMax'], [1.0, 2.0, 0.0])
+    np.testing.assert_allclose(quadExtras['centroid'], [0.5, 1.0, 0.0])
+    trianglesExtras = jsonData['nodes'][1]['extras']
+    self.assertEqual(trianglesExtras['labelValue'], 7)
+    self.assertEqual(trianglesExtras['triangleCount'], 2)
+    np.testing.assert_allclose(trianglesExtras['boundsMin'], [0.0, 0.0, 2.0])
+    np.testing.assert_allclose(trianglesExtras['boundsMax'], [4.0, 11.0, 2.0])
+    np.testing.assert_allclose(trianglesExtras['centroid'], [65.0 / 51.0, 95.0 / 51.0, 2.0])
+    self.assertNotIn('extras', jsonData['nodes'][2])
+    # Accessor min/max are in mesh coordinates
+    quadPrimitive = jsonData['meshes'][0]['primitives'][0]
+    self.assertEqual(jsonData['accessors'][quadPrimitive['attributes']['POSITION']]['min'], [0.0, 0.0, 0.0])
+    self.assertEqual(jsonData['accessors'][quadPrimitive['attributes']['POSITION']]['max'], [2.0, 1.0, 0.0])
+    self.assertEqual(jsonData['accessors'][quadPrimitive['indices']]['min'], [0])
+    self.assertEqual(jsonData['accessors'][quadPrimitive['indices']]['max'], [3])
+
+    # Exported model nodes are identified by node ID, models created from segments by segment ID
+    folderItemId = self.createTestModelFolder()
+    segmentationNode = self.createTestSegmentation()
+    shNode = slicer.vtkMRMLSubjectHierarchyNode.GetSubjectHierarchyNode(slicer.mrmlScene)
+    with tempfile.TemporaryDirectory() as outputFolder:
+      logic.exportModel(folderItemId, outputFolder, outputFormat="glTF")
+      with open(os.path.join(outputFolder, "Models.gltf")) as f:
+        meshNodes = [node for node in json.load(f)['nodes'] if 'mesh' in node]
+      self.assertEqual(len(meshNodes), 3)
+      for node in meshNodes:
+        self.assertEqual(slicer.mrmlScene.GetNodeByID(node['extras']['nodeId']).GetName(), node['name'])
+        self.assertIn('boundsMin', node['extras'])
+      logic.exportModel(shNode.GetItemByDataNode(segmentationNode), outputFolder, outputFormat="glTF")
+      with open(os.path.join(outputFolder, "Spheres.gltf")) as f:
+        meshNodes = [node for node in json.load(f)['nodes'] if 'mesh' in node]
+      self.assertEqual(len(meshNodes), 3)
+      for node in meshNodes:
+        self.assertEqual(segmentationNode.GetSegmentation().GetSegment(node['extras']['segmentId']).GetName(), node['name'])
+
+    self.delayDisplay('Test passed!')
+
+  def test_OpenAnatomyExportSceneViews(self):
+    """Test adding scene views to glTF output as additional scenes.
+    """
+    import copy
+    import numpy as np
+
+    self.delayDisplay("Starting the test")
+
+    triangle = (np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0]]), np.array([[0, 1, 2]]))
+    meshes = [("a", *triangle, [1.0, 0.0, 0.0, 1.0]), ("b", *triangle, [0.0, 1.0, 0.0, 1.0]), ("c", *triangle, [0.0, 0.0, 1.0, 1.0])]
+    jsonData, buffers = self.createTestGltf(meshes, groups={"left": [0, 1], "right": [2]})
+    originalJsonData = copy.deepcopy(jsonData)
+    sceneViews = [
+      {'name': "Right", 'visibility': {"left": False}},
+      {'name': "Transparent", 'opacity': {"right": 0.3, "a": 0.5}},
+      {'name': "Empty", 'visibility': {"root": False}},
+      {'name': "Unknown", 'visibility': {"d": False}},
+      ]
+    logic = OpenAnatomyExportLogic()
+    logMessages = []
+    logic.logCallback = logMessages.append
+    logic.addGltfSceneViews(jsonData, sceneViews)
+
+    def getVisibleMeshNodes(sceneIndex):
+      """Get (name, mesh index) of mesh nodes of a scene"""
+      meshNodes = []
+      nodeIndices = list(jsonData['scenes'][sceneIndex]['nodes'])
+      while nodeIndices:
+        node = jsonData['nodes'][nodeIndices.pop(0)]
+        if 'mesh' in node:
+          meshNodes.append((node['name'], node['mesh']))
+        nodeIndices.extend(node.get('children', []))
+      return meshNodes
+
+    def getOpacity(meshIndex):
+      return jsonData['materials'][jsonData['meshes'][meshIndex]['primitives'][0]['material']]['pbrMetallicRoughness']['baseColorFactor'][3]
+
+    self.assertEqual([scene.get('name') for scene in jsonData['scenes']], [None, "Right", "Transparent", "Empty", "Unknown"])
+    # Default scene is not changed
+    self.assertEqual(jsonData['scenes'][0], originalJsonData['scenes'][0])
+    self.assertEqual(jsonData['nodes'][:len(originalJsonData['nodes'])], originalJsonData['nodes'])
+    self.assertEqual(getVisibleMeshNodes(0), [("a", 0), ("b", 1), ("c", 2)])
+    self.assertEqual(getVisibleMeshNodes(1), [("c", 2)])
+    # Meshes and materials are only copied where opacity changes, accessors are shared
+    transparentMeshNodes = getVisibleMeshNodes(2)
+    self.assertEqual([name for name, meshIndex in transparentMeshNodes], ["a", "b", "c"])
+    self.assertEqual(transparentMeshNodes[1], ("b", 1))
+    self.assertEqual(len(jsonData['meshes']), 5)
+    self.assertEqual(len(jsonData['accessors']), len(originalJsonData['accessors']))
+    for (name, meshIndex), expectedOpacity in zip(transparentMeshNodes, [0.5, 1.0, 0.3]):
+      self.assertEqual(getOpacity(meshIndex), expectedOpacity)
+      self.assertEqual(jsonData['meshes'][meshIndex]['primitives'][0]['attributes'], jsonData['meshes']["abc".index(name)]['primitives'][0]['attributes'])
+      if expectedOpacity < 1.0:
+        self.assertEqual(jsonData['materials'][jsonData['meshes'][meshIndex]['primitives'][0]['material']]['alphaMode'], 'BLEND')
+    self.assertEqual([getOpacity(meshIndex) for meshIndex in range(3)], [1.0, 1.0, 1.0])
+    self.assertEqual(jsonData['scenes'][3]['nodes'], [])
+    self.assertEqual(getVisibleMeshNodes(4), [("a", 0), ("b", 1), ("c", 2)])
+    self.assertTrue(any("d" in message and "Unknown" in message for message in logMessages))
+
+    # Scene views are only supported for glTF output
+    for outputFormat in ["OBJ", "3D Tiles"]:
+      with self.assertRaises(ValueError):
+        logic.exportModel(None, "output", outputFormat=outputFormat, sceneViews=sceneViews)
+
+    self.delayDisplay('Test passed!')
+
+  def test_OpenAnatomyExportProfiling(self):
+    """Test that profiling results of exportModel are written into the profiling output folder.
+    """
+    import glob
+    import tempfile
+
+    self.delayDisplay("Starting the test")
+
+    segmentationNode = self.createTestSegmentation()
+    shNode = slicer.vtkMRMLSubjectHierarchyNode.GetSubjectHierarchyNode(slicer.mrmlScene)
+    logic = OpenAnatomyExportLogic()
+    with tempfile.TemporaryDirectory() as tempDir:
+      logic.profilingOutputFolder = os.path.join(tempDir, "profiling")
+      logic.exportModel(shNode.GetItemByDataNode(segmentationNode), tempDir, outputFormat="glTF")
+      self.assertTrue(os.path.exists(os.path.join(tempDir, "Spheres.gltf")))
+      self.assertEqual(len(glob.glob(os.path.join(tempDir, "profiling", "exportModel-3segments-*.prof"))), 1)
+      memoryFilePaths = glob.glob(os.path.join(tempDir, "profiling", "exportModel-3segments-*-memory.txt"))
+      self.assertEqual(len(memoryFilePaths), 1)
+      with open(memoryFilePaths[0]) as f:
+        self.assertIn("Operation: exportModel", f.read())
+
+    self.delayDisplay('Test passed!')
+
+  def test_OpenAnatomyExportAtlasStructureHierarchy(self):
+    """Test creating glTF node hierarchy from an atlas structure JSON.
+    """
+    import json
+    import tempfile
+
+    self.delayDisplay("Starting the test")
+
+    atlasStructure = [
+      {"@id": "#__header__", "@type": "Header", "root": ["#brain"]},
+      {"@id": "#brain", "@type": "Group", "annotation": {"name": "Brain"}, "member": ["#cerebellum", "#ventricles", "#leftHemisphere"]},
+      {"@id": "#cerebellum", "@type": "Group", "annotation": {"name": "Cerebellum"}, "member": ["#leftCerebellarCortex", "#rightCerebellarCortex"]},
+      {"@id": "#ventricles", "@type": "Group", "annotation": {"name": "Ventricles"}, "member": ["#leftLateralVentricle", "#fourthVentricle"]},
+      # structures that are in two groups
+      {"@id": "#leftHemisphere", "@type": "Group", "annotation": {"name": "Left hemisphere"}, "member": ["#leftCerebellarCortex", "#leftLateralVentricle"]},
+      {"@id": "#leftCerebellarCortex", "@type": "Structure", "annotation": {"name": "left-cerebellar-cortex"}},
+      {"@id": "#rightCerebellarCortex", "@type": "Structure", "annotation": {"name": "right-cerebellar-cortex"}},
+      {"@id": "#leftLateralVentricle", "@type": "Structure", "annotation": {"name": "left-lateral-ventricle"}},
+      # structure that is not in the label map
+      {"@id": "#fourthVentricle", "@type": "Structure", "annotation": {"name": "fourth-ventricle"}},
+      ]
+    logic = OpenAnatomyExportLogic()
+    logic._atlasStructureJSON = atlasStructure
+    # Structures are matched by label value, mesh node names do not matter
+    logic._gltfNodes = [{'mesh': meshIndex, 'name': f"Mesh {meshIndex}", 'extras': {'labelValue': labelValue}}
+      for meshIndex, labelValue in enumerate([20, 5, 12, 30])]
+    labelValueByName = {"left cerebellar cortex": 20, "right cerebellar cortex": 5, "left lateral ventricle": 12, "optic nerve": 30}
+    logic.addAtlasStructureHierarchyToGltf("Atlas", [0, 1, 2, 3], labelValueByName)
+
+    nodes = logic._gltfNodes
+    nodeIndexByName = {node['name']: nodeIndex for nodeIndex, node in enumerate(nodes) if 'mesh' not in node}
+    self.assertEqual(len(nodes), 11)
+    self.assertEqual(nodeIndexByName['Atlas'], len(nodes) - 1)
+    # Mesh that is not in the atlas structure is added under the root
+    self.assertEqual(nodes[nodeIndexByName['Atlas']]['children'], [nodeIndexByName['Brain'], 3])
+    self.assertNotIn('structureId', nodes[3]['extras'])
+    self.assertEqual(nodes[nodeIndexByName['Brain']]['children'],
+      [nodeIndexByName['Cerebellum'], nodeIndexByName['Ventricles'], nodeIndexByName['Left hemisphere']])
+    self.assertEqual(nodes[nodeIndexByName['Cerebellum']]['children'], [0, 1])
+    self.assertEqual(nodes[nodeIndexByName['Ventricles']]['children'], [2])
+    self.assertEqual([nodes[nodeIndex]['extras'] for nodeIndex in [0, 1, 2]], [
+      {'labelValue': 20, 'structureId': "#leftCerebellarCortex"},
+      {'labelValue': 5, 'structureId': "#rightCerebellarCortex"},
+      {'labelValue': 12, 'structureId': "#leftLateralVentricle"}])
+    # A node can only have one parent, structures in a second group are added as new nodes that refer to the same mesh
+    leftHemisphereChildren = nodes[nodeIndexByName['Left hemisphere']]['children']
+    self.assertEqual(len(leftHemisphereChildren), 2)
+    self.assertTrue(all(nodeIndex > 3 for nodeIndex in leftHemisphereChildren))
+    self.assertEqual([nodes[nodeIndex]['mesh'] for nodeIndex in leftHemisphereChildren], [0, 2])
+    self.assertEqual([nodes[nodeIndex]['extras'] for nodeIndex in leftHemisphereChildren], [nodes[0]['extras'], nodes[2]['extras']])
+    self.assertIsNot(nodes[leftHemisphereChildren[0]]['extras'], nodes[0]['extras'])
+    allChildren = [child for node in nodes for child in node.get('children', [])]
+    self.assertEqual(len(allChildren), len(set(allChildren)))
+
+    # Atlas structure file is rejected for inputs other than label map volumes
+    segmentationNode = self.createTestSegmentation()
+    shNode = slicer.vtkMRMLSubjectHierarchyNode.GetSubjectHierarchyNode(slicer.mrmlScene)
+    with tempfile.TemporaryDirectory() as outputFolder:
+      atlasStructurePath = os.path.join(outputFolder, "atlas-structure.json")
+      with open(atlasStructurePath, "w") as f:
+        json.dump(atlasStructure, f)
+      with self.assertRaises(ValueError):
+        logic.exportModel(shNode.GetItemByDataNode(segmentationNode), outputFolder, outputFormat="glTF", atlasStructureFilePath=atlasStructurePath)
+
+    self.delayDisplay('Test passed!')
+
+  def test_OpenAnatomyExportLabelMap(self):
+    """Test exporting surfaces of all labels of a label map volume directly to glTF,
+    and streaming export of a segmentation that only has binary labelmap representation,
+    with normal and mirrored IJK to RAS matrix.
+    """
+    import json
+    import tempfile
+    import numpy as np
+
+    self.delayDisplay("Starting the test")
+
+    def assertClosedOutwardSurface(jsonData, buffers, primitive):
+      points = logic.readGltfAccessor(jsonData, buffers, primitive['attributes']['POSITION']).astype(np.float64)
+      normals = logic.readGltfAccessor(jsonData, buffers, primitive['attributes']['NORMAL']).astype(np.float64)
+      triangles = logic.readGltfAccessor(jsonData, buffers, primitive['indices']).reshape(-1, 3).astype(np.int64)
+      # Surface is closed (also where the label touches the image boundary): each edge is shared by two triangles,
+      # which traverse it in opposite directions
+      _, uniquePointIndices = np.unique(np.round(points, 4), axis=0, return_inverse=True)
+      uniqueTriangles = uniquePointIndices.reshape(-1)[triangles]
+      edges = np.concatenate([uniqueTriangles[:, [0, 1]], uniqueTriangles[:, [1, 2]], uniqueTriangles[:, [2, 0]]])
+      directedEdges = set(map(tuple, edges))
+      self.assertEqual(len(directedEdges), len(edges))
+      self.assertTrue(all((edge[1], edge[0]) in directedEdges for edge in directedEdges))
+      # Triangles and normals face outward: positive enclosed volume and normals pointing away from the center
+      v0, v1, v2 = points[triangles[:, 0]], points[triangles[:, 1]], points[triangles[:, 2]]
+      self.assertGreater(np.sum(np.einsum('ij,ij->i', v0, np.cross(v1, v2))) / 6.0, 0.0)
+      self.assertGreater(np.mean(np.einsum('ij,ij->i', points - points.mean(axis=0), normals) > 0), 0.9)
+
+    def readGltf(outputFilePath):
+      with open(outputFilePath) as f:
+        jsonData = json.load(f)
+      return jsonData, logic.readGltfBuffers(jsonData, outputFilePath)
+
+    # Both labels touch the image boundary
+    labelArray = np.zeros([6, 7, 8], dtype=np.int16)
+    labelArray[0:3, 0:3, 0:4] = 3
+    labelArray[3:6, 2:6, 3:7] = 7
+    colorNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLColorTableNode")
+    colorNode.SetTypeToUser()
+    colorNode.SetNumberOfColors(8)
+    colorNode.SetColor(0, "background", 0.0, 0.0, 0.0, 0.0)
+    colorNode.SetColor(3, "bone", 0.9, 0.8, 0.6, 1.0)
+    colorNode.SetColor(7, "muscle", 0.8, 0.2, 0.2, 1.0)
+    shNode = slicer.vtkMRMLSubjectHierarchyNode.GetSubjectHierarchyNode(slicer.mrmlScene)
+    logic = OpenAnatomyExportLogic()
+
+    for mirrored in [False, True]:
+      labelMapVolumeNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode", "Labels")
+      slicer.util.updateVolumeFromArray(labelMapVolumeNode, labelArray)
+      labelMapVolumeNode.SetSpacing(1.0, 1.5, 2.0)
+      if mirrored:
+        labelMapVolumeNode.SetIJKToRASDirections(-1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0)
+      labelMapVolumeNode.CreateDefaultDisplayNodes()
+      labelMapVolumeNode.GetDisplayNode().SetAndObserveColorNodeID(colorNode.GetID())
+      ijkToRas = vtk.vtkMatrix4x4()
+      labelMapVolumeNode.GetIJKToRASMatrix(ijkToRas)
+      self.assertEqual(ijkToRas.Determinant() < 0, mirrored)
+      segmentationNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSegmentationNode", "Segments")
+      slicer.modules.segmentations.logic().ImportLabelmapToSegmentationNode(labelMapVolumeNode, segmentationNode)
+      self.assertFalse(segmentationNode.GetSegmentation().ContainsRepresentation(
+        slicer.vtkSegmentationConverter.GetSegmentationClosedSurfaceRepresentationName()))
+
+      with tempfile.TemporaryDirectory() as outputFolder:
+        logic.exportModel(shNode.GetItemByDataNode(labelMapVolumeNode), outputFolder, reductionFactor=0.0, outputFormat="glTF")
+        jsonData, buffers = readGltf(os.path.join(outputFolder, "Labels.gltf"))
+        logic.exportModel(shNode.GetItemByDataNode(segmentationNode), outputFolder, reductionFactor=0.0, outputFormat="glTF", streaming=True)
+        segmentsJsonData, segmentsBuffers = readGltf(os.path.join(outputFolder, "Segments.gltf"))
+
+      meshNodes = [node for node in jsonData['nodes'] if 'mesh' in node]
+      self.assertEqual(len(meshNodes), 2)
+      self.assertEqual(sorted((node['name'], node['extras']['labelValue']) for node in meshNodes), [("bone", 3), ("muscle", 7)])
+      for node in meshNodes:
+        self.assertEqual(jsonData['meshes'][node['mesh']]['name'], node['name'])
+        primitive = jsonData['meshes'][node['mesh']]['primitives'][0]
+        color = [0.0, 0.0, 0.0, 0.0]
+        colorNode.GetColor(node['extras']['labelValue'], color)
+        np.testing.assert_allclose(jsonData['materials'][primitive['material']]['pbrMetallicRoughness']['baseColorFactor'][:3],
+          logic.getBoostedGouraudColor(color[:3]), atol=1e-3)
+        assertClosedOutwardSurface(jsonData, buffers, primitive)
+
+      # Segment surfaces are extracted from the binary labelmap representation
+      segmentMeshNodes = [node for node in segmentsJsonData['nodes'] if 'mesh' in node]
+      self.assertEqual(sorted(node['name'] for node in segmentMeshNodes), ["bone", "muscle"])
+      for node in segmentMeshNodes:
+        assertClosedOutwardSurface(segmentsJsonData, segmentsBuffers, segmentsJsonData['meshes'][node['mesh']]['primitives'][0])
+
+      slicer.mrmlScene.RemoveNode(segmentationNode)
+      slicer.mrmlScene.RemoveNode(labelMapVolumeNode)
+
+    self.delayDisplay('Test passed!')
+
+  def test_OpenAnatomyExportAbort(self):
+    """Test aborting an asynchronous export (as it is done when the scene is closed or the module is cleaned up).
+    """
+    import tempfile
+
+    self.delayDisplay("Starting the test")
+
+    segmentationNode = self.createTestSegmentation()
+    shNode = slicer.vtkMRMLSubjectHierarchyNode.GetSubjectHierarchyNode(slicer.mrmlScene)
+    numberOfNodesBeforeExport = slicer.mrmlScene.GetNumberOfNodes()
+    numberOfItemsBeforeExport = shNode.GetNumberOfItems()
+
+    logic = OpenAnatomyExportLogic()
+    completedCalls = []
+    exportInProgressAfterAbort = []
+
+    def onProgress(progress):
+      # Abort when the first step is completed (segments are exported to models)
+      logic.abortExport("Export aborted by test.")
+      exportInProgressAfterAbort.append(logic.isExportInProgress())
+
+    with tempfile.TemporaryDirectory() as outputFolder:
+      logic.exportModelAsync(shNode.GetItemByDataNode(segmentationNode), outputFolder, outputFormat="glTF",
+        progressCallback=onProgress, completedCallback=lambda success, errorMessage: completedCalls.append((success, errorMessage)))
+      startTime = time.time()
+      while logic.isExportInProgress() and time.time() - startTime < 60.0:
+        slicer.app.processEvents()
+      # Export is stopped and completion is reported before abortExport returns
+      self.assertEqual(exportInProgressAfterAbort, [False])
+      self.assertEqual(completedCalls, [(False, "Export aborted by test.")])
+      # No more export steps are processed after the abort
+      for i in range(10):
+        slicer.app.processEvents()
+      self.assertEqual(completedCalls, [(False, "Export aborted by test.")])
+      self.assertEqual(os.listdir(outputFolder), [])
+      # Aborting when no export is in progress has no effect
+      logic.abortExport()
+      self.assertEqual(len(completedCalls), 1)
+
+    self.assertEqual(slicer.mrmlScene.GetNumberOfNodes(), numberOfNodesBeforeExport)
+    self.assertEqual(shNode.GetNumberOfItems(), numberOfItemsBeforeExport)
+
+    self.delayDisplay('Test passed!')
@@ -0,0 +1,12 @@
+#
+# Helpers for OpenAnatomy atlas structure JSON files.
+#
+
+__all__ = ["normalizeStructureName"]
+
+
+def normalizeStructureName(name):
+  """Get name of a structure that can be compared to color table and segment names.
+  Atlas structure names use "-" where color table and segment names use space or underscore.
+  """
+  return name.replace("-", " ").replace("_", " ").lower()
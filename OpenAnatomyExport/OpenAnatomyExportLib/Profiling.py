@@ -0,0 +1,79 @@
+import functools
+import logging
+import os
+import time
+
+#
+# CPU (cProfile) and memory (tracemalloc) profiling of module logic methods.
+# Profiling is enabled by setting the output folder, see OPENANATOMY_PROFILING_DIR environment variable.
+#
+
+__all__ = ["getProfilingOutputFolder", "startProfiling", "stopProfiling", "profiledLogicMethod"]
+
+
+def getProfilingOutputFolder():
+  """Get the default folder of profiling results. Profiling is disabled if it is not set.
+  """
+  return os.environ.get("OPENANATOMY_PROFILING_DIR")
+
+
+def startProfiling():
+  """Start CPU and memory profiling.
+  :return: profiling session that must be passed to stopProfiling.
+  """
+  import cProfile
+  import tracemalloc
+  profilingSession = {'startTime': time.time(), 'tracemallocStarted': not tracemalloc.is_tracing()}
+  if profilingSession['tracemallocStarted']:
+    tracemalloc.start()
+  profilingSession['profiler'] = cProfile.Profile()
+  profilingSession['profiler'].enable()
+  return profilingSession
+
+
+def stopProfiling(profilingSession, outputFolder, operationName, inputSize, numberOfTopAllocations=25):
+  """Stop profiling and write results to outputFolder: cProfile statistics (<operation>-<input size>-<time>.prof,
+  can be viewed by snakeviz or pstats) and summary of elapsed time, peak memory usage, and top memory allocations
+  (<operation>-<input size>-<time>-memory.txt).
+  :return: path of the cProfile statistics file.
+  """
+  import tracemalloc
+  profilingSession['profiler'].disable()
+  elapsedTimeSec = time.time() - profilingSession['startTime']
+  snapshot = tracemalloc.take_snapshot()
+  peakMemory = tracemalloc.get_traced_memory()[1]
+  if profilingSession['tracemallocStarted']:
+    tracemalloc.stop()
+
+  os.makedirs(outputFolder, exist_ok=True)
+  outputFilePathBase = os.path.join(outputFolder, f"{operationName}-{inputSize}-{time.strftime('%Y%m%d-%H%M%S')}")
+  profilingSession['profiler'].dump_stats(outputFilePathBase + ".prof")
+  with open(outputFilePathBase + "-memory.txt", 'w') as f:
+    f.write(f"Operation: {operationName}\n")
+    f.write(f"Input size: {inputSize}\n")
+    f.write(f"Elapsed time: {elapsedTimeSec:.3f} s\n")
+    f.write(f"Peak traced memory: {peakMemory / 1024 / 1024:.1f} MiB\n")
+    f.write(f"\nTop {numberOfTopAllocations} allocations (still allocated at the end of the operation):\n")
+    for statistic in snapshot.statistics('lineno')[:numberOfTopAllocations]:
+      f.write(f"{statistic}\n")
+  logging.info(f"Profiling results written to {outputFilePathBase}.prof")
+  return outputFilePathBase + ".prof"
+
+
+def profiledLogicMethod(method):
+  """Decorator for logic methods that are profiled when profiling is enabled.
+  The logic must have profilingOutputFolder and profilingNumberOfTopAllocations attributes and
+  a getInputSizeDescription method. Size of the input (first argument of the method) is included
+  in the name of the profiling result files.
+  """
+  @functools.wraps(method)
+  def wrapper(self, *args, **kwargs):
+    if not self.profilingOutputFolder:
+      return method(self, *args, **kwargs)
+    inputSize = self.getInputSizeDescription(args[0] if args else None)
+    profilingSession = startProfiling()
+    try:
+      return method(self, *args, **kwargs)
+    finally:
+      stopProfiling(profilingSession, self.profilingOutputFolder, method.__name__, inputSize, self.profilingNumberOfTopAllocations)
+  return wrapper
@@ -0,0 +1,4 @@
+# Helpers of the OpenAnatomyExport module that are shared with other modules of the extension.
+# Only the standard library is imported here, as modules import these helpers at application startup.
+from .AtlasStructure import *
+from .Profiling import *